@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AnalyzerConfig(AppConfig):
     name = 'analyzer'
+
+    def ready(self):
+        from .lib import sqlite_fts
+
+        # テーブルを作り直すマイグレーションで消えた FTS 索引のトリガーを復旧する
+        post_migrate.connect(
+            sqlite_fts.repair_after_migrate, sender=self, dispatch_uid='analyzer.sqlite_fts.repair',
+        )
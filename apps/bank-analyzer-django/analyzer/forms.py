@@ -4,16 +4,18 @@ from .models import Case
 
 # ファイルサイズ上限（10MB）
 MAX_FILE_SIZE = 10 * 1024 * 1024
+# JSONバックアップは逐次読み込みで復元するため、nginx の上限（100M）まで受け付ける
+MAX_JSON_FILE_SIZE = 100 * 1024 * 1024
 
 
-def _validate_file_size(file) -> None:
+def _validate_file_size(file, max_size: int = MAX_FILE_SIZE) -> None:
     """ファイルサイズのバリデーション共通処理"""
     if file.size == 0:
         raise forms.ValidationError("空のファイルはアップロードできません。")
-    if file.size > MAX_FILE_SIZE:
+    if file.size > max_size:
         raise forms.ValidationError(
             f"ファイルサイズが大きすぎます（{file.size // (1024*1024)}MB）。"
-            f"最大{MAX_FILE_SIZE // (1024*1024)}MBまでアップロード可能です。"
+            f"最大{max_size // (1024*1024)}MBまでアップロード可能です。"
         )
 
 
@@ -35,11 +37,11 @@ class JsonImportForm(forms.Form):
     """JSONバックアップインポートフォーム"""
     json_file = forms.FileField(
         label="JSONバックアップファイル",
-        help_text="エクスポートしたJSONファイルを選択してください ※最大10MB",
-        validators=[FileExtensionValidator(allowed_extensions=['json'])],
+        help_text="エクスポートしたJSONファイル（gzip圧縮の .json.gz、列指向バックアップの .zip も可）を選択してください ※最大100MB",
+        validators=[FileExtensionValidator(allowed_extensions=['json', 'gz', 'zip'])],
         widget=forms.FileInput(attrs={
             "class": "form-control",
-            "accept": ".json"
+            "accept": ".json,.gz,.zip"
         })
     )
     restore_settings = forms.BooleanField(
@@ -54,7 +56,7 @@ class JsonImportForm(forms.Form):
         """ファイルサイズとタイプのバリデーション"""
         file = self.cleaned_data.get('json_file')
         if file:
-            _validate_file_size(file)
+            _validate_file_size(file, MAX_JSON_FILE_SIZE)
         return file
 
 
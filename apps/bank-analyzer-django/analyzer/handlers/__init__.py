@@ -5,6 +5,8 @@
 """
 
 from .base import (
+    case_conditional,
+    case_version_token,
     json_error,
     safe_error_message,
     is_ajax,
@@ -34,6 +36,7 @@ from .ai import (
     handle_apply_rules,
     handle_apply_ai_suggestion,
     handle_bulk_apply_ai_suggestions,
+    handle_regenerate_ai_suggestions,
     handle_run_auto_classify,
 )
 
@@ -70,10 +73,13 @@ from .api import (
     api_get_field_values,
     api_update_reference_date,
     api_range_delete_preview,
+    api_get_changes,
 )
 
 __all__ = [
     # Base utilities
+    'case_conditional',
+    'case_version_token',
     'json_error',
     'safe_error_message',
     'is_ajax',
@@ -102,6 +108,7 @@ __all__ = [
     'handle_apply_rules',
     'handle_apply_ai_suggestion',
     'handle_bulk_apply_ai_suggestions',
+    'handle_regenerate_ai_suggestions',
     'handle_run_auto_classify',
 
     # Transaction handlers
@@ -134,4 +141,5 @@ __all__ = [
     'api_get_field_values',
     'api_update_reference_date',
     'api_range_delete_preview',
+    'api_get_changes',
 ]
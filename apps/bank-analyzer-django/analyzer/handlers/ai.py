@@ -1,14 +1,17 @@
 """
 AI分類ハンドラー
 
-AI分類提案の適用・一括適用・自動分類実行を処理する。
+AI分類提案の適用・一括適用・再生成・自動分類実行を処理する。
 """
 from django.contrib import messages
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 
-from ..services import TransactionService
-from .base import is_ajax, json_error, count_message, handle_ajax_error, redirect_on_error, require_params
+from ..models import Case
+from ..services import AISuggestionService, TransactionService
+from .base import (
+    build_redirect_url, is_ajax, json_error, count_message, handle_ajax_error, redirect_on_error, require_params,
+)
 
 
 @redirect_on_error('自動分類エラー')
@@ -78,6 +81,26 @@ def handle_bulk_apply_ai_suggestions(request: HttpRequest, case, pk: int) -> Htt
     return redirect('analysis-dashboard', pk=pk)
 
 
+@redirect_on_error('AI分類候補再生成エラー')
+def handle_regenerate_ai_suggestions(request: HttpRequest, case, pk: int) -> HttpResponse:
+    """AI分類候補を全摘要について計算し直す
+
+    候補の行は案件の版数を進めないため、ETag・タブのキャッシュが古い画面を返さないよう
+    ここで版数を進める。
+    """
+    count = AISuggestionService.refresh(case, force=True)
+    Case.bump_revision([case.pk])
+
+    if is_ajax(request):
+        return JsonResponse({'success': True, 'count': count})
+
+    messages.success(request, f"AI分類候補を再生成しました（{count}件の摘要）。")
+    return redirect(build_redirect_url(
+        'analysis-dashboard', pk, tab='ai',
+        filters={'fuzzy_threshold': request.POST.get('fuzzy_threshold', '')},
+    ))
+
+
 @redirect_on_error('自動分類エラー')
 def handle_run_auto_classify(request: HttpRequest, case, pk: int) -> HttpResponse:
     """パターンに基づく自動分類を実行（AJAX対応）"""
@@ -6,16 +6,17 @@ AJAX用のJSONレスポンスを返すAPIエンドポイントを提供する。
 import logging
 from datetime import datetime
 
+from django.db import transaction as db_transaction
 from django.http import HttpRequest, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_GET, require_POST
 
 from ..forms import CaseForm
-from ..models import Case, Transaction
-from ..services import TransactionService
+from ..models import Case, Transaction, TransactionChange
+from ..services import AccountStatsService, AISuggestionService, ChangeFeedService, TransactionService
 from ..services.transaction import get_or_create_account
 from ..lib.constants import UNCATEGORIZED
-from .base import json_error, json_api_error, build_transaction_data, serialize_transaction
+from .base import case_conditional, json_error, json_api_error, build_transaction_data, serialize_transaction
 
 logger = logging.getLogger(__name__)
 
@@ -86,18 +87,22 @@ def api_create_transaction(request: HttpRequest, pk: int) -> JsonResponse:
             account_type=data.get('account_type', ''),
         )
 
-        tx = Transaction.objects.create(
-            case=case,
-            account=account,
-            date=date_val,
-            description=data.get('description', ''),
-            amount_out=data['amount_out'],
-            amount_in=data['amount_in'],
-            balance=data['balance'],
-            category=data.get('category') or UNCATEGORIZED,
-            memo=data.get('memo', ''),
-        )
-
+        with db_transaction.atomic():
+            tx = Transaction.objects.create(
+                case=case,
+                account=account,
+                date=date_val,
+                description=data.get('description', ''),
+                amount_out=data['amount_out'],
+                amount_in=data['amount_in'],
+                balance=data['balance'],
+                category=data.get('category') or UNCATEGORIZED,
+                memo=data.get('memo', ''),
+            )
+            ChangeFeedService.record(case, [tx.id], [], op=TransactionChange.OP_CREATE)
+        AccountStatsService.refresh(case, [account.pk])
+        if tx.category == UNCATEGORIZED:
+            AISuggestionService.refresh(case)
         logger.info(f"取引作成: case_id={pk}, tx_id={tx.id}")
         # account情報をtxに付与してシリアライズ
         tx.bank_name = account.bank_name
@@ -124,7 +129,10 @@ def api_delete_transaction(request: HttpRequest, pk: int) -> JsonResponse:
 
     try:
         tx = case.transactions.get(pk=int(tx_id))
-        tx.delete()
+        with db_transaction.atomic():
+            tx.delete()
+            ChangeFeedService.record(case, [int(tx_id)], [], op=TransactionChange.OP_DELETE)
+        AccountStatsService.refresh(case, [tx.account_id])
 
         logger.info(f"取引削除: case_id={pk}, tx_id={tx_id}")
         return JsonResponse({
@@ -162,6 +170,7 @@ def api_delete_unclassified_transactions(request: HttpRequest, pk: int) -> JsonR
         return json_api_error(e, f"未分類取引削除APIエラー: tx_ids={tx_ids}")
 
 
+@case_conditional
 def api_get_transaction(request: HttpRequest, pk: int) -> JsonResponse:
     """取引データ取得APIエンドポイント（保存後の検証用）"""
     case = get_object_or_404(Case, pk=pk)
@@ -207,6 +216,7 @@ def api_update_reference_date(request: HttpRequest, pk: int) -> JsonResponse:
         return json_api_error(e, f"基準日更新APIエラー: case_id={pk}")
 
 
+@case_conditional
 def api_get_field_values(request: HttpRequest, pk: int) -> JsonResponse:
     """フィールドのユニーク値を取得するAPIエンドポイント"""
     case = get_object_or_404(Case, pk=pk)
@@ -226,6 +236,7 @@ def api_get_field_values(request: HttpRequest, pk: int) -> JsonResponse:
 
 
 @require_GET
+@case_conditional
 def api_range_delete_preview(request: HttpRequest, pk: int) -> JsonResponse:
     """ID範囲削除の対象件数とサンプルを返す"""
     case = get_object_or_404(Case, pk=pk)
@@ -238,3 +249,41 @@ def api_range_delete_preview(request: HttpRequest, pk: int) -> JsonResponse:
         return json_error('開始IDと終了IDを整数で入力してください。')
     except Exception as e:
         return json_api_error(e, f"ID範囲削除プレビューAPIエラー: case_id={pk}")
+
+
+@require_GET
+def api_get_changes(request: HttpRequest, pk: int) -> JsonResponse:
+    """指定した版数以降の取引の差分を返す（開いている画面の行更新用）
+
+    変更された取引ごとに操作・変更項目と現在の行データ（serialize_transaction）を返す。
+    reload が True の場合は差分で追従できないため、画面を再読込する。
+    """
+    case = get_object_or_404(Case, pk=pk)
+    try:
+        since = int(request.GET.get('since', ''))
+    except (ValueError, TypeError):
+        return json_error('版数を整数で指定してください')
+
+    try:
+        feed = ChangeFeedService.changes_since(case, since)
+        live_ids = [c['id'] for c in feed['changes'] if c['op'] != TransactionChange.OP_DELETE]
+        rows = {
+            tx.id: serialize_transaction(tx)
+            for tx in case.transactions.with_account_info().filter(pk__in=live_ids)
+        }
+        changes = []
+        for change in feed['changes']:
+            row = rows.get(change['id'])
+            if row is None:
+                # 削除された取引（差分の取得後に削除されたものを含む）
+                changes.append({'id': change['id'], 'op': TransactionChange.OP_DELETE, 'fields': []})
+            else:
+                changes.append({**change, 'row': row})
+        return JsonResponse({
+            'success': True,
+            'revision': feed['revision'],
+            'reload': feed['reload'],
+            'changes': changes,
+        })
+    except Exception as e:
+        return json_api_error(e, f"差分取得APIエラー: case_id={pk}, since={since}")
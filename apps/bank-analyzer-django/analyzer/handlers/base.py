@@ -3,7 +3,9 @@
 
 ビューのPOST処理で使用する共通ユーティリティを提供する。
 """
+import hashlib
 import logging
+from datetime import datetime
 from functools import wraps
 from typing import Callable, Optional
 
@@ -11,6 +13,12 @@ from django.conf import settings as django_settings
 from django.contrib import messages
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from ..lib import config, learned_classifier
+from ..models import Case
+from ..services import ExportCacheService
 
 logger = logging.getLogger(__name__)
 
@@ -135,6 +143,76 @@ def redirect_on_error(error_context: str, redirect_view: str = 'analysis-dashboa
     return decorator
 
 
+def case_version_token(request: HttpRequest, case_id: int, created_at, revision: int) -> str:
+    """
+    案件の版数・設定・学習済みモデルの版数・CSRFクッキーから決まる検証用トークン
+
+    ETag と画面断片のキャッシュキーに使う。AI分類提案は学習済みモデルの版で変わるため、
+    train_learned_classifier で新しい版を保存した場合も別の値にする。画面にはCSRFトークンが
+    埋め込まれるため、クッキーが変わった場合も別の値にする。
+    """
+    source = ':'.join((
+        ExportCacheService.case_key(case_id, created_at),
+        str(revision),
+        str(config.settings_version()),
+        str(learned_classifier.current_version()),
+        request.COOKIES.get(django_settings.CSRF_COOKIE_NAME, ''),
+    ))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+
+def _case_validators(request: HttpRequest, pk: int) -> Optional[tuple]:
+    """ETag・Last-Modified の元になる値（リクエストごとに1回だけ取得する）
+
+    GET/HEAD 以外と、未表示のメッセージがある場合（304 にすると表示されない）は None。
+    """
+    if not hasattr(request, '_case_validators'):
+        validators = None
+        if request.method in ('GET', 'HEAD') and not len(messages.get_messages(request)):
+            row = Case.objects.filter(pk=pk).values_list('created_at', 'revision', 'updated_at').first()
+            if row:
+                created_at, revision, updated_at = row
+                modified = [
+                    m for m in (config.settings_modified(), learned_classifier.current_modified()) if m
+                ]
+                validators = (
+                    f'W/"{case_version_token(request, pk, created_at, revision)}"',
+                    max([updated_at, *modified]),
+                )
+        request._case_validators = validators
+    return request._case_validators
+
+
+def _case_etag(request: HttpRequest, pk: int, **kwargs) -> Optional[str]:
+    validators = _case_validators(request, pk)
+    return validators[0] if validators else None
+
+
+def _case_last_modified(request: HttpRequest, pk: int, **kwargs) -> Optional[datetime]:
+    validators = _case_validators(request, pk)
+    return validators[1] if validators else None
+
+
+def case_conditional(view_func: Callable) -> Callable:
+    """
+    案件の版数から ETag / Last-Modified を付け、変更がなければ 304 を返すデコレータ
+
+    版数は案件・口座・取引のあらゆる変更で進み、設定の版数も含めるため、
+    内容が変わっていない再読み込みだけが 304 になる。ブラウザが毎回再検証するよう
+    Cache-Control: private, no-cache を付ける。ビューは (request, pk, ...) シグネチャを想定。
+    """
+    conditional_view = condition(etag_func=_case_etag, last_modified_func=_case_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request: HttpRequest, pk: int, *args, **kwargs) -> HttpResponse:
+        response = conditional_view(request, pk, *args, **kwargs)
+        if response.has_header('ETag'):
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
 def count_message(request: HttpRequest, count: int, success_msg: str, zero_msg: str, zero_level: str = "warning"):
     """件数に応じたメッセージを表示"""
     if count > 0:
@@ -10,7 +10,9 @@ from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 
 from ..lib import config
-from ..services import ClassificationHistoryService
+from ..services import (
+    AISuggestionService, ClassificationHistoryService, KeywordImpactService, ReclassificationService,
+)
 from .base import handle_ajax_error, is_ajax, json_error, require_params
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,21 @@ def _scoped_config_call(scope: str, case, *, case_func, global_func, args: tuple
     return global_func(*args)
 
 
+def _commit_and_reclassify(batch: config.PatternBatch) -> int:
+    """パターン変更を保存し、変更したキーワードの影響を受ける取引だけを分類し直す（変わった件数を返す）"""
+    if not batch.commit():
+        return 0
+    return ReclassificationService.reclassify(batch.case, batch.stale_keywords, batch.new_keywords)
+
+
+def _refresh_ai_suggestions(scope: str, case) -> None:
+    """キーワードを追加した後、影響する案件のAI分類候補を更新する（グローバルは全案件）"""
+    if scope == 'case':
+        AISuggestionService.refresh(case)
+    else:
+        AISuggestionService.refresh_cases()
+
+
 def _pattern_response(
     request: HttpRequest,
     pk: int,
@@ -60,6 +77,8 @@ def handle_add_pattern(request: HttpRequest, case, pk: int, category: str, keywo
             global_func=config.add_pattern_keyword,
             args=(category, keyword),
         )
+        if success:
+            _refresh_ai_suggestions(scope, case)
         scope_label = _get_scope_label(scope, case)
         return _pattern_response(
             request, pk, success,
@@ -77,18 +96,15 @@ def handle_delete_pattern(request: HttpRequest, case, pk: int, category: str, ke
     scope = request.POST.get('scope', 'global')
 
     try:
-        success = _scoped_config_call(
-            scope, case,
-            case_func=config.delete_case_pattern_keyword,
-            global_func=config.delete_pattern_keyword,
-            args=(category, keyword),
-        )
+        batch = config.PatternBatch(case)
+        success = batch.delete('case' if scope == 'case' else 'global', category, keyword)
+        reclassified = _commit_and_reclassify(batch)
         scope_label = _get_scope_label(scope, case)
         return _pattern_response(
             request, pk, success,
             success_msg=f"キーワード「{keyword}」を削除しました（{scope_label}）。",
             fail_msg=f"キーワード「{keyword}」が見つかりません。",
-            category=category, keyword=keyword
+            category=category, keyword=keyword, reclassified=reclassified
         )
     except Exception as e:
         return handle_ajax_error(request, pk, e, "パターン削除エラー")
@@ -103,18 +119,16 @@ def handle_update_pattern(
     scope = request.POST.get('scope', 'global')
 
     try:
-        success = _scoped_config_call(
-            scope, case,
-            case_func=config.update_case_pattern_keyword,
-            global_func=config.update_pattern_keyword,
-            args=(category, old_keyword, new_keyword),
-        )
+        batch = config.PatternBatch(case)
+        success = batch.update('case' if scope == 'case' else 'global', category, old_keyword, new_keyword)
+        reclassified = _commit_and_reclassify(batch)
         scope_label = _get_scope_label(scope, case)
         return _pattern_response(
             request, pk, success,
             success_msg=f"キーワードを「{old_keyword}」→「{new_keyword}」に更新しました（{scope_label}）。",
             fail_msg=f"キーワード「{old_keyword}」が見つからないか、更新できません。",
-            category=category, old_keyword=old_keyword, new_keyword=new_keyword
+            category=category, old_keyword=old_keyword, new_keyword=new_keyword,
+            reclassified=reclassified
         )
     except Exception as e:
         return handle_ajax_error(request, pk, e, "パターン更新エラー")
@@ -134,21 +148,20 @@ def handle_move_pattern(
         return redirect('analysis-dashboard', pk=pk)
 
     try:
-        if from_scope == 'global' and to_scope == 'case':
-            success = config.move_pattern_to_case(case, category, keyword)
-            direction = "グローバル → 案件固有"
-        elif from_scope == 'case' and to_scope == 'global':
-            success = config.move_pattern_to_global(case, category, keyword)
-            direction = "案件固有 → グローバル"
-        else:
-            success = False
-            direction = ""
+        directions = {
+            ('global', 'case'): "グローバル → 案件固有",
+            ('case', 'global'): "案件固有 → グローバル",
+        }
+        direction = directions.get((from_scope, to_scope), "")
+        batch = config.PatternBatch(case)
+        success = bool(direction) and batch.move(category, keyword, from_scope, to_scope)
+        reclassified = _commit_and_reclassify(batch)
 
         return _pattern_response(
             request, pk, success,
             success_msg=f"キーワード「{keyword}」を移動しました（{direction}）。",
             fail_msg=f"キーワード「{keyword}」の移動に失敗しました。",
-            category=category, keyword=keyword, direction=direction
+            category=category, keyword=keyword, direction=direction, reclassified=reclassified
         )
     except Exception as e:
         return handle_ajax_error(request, pk, e, "パターン移動エラー")
@@ -179,31 +192,28 @@ def handle_get_category_keywords(request: HttpRequest, case, pk: int) -> JsonRes
 
 
 def handle_preview_pattern_impact(request: HttpRequest, case, pk: int) -> JsonResponse:
-    """パターン登録前に、未分類取引への影響件数を返す。"""
-    from ..lib.constants import UNCATEGORIZED
-    from ..models import Transaction
-
+    """パターン登録前に、未分類取引への影響件数と分類の変化を返す。"""
     keyword = (request.POST.get('keyword') or '').strip()
     if not keyword:
         return json_error('キーワードが指定されていません')
 
-    matches = Transaction.objects.filter(
-        category=UNCATEGORIZED,
-        is_flagged=False,
-        description__icontains=keyword,
+    impact = KeywordImpactService.preview(
+        case,
+        keyword,
+        category=request.POST.get('category') or None,
+        scope=request.POST.get('scope', 'global'),
     )
-    current_case_count = matches.filter(case=case).count()
-    other_cases_count = matches.exclude(case=case).count()
     return JsonResponse({
         'success': True,
-        'current_case_count': current_case_count,
-        'other_cases_count': other_cases_count,
-        'total_count': current_case_count + other_cases_count,
+        'current_case_count': impact['current_case_count'],
+        'other_cases_count': impact['other_cases_count'],
+        'total_count': impact['total_count'],
+        'changes': impact['changes'],
     })
 
 
 def handle_bulk_pattern_changes(request: HttpRequest, case, pk: int) -> JsonResponse:
-    """パターン変更を一括適用（AJAX専用）"""
+    """パターン変更を一括適用（AJAX専用、全変更を適用してからスコープごとに1回だけ保存）"""
     changes_json = request.POST.get('changes', '[]')
 
     try:
@@ -212,6 +222,7 @@ def handle_bulk_pattern_changes(request: HttpRequest, case, pk: int) -> JsonResp
         if not changes:
             return json_error('変更がありません')
 
+        batch = config.PatternBatch(case)
         saved_count = 0
         errors = []
 
@@ -222,16 +233,19 @@ def handle_bulk_pattern_changes(request: HttpRequest, case, pk: int) -> JsonResp
             scope = change.get('scope')
 
             try:
-                success = _apply_single_change(case, action, category, keyword, scope, change)
+                success = _apply_single_change(batch, action, category, keyword, scope, change)
                 if success:
                     saved_count += 1
             except Exception as e:
                 errors.append(f"{action} {category}/{keyword}: {str(e)}")
 
+        reclassified = _commit_and_reclassify(batch)
+
         return JsonResponse({
             'success': True,
             'saved_count': saved_count,
             'total_count': len(changes),
+            'reclassified': reclassified,
             'errors': errors if errors else None
         })
 
@@ -261,17 +275,19 @@ def handle_classify_and_register_pattern(
         )
 
         # 2. キーワードに一致する未分類取引を一括更新
-        qs = case.transactions.filter(
-            category=UNCATEGORIZED,
-            is_flagged=False,
-            description__icontains=keyword,
+        tx_ids = KeywordImpactService.matching_ids(
+            case.transactions.filter(category=UNCATEGORIZED, is_flagged=False),
+            keyword,
         )
-        category_updates = {tx_id: category for tx_id in qs.values_list('id', flat=True)}
+        category_updates = {tx_id: category for tx_id in tx_ids}
+        match = ('case' if scope == 'case' else 'global', keyword.strip())
         count, change_group = ClassificationHistoryService.apply_changes(
             case,
             category_updates,
             source='pattern_registration',
+            matches={tx_id: match for tx_id in tx_ids},
         )
+        _refresh_ai_suggestions(scope, case)
 
         return JsonResponse({
             'success': True,
@@ -285,26 +301,15 @@ def handle_classify_and_register_pattern(
         return handle_ajax_error(request, pk, e, "分類+パターン登録エラー")
 
 
-_ACTION_CONFIG_MAP = {
-    'add': (config.add_case_pattern_keyword, config.add_pattern_keyword),
-    'delete': (config.delete_case_pattern_keyword, config.delete_pattern_keyword),
-}
-
-
-def _apply_single_change(case, action: str, category: str, keyword: str, scope: str, change: dict) -> bool:
-    """単一のパターン変更を適用"""
-    if action in _ACTION_CONFIG_MAP:
-        case_func, global_func = _ACTION_CONFIG_MAP[action]
-        return _scoped_config_call(
-            scope, case, case_func=case_func, global_func=global_func, args=(category, keyword)
-        )
-
+def _apply_single_change(
+    batch: config.PatternBatch, action: str, category: str, keyword: str, scope: str, change: dict
+) -> bool:
+    """単一のパターン変更をバッチに適用"""
+    scope = 'case' if scope == 'case' else 'global'
+    if action == 'add':
+        return batch.add(scope, category, keyword)
+    if action == 'delete':
+        return batch.delete(scope, category, keyword)
     if action == 'move':
-        from_scope = change.get('fromScope')
-        to_scope = change.get('toScope')
-        if from_scope == 'global' and to_scope == 'case':
-            return config.move_pattern_to_case(case, category, keyword)
-        elif from_scope == 'case' and to_scope == 'global':
-            return config.move_pattern_to_global(case, category, keyword)
-
+        return batch.move(category, keyword, change.get('fromScope'), change.get('toScope'))
     return False
@@ -6,7 +6,7 @@ Bank Analyzer Library
 
 from .importer import load_csv, validate_balance
 from .analyzer import analyze_large_amounts, analyze_transfers
-from .llm_classifier import classify_transactions, classify_by_rules
+from .llm_classifier import classify_transactions, classify_by_rules, classify_with_match
 from .config import (
     load_user_settings,
     save_user_settings,
@@ -14,6 +14,7 @@ from .config import (
     DEFAULT_PATTERNS,
 )
 from .constants import ERAS, ERA_MAP, UNCATEGORIZED, STANDARD_CATEGORIES
+from .wareki import format_wareki
 
 __all__ = [
     # importer
@@ -25,6 +26,7 @@ __all__ = [
     # llm_classifier
     "classify_transactions",
     "classify_by_rules",
+    "classify_with_match",
     # config
     "load_user_settings",
     "save_user_settings",
@@ -35,4 +37,6 @@ __all__ = [
     "ERA_MAP",
     "UNCATEGORIZED",
     "STANDARD_CATEGORIES",
+    # wareki
+    "format_wareki",
 ]
@@ -11,12 +11,13 @@ from .defaults import (
 )
 
 from .settings import (
-    BASE_DIR,
-    DATA_DIR,
-    CONFIG_FILE,
-    ensure_data_dir,
     load_user_settings,
     save_user_settings,
+    save_classification_patterns,
+    settings_version,
+    settings_modified,
+    cached_for_version,
+    add_version_listener,
     get_fuzzy_config,
     get_classification_patterns,
     get_gift_threshold,
@@ -33,6 +34,7 @@ from .patterns import (
     update_case_pattern_keyword,
     move_pattern_to_case,
     move_pattern_to_global,
+    PatternBatch,
 )
 
 __all__ = [
@@ -42,12 +44,13 @@ __all__ = [
     'DEFAULT_FUZZY_CONFIG',
 
     # Settings
-    'BASE_DIR',
-    'DATA_DIR',
-    'CONFIG_FILE',
-    'ensure_data_dir',
     'load_user_settings',
     'save_user_settings',
+    'save_classification_patterns',
+    'settings_version',
+    'settings_modified',
+    'cached_for_version',
+    'add_version_listener',
     'get_fuzzy_config',
     'get_classification_patterns',
     'get_gift_threshold',
@@ -63,4 +66,5 @@ __all__ = [
     'update_case_pattern_keyword',
     'move_pattern_to_case',
     'move_pattern_to_global',
+    'PatternBatch',
 ]
@@ -5,8 +5,9 @@
 """
 import logging
 
-from .defaults import DEFAULT_PATTERNS
-from .settings import load_user_settings, save_user_settings, get_classification_patterns
+from django.db import transaction
+
+from .settings import get_classification_patterns, save_classification_patterns
 from ..constants import normalize_category, normalize_patterns
 
 logger = logging.getLogger(__name__)
@@ -51,11 +52,7 @@ def get_merged_patterns(case=None) -> dict:
 def _modify_patterns(case, modify_fn, log_msg: str) -> bool:
     """パターンをロード→変更→保存する共通処理。変更がない場合は保存をスキップ。"""
     if case is None:
-        settings = load_user_settings()
-        patterns = settings.get("CLASSIFICATION_PATTERNS")
-        if patterns is None:
-            patterns = {k: list(v) for k, v in DEFAULT_PATTERNS.items()}
-        patterns = normalize_patterns(patterns)
+        patterns = get_classification_patterns()
     else:
         patterns = get_case_patterns(case)
 
@@ -63,8 +60,7 @@ def _modify_patterns(case, modify_fn, log_msg: str) -> bool:
 
     if changed:
         if case is None:
-            settings["CLASSIFICATION_PATTERNS"] = patterns
-            save_user_settings(settings)
+            save_classification_patterns(patterns)
         else:
             case.custom_patterns = patterns
             case.save(update_fields=['custom_patterns'])
@@ -107,6 +103,123 @@ def _update_keyword(patterns: dict, category: str, old_keyword: str, new_keyword
     return True, True
 
 
+# =============================================================================
+# パターン変更のバッチ
+# =============================================================================
+
+SCOPE_GLOBAL = 'global'
+SCOPE_CASE = 'case'
+
+
+class PatternBatch:
+    """
+    分類パターン変更のバッチ
+
+    追加・削除・更新・移動をメモリ上のパターンに順に適用し、commit() で変更のあった
+    スコープだけを1つのトランザクションで1回ずつ保存する。グローバルパターンの
+    設定版数（キャッシュの無効化）も commit() ごとに1回だけ進む。
+
+    変更したキーワードは (スコープ, キーワード) の集合として保持し、commit() 後の
+    再分類（ReclassificationService）に使う。stale_keywords は削除・変更前・移動元の
+    キーワード（それで分類された取引を見直す）、new_keywords は変更後・移動先の
+    キーワード（それを含む取引を分類し直す）。追加だけのキーワードは従来どおり
+    既存の取引に適用しない。
+
+    使用例:
+        batch = PatternBatch(case)
+        batch.add('global', '給与', '賞与')
+        batch.move('生活費', 'イオン', 'global', 'case')
+        batch.commit()
+    """
+
+    def __init__(self, case=None):
+        self.case = case
+        self.change_count = 0
+        self.stale_keywords: set[tuple[str, str]] = set()
+        self.new_keywords: set[tuple[str, str]] = set()
+        self._patterns = {}
+        self._changed_scopes = set()
+
+    def _scope_patterns(self, scope: str) -> dict:
+        if scope not in (SCOPE_GLOBAL, SCOPE_CASE):
+            raise ValueError(f"不明なスコープです: {scope}")
+        if scope not in self._patterns:
+            if scope == SCOPE_CASE:
+                if self.case is None:
+                    raise ValueError("案件固有パターンの変更には案件が必要です")
+                self._patterns[scope] = get_case_patterns(self.case)
+            else:
+                self._patterns[scope] = get_classification_patterns()
+        return self._patterns[scope]
+
+    def _apply(self, scope: str, modify_fn, *, stale: tuple | None = None, new: tuple | None = None) -> bool:
+        result, changed = modify_fn(self._scope_patterns(scope))
+        if changed:
+            self.change_count += 1
+            self._changed_scopes.add(scope)
+            if stale:
+                self.stale_keywords.add(stale)
+            if new:
+                self.new_keywords.add(new)
+        return result
+
+    def add(self, scope: str, category: str, keyword: str) -> bool:
+        """キーワードを追加（登録済みなら変更せず True）"""
+        if not category or not keyword or not keyword.strip():
+            return False
+        keyword = keyword.strip()
+        return self._apply(scope, lambda p: _add_keyword(p, category, keyword))
+
+    def delete(self, scope: str, category: str, keyword: str, remove_empty: bool | None = None) -> bool:
+        """キーワードを削除（remove_empty 省略時は案件固有のみ空カテゴリーも削除）"""
+        if remove_empty is None:
+            remove_empty = scope == SCOPE_CASE
+        return self._apply(
+            scope, lambda p: _delete_keyword(p, category, keyword, remove_empty=remove_empty),
+            stale=(scope, keyword),
+        )
+
+    def update(self, scope: str, category: str, old_keyword: str, new_keyword: str) -> bool:
+        """キーワードを更新"""
+        if not new_keyword or not new_keyword.strip():
+            return False
+        new_keyword = new_keyword.strip()
+        return self._apply(
+            scope, lambda p: _update_keyword(p, category, old_keyword, new_keyword),
+            stale=(scope, old_keyword), new=(scope, new_keyword),
+        )
+
+    def move(self, category: str, keyword: str, from_scope: str, to_scope: str) -> bool:
+        """キーワードをグローバル⇔案件固有間で移動"""
+        if from_scope == to_scope or {from_scope, to_scope} - {SCOPE_GLOBAL, SCOPE_CASE}:
+            return False
+        self._scope_patterns(to_scope)
+        if not self.delete(from_scope, category, keyword):
+            return False
+        if not self.add(to_scope, category, keyword):
+            return False
+        self.new_keywords.add((to_scope, keyword.strip()))
+        return True
+
+    def commit(self) -> bool:
+        """変更のあったスコープを保存（変更がなければ何もせず False。変更したキーワードの集合は残す）"""
+        if not self._changed_scopes:
+            return False
+        with transaction.atomic():
+            if SCOPE_GLOBAL in self._changed_scopes:
+                save_classification_patterns(self._patterns[SCOPE_GLOBAL])
+            if SCOPE_CASE in self._changed_scopes:
+                self.case.custom_patterns = self._patterns[SCOPE_CASE]
+                self.case.save(update_fields=['custom_patterns'])
+        logger.info(
+            f"パターン一括変更: {self.change_count}件 "
+            f"(scopes={','.join(sorted(self._changed_scopes))})"
+        )
+        self._changed_scopes.clear()
+        self.change_count = 0
+        return True
+
+
 # =============================================================================
 # グローバルパターン操作
 # =============================================================================
@@ -180,14 +293,18 @@ def update_case_pattern_keyword(case, category: str, old_keyword: str, new_keywo
 # =============================================================================
 
 def move_pattern_to_case(case, category: str, keyword: str) -> bool:
-    """グローバルパターンから案件固有パターンにキーワードを移動"""
-    if not delete_pattern_keyword(category, keyword):
+    """グローバルパターンから案件固有パターンにキーワードを移動（両スコープを1トランザクションで保存）"""
+    batch = PatternBatch(case)
+    if not batch.move(category, keyword, SCOPE_GLOBAL, SCOPE_CASE):
         return False
-    return add_case_pattern_keyword(case, category, keyword)
+    batch.commit()
+    return True
 
 
 def move_pattern_to_global(case, category: str, keyword: str) -> bool:
-    """案件固有パターンからグローバルパターンにキーワードを移動"""
-    if not delete_case_pattern_keyword(case, category, keyword):
+    """案件固有パターンからグローバルパターンにキーワードを移動（両スコープを1トランザクションで保存）"""
+    batch = PatternBatch(case)
+    if not batch.move(category, keyword, SCOPE_CASE, SCOPE_GLOBAL):
         return False
-    return add_pattern_keyword(category, keyword)
+    batch.commit()
+    return True
@@ -1,121 +1,312 @@
 """
 設定管理
 
-ユーザー設定の読み込み・保存およびキャッシュ管理を行う。
+ユーザー設定とグローバル分類パターンをDBから読み込み・保存する。
+
+設定は UserSetting、パターンは PatternCategory / PatternKeyword に保存し、保存のたびに
+SettingsVersion の版数を1つ進める。各ワーカーは読み込んだ設定を版数付きのスナップショットとして
+保持し、リクエストごとに最初の1回だけ版数を読んで、変わっていれば読み直す
+（リクエスト外ではアクセスのたびに版数を確認する）。別のワーカーでの保存も次のリクエストから反映される。
+パターン・ファジー設定などの派生値はスナップショットごとに1回だけ計算する。
+
+保存した内容は、保存したトランザクションの中ではそのスレッドだけが使い、コミットしてから
+プロセスのスナップショットにする（外側のトランザクションがロールバックした場合は使わない）。
 """
-import os
-import json
+import copy
 import logging
-import tempfile
-from pathlib import Path
+import threading
+from typing import Any, Callable
 
-from django.conf import settings as django_settings
+from django.core.signals import request_finished, request_started
+from django.db import transaction
 
 from .defaults import DEFAULT_PATTERNS, DEFAULT_GIFT_THRESHOLD, DEFAULT_FUZZY_CONFIG
 from ..constants import normalize_patterns
 
 logger = logging.getLogger(__name__)
 
-# Django settings から BASE_DIR を取得
-BASE_DIR = getattr(django_settings, 'BASE_DIR', Path(__file__).resolve().parent.parent.parent.parent)
-DATA_DIR = BASE_DIR / "data"
-CONFIG_FILE = DATA_DIR / "user_settings.json"
+# 分類パターンの設定キー（load_user_settings / save_user_settings の辞書上の名前）
+PATTERNS_KEY = "CLASSIFICATION_PATTERNS"
+
+_VERSION_PK = 1
+_BULK_BATCH_SIZE = 1000
+
+
+class _Snapshot:
+    """ある版数のユーザー設定・分類パターンと、そこから計算した派生値"""
+
+    def __init__(self, version: int, updated_at, settings: dict, patterns: dict | None):
+        self.version = version
+        self.updated_at = updated_at
+        self.settings = settings
+        # None は未保存（既定のパターンを使う）
+        self.patterns = patterns
+        self.derived = {}
+
+
+_snapshot: _Snapshot | None = None
+_version_listeners: list[Callable[[], None]] = []
+
+# checked: リクエスト中に版数を確認済みなら True、未確認なら False、リクエスト外なら None
+# pending: このスレッドで保存し、まだコミットしていない (スナップショット, コミット時の関数)
+_request_state = threading.local()
+
+
+def _on_request_started(**kwargs):
+    _request_state.checked = False
+
+
+def _on_request_finished(**kwargs):
+    _request_state.checked = None
+
+
+request_started.connect(_on_request_started, dispatch_uid='analyzer.config.request_started')
+request_finished.connect(_on_request_finished, dispatch_uid='analyzer.config.request_finished')
+
+
+def add_version_listener(callback: Callable[[], None]):
+    """設定版数が変わってスナップショットを入れ替えたときに呼ぶ関数を登録（プロセス内のキャッシュ破棄用）"""
+    _version_listeners.append(callback)
+
+
+def _replace_snapshot(snapshot: _Snapshot) -> _Snapshot:
+    global _snapshot
+    previous = _snapshot
+    _snapshot = snapshot
+    if previous is not None:
+        for callback in _version_listeners:
+            callback()
+    return snapshot
+
+
+def _read_version() -> tuple[int, Any]:
+    from ...models import SettingsVersion
+
+    row = SettingsVersion.objects.filter(pk=_VERSION_PK).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def _load_snapshot(version: int, updated_at) -> _Snapshot:
+    """設定・パターンをDBから読み込む"""
+    from ...models import PatternCategory, PatternKeyword, UserSetting
+
+    settings = dict(UserSetting.objects.values_list('key', 'value'))
+    patterns = None
+    categories = list(PatternCategory.objects.order_by('position', 'id').values_list('name', flat=True))
+    if categories:
+        patterns = {name: [] for name in categories}
+        keywords = PatternKeyword.objects.order_by('category__position', 'position', 'id').values_list(
+            'category__name', 'keyword',
+        )
+        for name, keyword in keywords:
+            patterns[name].append(keyword)
+    return _Snapshot(version, updated_at, settings, patterns)
+
+
+def _pending_snapshot() -> _Snapshot | None:
+    """このスレッドが保存してコミット待ちのスナップショット（コミット・ロールバック済みなら None）"""
+    pending = getattr(_request_state, 'pending', None)
+    if pending is None:
+        return None
+    snapshot, install = pending
+    # on_commit の関数はコミットで実行され、ロールバック（セーブポイントを含む）で取り除かれる
+    if any(entry[1] is install for entry in transaction.get_connection().run_on_commit):
+        return snapshot
+    _request_state.pending = None
+    return None
+
+
+def _current() -> _Snapshot:
+    """現在の版数のスナップショット（版数の確認はリクエストごとに1回）"""
+    pending = _pending_snapshot()
+    if pending is not None:
+        return pending
+
+    checked = getattr(_request_state, 'checked', None)
+    snapshot = _snapshot
+    if checked and snapshot is not None:
+        return snapshot
 
-# --- mtime ベースキャッシュ ---
-_settings_cache: dict | None = None
-_settings_mtime: float | None = None
+    version, updated_at = _read_version()
+    if snapshot is None or snapshot.version != version:
+        snapshot = _replace_snapshot(_load_snapshot(version, updated_at))
+    if checked is False:
+        _request_state.checked = True
+    return snapshot
 
 
-def ensure_data_dir():
-    """データディレクトリを作成"""
-    os.makedirs(DATA_DIR, exist_ok=True)
+def _derived(snapshot: _Snapshot, key: str, factory: Callable[[], Any]) -> Any:
+    if key not in snapshot.derived:
+        snapshot.derived[key] = factory()
+    return snapshot.derived[key]
+
+
+def cached_for_version(key: str, factory: Callable[[], Any]) -> Any:
+    """
+    現在の設定版数に対して1回だけ計算する派生値を取得
+
+    設定が保存されて版数が変わると、次の呼び出しで factory を呼び直す。
+    戻り値は共有されるため、呼び出し側で変更しないこと。
+    """
+    return _derived(_current(), key, factory)
+
+
+def _lock_version():
+    """版数の行をロックして取得（保存を直列化する）"""
+    from ...models import SettingsVersion
+
+    SettingsVersion.objects.get_or_create(pk=_VERSION_PK)
+    return SettingsVersion.objects.select_for_update().get(pk=_VERSION_PK)
+
+
+def _write_patterns(patterns: dict | None):
+    """
+    グローバル分類パターンを保存（変更していないキーワードの行・IDはそのまま残す）
+
+    空または None の場合は保存済みのパターンを削除する（既定のパターンに戻る）。
+    """
+    from ...models import PatternCategory, PatternKeyword
+
+    if not patterns:
+        PatternCategory.objects.all().delete()
+        return
+
+    PatternCategory.objects.exclude(name__in=list(patterns)).delete()
+    PatternCategory.objects.bulk_create(
+        [PatternCategory(name=name, position=position) for position, name in enumerate(patterns)],
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=['position'],
+    )
+    category_ids = dict(PatternCategory.objects.values_list('name', 'id'))
+
+    wanted = {
+        (category_ids[name], keyword): position
+        for name, keywords in patterns.items()
+        for position, keyword in enumerate(keywords)
+    }
+    stale_ids = [
+        pk for pk, category_id, keyword in PatternKeyword.objects.values_list('id', 'category_id', 'keyword')
+        if (category_id, keyword) not in wanted
+    ]
+    if stale_ids:
+        PatternKeyword.objects.filter(pk__in=stale_ids).delete()
+    PatternKeyword.objects.bulk_create(
+        [
+            PatternKeyword(category_id=category_id, keyword=keyword, position=position)
+            for (category_id, keyword), position in wanted.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['category', 'keyword'],
+        update_fields=['position'],
+        batch_size=_BULK_BATCH_SIZE,
+    )
+
+
+def _commit_version(state, settings: dict, patterns: dict | None):
+    """版数を進め、保存した内容をコミット後にこのプロセスのスナップショットにする
+
+    コミットまではこのスレッドだけが保存した内容を使う（同じトランザクションでの再分類など）。
+    """
+    state.version += 1
+    state.save(update_fields=['version', 'updated_at'])
+    snapshot = _Snapshot(state.version, state.updated_at, settings, patterns or None)
+
+    def install():
+        pending = getattr(_request_state, 'pending', None)
+        if pending is not None and pending[0] is snapshot:
+            _request_state.pending = None
+        _replace_snapshot(snapshot)
+
+    _request_state.pending = (snapshot, install)
+    transaction.on_commit(install)
 
 
 def load_user_settings() -> dict:
-    """ユーザー設定をJSONファイルから読み込む（mtime変更時のみディスク読み込み）"""
-    global _settings_cache, _settings_mtime
-
-    if not CONFIG_FILE.exists():
-        _settings_cache = {}
-        _settings_mtime = None
-        return {}
-
-    try:
-        current_mtime = CONFIG_FILE.stat().st_mtime
-    except OSError:
-        return _settings_cache if _settings_cache is not None else {}
-
-    if _settings_cache is not None and _settings_mtime == current_mtime:
-        return _settings_cache
-
-    try:
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        _settings_cache = data
-        _settings_mtime = current_mtime
-        return data
-    except json.JSONDecodeError as e:
-        logger.warning(f"設定ファイルのパースに失敗: {e}")
-        return {}
-    except OSError as e:
-        logger.warning(f"設定ファイルの読み込みに失敗: {e}")
-        return {}
+    """
+    ユーザー設定を取得
+
+    分類パターンは保存済みの場合のみ CLASSIFICATION_PATTERNS に含む。
+    返す辞書はコピーなので、変更して save_user_settings に渡してよい。
+    """
+    snapshot = _current()
+    data = copy.deepcopy(snapshot.settings)
+    if snapshot.patterns is not None:
+        data[PATTERNS_KEY] = {category: list(keywords) for category, keywords in snapshot.patterns.items()}
+    return data
 
 
 def save_user_settings(new_settings: dict):
-    """ユーザー設定をJSONファイルにアトミック保存"""
-    global _settings_cache, _settings_mtime
-
-    ensure_data_dir()
-    try:
-        fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
-        try:
-            with os.fdopen(fd, "w", encoding="utf-8") as f:
-                json.dump(new_settings, f, ensure_ascii=False, indent=2)
-            os.replace(tmp_path, CONFIG_FILE)
-        except BaseException:
-            # 書き込み失敗時は一時ファイルを削除
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
-            raise
-
-        # 保存成功後キャッシュ更新
-        _settings_cache = new_settings
-        try:
-            _settings_mtime = CONFIG_FILE.stat().st_mtime
-        except OSError:
-            _settings_mtime = None
-    except OSError as e:
-        logger.error(f"設定ファイルの保存に失敗: {e}")
-        raise
+    """
+    ユーザー設定を保存し、設定版数を1つ進める
+
+    辞書にないキーの設定は削除する。CLASSIFICATION_PATTERNS がない場合は
+    保存済みの分類パターンも削除する（既定のパターンに戻る）。
+    """
+    from ...models import UserSetting
+
+    settings = {key: value for key, value in new_settings.items() if key != PATTERNS_KEY}
+    patterns = new_settings.get(PATTERNS_KEY)
+    patterns = normalize_patterns(patterns) if patterns is not None else None
+
+    with transaction.atomic():
+        state = _lock_version()
+        UserSetting.objects.exclude(key__in=list(settings)).delete()
+        UserSetting.objects.bulk_create(
+            [UserSetting(key=key, value=value) for key, value in settings.items()],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['value'],
+        )
+        _write_patterns(patterns)
+        _commit_version(state, copy.deepcopy(settings), patterns)
+    logger.info(f"ユーザー設定を保存: version={state.version}")
+
+
+def save_classification_patterns(patterns: dict):
+    """グローバル分類パターンだけを保存し、設定版数を1つ進める"""
+    from ...models import UserSetting
+
+    patterns = normalize_patterns(patterns)
+    with transaction.atomic():
+        state = _lock_version()
+        settings = dict(UserSetting.objects.values_list('key', 'value'))
+        _write_patterns(patterns)
+        _commit_version(state, settings, patterns)
+
+
+def settings_version() -> int:
+    """ユーザー設定・分類パターンの版数（未保存なら0）
+
+    設定に依存する画面・エクスポートのキャッシュ検証（ETag等）に使う。
+    """
+    return _current().version
+
+
+def settings_modified():
+    """ユーザー設定・分類パターンの最終保存日時（未保存なら None）"""
+    return _current().updated_at
 
 
 def get_fuzzy_config() -> dict:
     """ファジーマッチング設定を取得"""
-    user_settings = load_user_settings()
-    default_config = DEFAULT_FUZZY_CONFIG.copy()
-    user_fuzzy = user_settings.get("FUZZY_MATCHING", {})
-    default_config.update(user_fuzzy)
-    return default_config
+    snapshot = _current()
+    fuzzy_config = _derived(snapshot, 'fuzzy_config', lambda: {
+        **DEFAULT_FUZZY_CONFIG,
+        **snapshot.settings.get("FUZZY_MATCHING", {}),
+    })
+    return dict(fuzzy_config)
 
 
 def get_classification_patterns() -> dict:
     """分類パターンを取得（ユーザー設定優先、なければデフォルト）"""
-    user_settings = load_user_settings()
-    raw_patterns = user_settings.get("CLASSIFICATION_PATTERNS", DEFAULT_PATTERNS)
-    patterns = normalize_patterns(raw_patterns)
-    if user_settings.get("CLASSIFICATION_PATTERNS") is not None and patterns != raw_patterns:
-        user_settings["CLASSIFICATION_PATTERNS"] = patterns
-        try:
-            save_user_settings(user_settings)
-        except OSError:
-            logger.warning("分類パターンの旧カテゴリー名を保存し直せませんでした", exc_info=True)
-    return patterns
+    snapshot = _current()
+    patterns = _derived(snapshot, 'classification_patterns', lambda: normalize_patterns(
+        snapshot.patterns if snapshot.patterns is not None else DEFAULT_PATTERNS
+    ))
+    return {category: list(keywords) for category, keywords in patterns.items()}
 
 
 def get_gift_threshold() -> int:
     """贈与判定の閾値を取得"""
-    user_settings = load_user_settings()
-    return int(user_settings.get("GIFT_THRESHOLD", DEFAULT_GIFT_THRESHOLD))
+    return int(_current().settings.get("GIFT_THRESHOLD", DEFAULT_GIFT_THRESHOLD))
@@ -0,0 +1,143 @@
+"""
+JSONストリーム読み込み
+
+巨大なJSONバックアップを全体を読み込まずに処理するための逐次パーサー。
+トップレベルのオブジェクトをキー単位で読み進め、指定したキーの配列は
+要素を1件ずつ返すイテレータとして扱う。標準ライブラリのみで動作する。
+"""
+import codecs
+import json
+from typing import Any, BinaryIO, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonReader:
+    """バイトストリームをチャンク単位で読み、JSON値を1つずつデコードする"""
+
+    def __init__(self, fp: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        # BOM付きUTF-8も受け付ける
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+
+    def _fill(self, size: int | None = None) -> bool:
+        """バッファを補充する（消費済み部分は破棄）。EOFならFalse"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or self.chunk_size)
+        if chunk:
+            text = self._decoder.decode(chunk)
+        else:
+            self.eof = True
+            text = self._decoder.decode(b'', final=True)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """空白を読み飛ばし、次の1文字を返す（EOFなら空文字）"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        actual = self.peek()
+        if actual != char:
+            raise json.JSONDecodeError(f"'{char}' が必要です", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """次のJSON値を1つデコードする"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill(size):
+                    raise
+                size *= 2
+                continue
+            # 数値などはバッファ末尾で途切れている可能性があるため、
+            # 後続文字が読めるまで確定しない
+            if end < len(self.buf) or self.eof:
+                self.pos = end
+                return obj
+            self._fill(size)
+
+
+def _iter_array(reader: _JsonReader) -> Iterator[Any]:
+    """配列の要素を先頭から1件ずつ返す（開き括弧は読み込み済み）"""
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == ']':
+            return
+        if sep != ',':
+            raise json.JSONDecodeError("',' または ']' が必要です", reader.buf, reader.pos - 1)
+
+
+def iter_object_items(
+    fp: BinaryIO,
+    stream_keys: tuple[str, ...] = (),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[str, Any]]:
+    """
+    トップレベルのJSONオブジェクトを (キー, 値) の順に逐次返す
+
+    stream_keys に含まれるキーの値が配列の場合、値はリストではなく要素を
+    1件ずつ返すイテレータになる。呼び出し側が途中までしか消費しなくても、
+    次のキーへ進む前に残りの要素は読み捨てられる。
+
+    Args:
+        fp: バイナリモードのファイルオブジェクト
+        stream_keys: 配列を逐次読み込みするキー
+        chunk_size: 1回に読み込むバイト数
+
+    Raises:
+        json.JSONDecodeError: JSONとして不正な場合
+    """
+    reader = _JsonReader(fp, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("オブジェクトのキーは文字列である必要があります", reader.buf, reader.pos)
+        reader.expect(':')
+
+        if key in stream_keys and reader.peek() == '[':
+            reader.pos += 1
+            items = _iter_array(reader)
+            yield key, items
+            for _ in items:
+                pass
+        else:
+            yield key, reader.value()
+
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == '}':
+            return
+        if sep != ',':
+            raise json.JSONDecodeError("',' または '}' が必要です", reader.buf, reader.pos - 1)
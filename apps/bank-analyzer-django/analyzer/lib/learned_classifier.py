@@ -0,0 +1,310 @@
+"""
+学習済み分類モデル（文字n-gram + 多項ナイーブベイズ）
+
+手動で分類した摘要と分類の組から、CPUだけで学習・推論できる軽量なモデルを作る。
+摘要は normalize_text で正規化してから文字1〜3-gramに分解し、n-gramの出現回数を
+疎な形（列番号と回数の配列）のまま扱う。推論は複数の摘要をまとめて numpy で計算する。
+
+モデルは LEARNED_MODEL_DIR に classifier-<版数>.npz として保存し、学習のたびに版数を
+1つ進める（古い版は指定数だけ残す）。読み込みは最初に使うときまで遅延し、新しい版が
+保存されていれば次の呼び出しで読み直す。
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# モデルファイルの形式の版（形式を変えたら上げる。異なる形式のファイルは読み込まない）
+MODEL_FORMAT = 1
+
+NGRAM_MIN = 1
+NGRAM_MAX = 3
+
+# 推論で一度に計算する摘要数（カテゴリー数 × n-gram数 の作業領域を抑える）
+_PREDICT_BATCH_SIZE = 1024
+
+_MODEL_FILE_RE = re.compile(r'^classifier-(\d+)\.npz$')
+
+
+def ngrams(text: str) -> Counter:
+    """摘要を正規化して文字n-gramの出現回数を返す（空白の連続は1つにまとめる）"""
+    text = ' '.join(normalize_text(text or '').split())
+    counts = Counter()
+    for n in range(NGRAM_MIN, NGRAM_MAX + 1):
+        counts.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return counts
+
+
+class NaiveBayesClassifier:
+    """文字n-gramの多項ナイーブベイズ分類器"""
+
+    def __init__(
+        self,
+        categories: list[str],
+        vocabulary: dict[str, int],
+        feature_log_prob: np.ndarray,
+        class_log_prior: np.ndarray,
+        meta: dict | None = None,
+    ):
+        self.categories = categories
+        self.vocabulary = vocabulary
+        self.feature_log_prob = feature_log_prob
+        self.class_log_prior = class_log_prior
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(cls, descriptions: list[str], labels: list[str], alpha: float = 0.1) -> 'NaiveBayesClassifier':
+        """
+        摘要と分類の組から学習する
+
+        Args:
+            descriptions: 摘要
+            labels: 各摘要の分類
+            alpha: 加算スムージングの値
+
+        Returns:
+            学習したモデル
+        """
+        categories = sorted(set(labels))
+        category_index = {category: i for i, category in enumerate(categories)}
+        vocabulary = {}
+        rows, cols, values = [], [], []
+        for description, label in zip(descriptions, labels):
+            row = category_index[label]
+            for gram, count in ngrams(description).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(gram, len(vocabulary)))
+                values.append(count)
+
+        feature_counts = np.zeros((len(categories), len(vocabulary)), dtype=np.float64)
+        np.add.at(feature_counts, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), values)
+        smoothed = feature_counts + alpha
+        feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+
+        class_counts = np.array([Counter(labels)[category] for category in categories], dtype=np.float64)
+        class_log_prior = np.log(class_counts) - np.log(class_counts.sum())
+
+        return cls(
+            categories,
+            vocabulary,
+            feature_log_prob.astype(np.float32),
+            class_log_prior,
+            {'samples': len(labels), 'alpha': alpha},
+        )
+
+    def _features(self, descriptions: list[str]) -> tuple[list[int], np.ndarray, np.ndarray, np.ndarray]:
+        """学習済みのn-gramを含む摘要の位置と、連結した列番号・回数・各摘要の開始位置"""
+        known, cols, values, offsets = [], [], [], []
+        for i, description in enumerate(descriptions):
+            start = len(cols)
+            for gram, count in ngrams(description).items():
+                col = self.vocabulary.get(gram)
+                if col is not None:
+                    cols.append(col)
+                    values.append(count)
+            if len(cols) > start:
+                known.append(i)
+                offsets.append(start)
+        return (
+            known,
+            np.array(cols, dtype=np.int64),
+            np.array(values, dtype=np.float32),
+            np.array(offsets, dtype=np.int64),
+        )
+
+    def predict_proba(self, descriptions: list[str]) -> tuple[list[int], np.ndarray]:
+        """
+        摘要ごとの分類の確率をまとめて計算する
+
+        Returns:
+            (確率を計算できた摘要の位置, 確率の行列 [摘要 × カテゴリー])。
+            学習済みのn-gramを1つも含まない摘要は計算しない
+        """
+        known_all = []
+        probabilities = []
+        for start in range(0, len(descriptions), _PREDICT_BATCH_SIZE):
+            known, cols, values, offsets = self._features(descriptions[start:start + _PREDICT_BATCH_SIZE])
+            if not known:
+                continue
+            # 摘要ごとの対数尤度 = Σ 回数 × log P(n-gram | 分類)（摘要の区間ごとに合計）
+            log_likelihood = np.add.reduceat(self.feature_log_prob[:, cols] * values, offsets, axis=1)
+            scores = log_likelihood.T + self.class_log_prior
+            scores -= scores.max(axis=1, keepdims=True)
+            exp = np.exp(scores)
+            probabilities.append(exp / exp.sum(axis=1, keepdims=True))
+            known_all.extend(start + i for i in known)
+
+        if not probabilities:
+            return [], np.zeros((0, len(self.categories)))
+        return known_all, np.vstack(probabilities)
+
+    def predict(self, descriptions: Iterable[str], top_n: int = 3, min_score: int = 0) -> dict[str, list[tuple[str, int]]]:
+        """
+        摘要ごとの上位の分類候補を返す（同じ摘要は1回だけ計算する）
+
+        Args:
+            descriptions: 摘要
+            top_n: 返す候補数
+            min_score: 候補に含める最低スコア（確率 × 100）
+
+        Returns:
+            {摘要: [(カテゴリー, スコア), ...]}（スコアの降順。候補のない摘要は含まない）
+        """
+        unique = list(dict.fromkeys(d for d in descriptions if d))
+        known, probabilities = self.predict_proba(unique)
+        result = {}
+        for row, i in enumerate(known):
+            scores = np.rint(probabilities[row] * 100).astype(int)
+            order = np.argsort(-probabilities[row], kind='stable')[:top_n]
+            top = [(self.categories[j], int(scores[j])) for j in order if scores[j] >= min_score]
+            if top:
+                result[unique[i]] = top
+        return result
+
+    def save(self, path: Path):
+        """モデルを npz 形式で保存する（一時ファイルに書いてから置き換える）"""
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        meta = {**self.meta, 'format': MODEL_FORMAT}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    categories=np.array(self.categories, dtype=str),
+                    vocabulary=np.array(vocabulary, dtype=str),
+                    feature_log_prob=self.feature_log_prob,
+                    class_log_prior=self.class_log_prior,
+                    meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> 'NaiveBayesClassifier':
+        """save で保存したモデルを読み込む（形式の版が異なる場合は ValueError）"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') != MODEL_FORMAT:
+                raise ValueError(f"モデルの形式が異なります: {path.name} (format={meta.get('format')})")
+            return cls(
+                data['categories'].tolist(),
+                {gram: i for i, gram in enumerate(data['vocabulary'].tolist())},
+                data['feature_log_prob'],
+                data['class_log_prior'],
+                meta,
+            )
+
+
+# =============================================================================
+# 版管理・遅延読み込み
+# =============================================================================
+
+_loaded: tuple[Optional[Path], Optional[NaiveBayesClassifier]] = (None, None)
+_load_lock = threading.Lock()
+
+
+def model_dir() -> Path:
+    return Path(settings.LEARNED_MODEL_DIR)
+
+
+def _model_files() -> list[tuple[int, Path]]:
+    """保存済みのモデルファイルを版数の昇順で返す"""
+    directory = model_dir()
+    if not directory.is_dir():
+        return []
+    files = []
+    for path in directory.iterdir():
+        match = _MODEL_FILE_RE.match(path.name)
+        if match:
+            files.append((int(match.group(1)), path))
+    return sorted(files)
+
+
+def current_version() -> int:
+    """最新のモデルの版数（モデルがなければ0）"""
+    files = _model_files()
+    return files[-1][0] if files else 0
+
+
+def current_modified() -> Optional[datetime]:
+    """最新のモデルを保存した日時（モデルがなければ None。Last-Modified に使う）"""
+    files = _model_files()
+    if not files:
+        return None
+    try:
+        return datetime.fromtimestamp(files[-1][1].stat().st_mtime, tz=dt_timezone.utc)
+    except OSError:
+        return None
+
+
+def save_model(model: NaiveBayesClassifier, keep: int = 3) -> tuple[int, Path]:
+    """
+    モデルを次の版数で保存し、古い版を keep 個まで残して削除する
+
+    Returns:
+        (版数, 保存したファイルのパス)
+    """
+    version = current_version() + 1
+    model.meta.update(version=version, trained_at=timezone.now().isoformat())
+    path = model_dir() / f'classifier-{version:04d}.npz'
+    model.save(path)
+    for _, old in _model_files()[:-keep]:
+        old.unlink(missing_ok=True)
+    logger.info(f"学習済みモデルを保存: {path.name} (samples={model.meta.get('samples')})")
+    return version, path
+
+
+def get_model() -> Optional[NaiveBayesClassifier]:
+    """最新のモデルを返す（初回と新しい版が保存されたときだけファイルを読む。モデルがなければ None）"""
+    global _loaded
+    files = _model_files()
+    if not files:
+        return None
+    path = files[-1][1]
+    loaded_path, model = _loaded
+    if loaded_path == path:
+        return model
+    with _load_lock:
+        if _loaded[0] != path:
+            try:
+                _loaded = (path, NaiveBayesClassifier.load(path))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"学習済みモデルを読み込めません: {path.name}: {e}")
+                _loaded = (path, None)
+        return _loaded[1]
+
+
+def get_learned_suggestions(
+    descriptions: Iterable[str],
+    top_n: int = 3,
+    min_score: int = 0,
+) -> dict[str, list[tuple[str, int]]]:
+    """
+    学習済みモデルによる摘要ごとの分類候補（get_fuzzy_suggestions と並べて使う）
+
+    摘要をまとめて推論する。モデルが保存されていなければ空の辞書を返す。
+
+    Returns:
+        {摘要: [(カテゴリー, スコア), ...]}
+    """
+    model = get_model()
+    if model is None:
+        return {}
+    return model.predict(descriptions, top_n=top_n, min_score=min_score)
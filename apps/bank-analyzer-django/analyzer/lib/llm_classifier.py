@@ -3,7 +3,7 @@ import pandas as pd
 from rapidfuzz import process, fuzz
 from typing import Optional
 
-from .config import get_classification_patterns, get_gift_threshold, get_fuzzy_config
+from .config import add_version_listener, get_classification_patterns, get_gift_threshold, get_fuzzy_config
 from .constants import UNCATEGORIZED, normalize_patterns
 
 logger = logging.getLogger(__name__)
@@ -88,14 +88,33 @@ def _merge_keywords(category: str, case_patterns: dict, global_patterns: dict) -
     return list(set(case_patterns.get(category, []) + global_patterns.get(category, [])))
 
 
+def _keyword_match(text_lower: str, category: str, case_patterns: dict, global_patterns: dict) -> tuple[str, str] | None:
+    """カテゴリーのキーワード（案件固有 → グローバル）で摘要に含まれる最初のものを (スコープ, キーワード) で返す"""
+    for scope_name, patterns in (("case", case_patterns), ("global", global_patterns)):
+        for keyword in patterns.get(category, []):
+            if keyword.lower() in text_lower:
+                return scope_name, keyword
+    return None
+
+
 def _fuzzy_match_category(
     text: str,
     case_patterns: dict,
     global_patterns: dict,
     fuzzy_config: dict,
 ) -> tuple[Optional[str], int]:
+    """ファジーマッチングで分類を試行（(カテゴリー, スコア) を返す）"""
+    return _fuzzy_match_keyword(text, case_patterns, global_patterns, fuzzy_config)[:2]
+
+
+def _fuzzy_match_keyword(
+    text: str,
+    case_patterns: dict,
+    global_patterns: dict,
+    fuzzy_config: dict,
+) -> tuple[Optional[str], int, str, str]:
     """
-    ファジーマッチングで分類を試行
+    ファジーマッチングで分類を試行し、一致したキーワードも返す
 
     評価順序:
     1. 案件固有パターン（キーワード数が少ないカテゴリーから）
@@ -109,10 +128,11 @@ def _fuzzy_match_category(
         fuzzy_config: ファジーマッチング設定
 
     Returns:
-        (マッチしたカテゴリー, スコア) のタプル。マッチしない場合は (None, 0)
+        (マッチしたカテゴリー, スコア, スコープ, キーワード) のタプル。
+        マッチしない場合は (None, 0, '', '')
     """
     if not text or not fuzzy_config.get("enabled", False):
-        return None, 0
+        return None, 0, "", ""
 
     threshold = fuzzy_config.get("threshold", 90)
     use_token_set = fuzzy_config.get("use_token_set_ratio", True)
@@ -128,10 +148,12 @@ def _fuzzy_match_category(
 
     best_category = None
     best_score = 0
+    best_scope = ""
+    best_keyword = ""
 
     def _evaluate_patterns(patterns: dict, scope_name: str):
         """パターン辞書を評価してベストマッチを更新"""
-        nonlocal best_category, best_score
+        nonlocal best_category, best_score, best_scope, best_keyword
 
         # キーワード数の昇順でソート（少ないものが先）
         sorted_categories = _sort_categories_by_keyword_count(
@@ -149,6 +171,8 @@ def _fuzzy_match_category(
             if result and result[1] > best_score:
                 best_category = category
                 best_score = result[1]
+                best_scope = scope_name
+                best_keyword = result[0]
                 logger.debug(f"Fuzzy match ({scope_name}): '{text}' -> {category} (score={result[1]})")
 
                 # 完全一致に近い場合は即座に返す（最適化）
@@ -159,7 +183,7 @@ def _fuzzy_match_category(
 
     def _cache_and_return():
         """現在のベストマッチをキャッシュして返す"""
-        result = (best_category, best_score)
+        result = (best_category, best_score, best_scope, best_keyword)
         _fuzzy_cache.set(text, combined_key, result)
         return result
 
@@ -198,6 +222,35 @@ def classify_by_rules(
     """
     ルールベースで取引を分類（ファジーマッチング対応）
 
+    評価順序・引数は classify_with_match と同じ。
+
+    Returns:
+        (分類, 信頼度スコア) のタプル
+    """
+    return classify_with_match(
+        text, amount_out, amount_in,
+        case_patterns=case_patterns,
+        global_patterns=global_patterns,
+        patterns=patterns,
+        gift_threshold=gift_threshold,
+        fuzzy_config=fuzzy_config,
+    )[:2]
+
+
+def classify_with_match(
+    text: str,
+    amount_out: int,
+    amount_in: int,
+    *,
+    case_patterns: dict | None = None,
+    global_patterns: dict | None = None,
+    patterns: dict | None = None,
+    gift_threshold: int | None = None,
+    fuzzy_config: dict | None = None,
+) -> tuple[str, int, str, str]:
+    """
+    ルールベースで取引を分類し、分類の根拠になったキーワードも返す
+
     評価順序:
     1. 案件固有パターン（サブストリング、キーワード数少ない順）
     2. グローバルパターン（サブストリング、キーワード数少ない順）
@@ -216,7 +269,8 @@ def classify_by_rules(
         fuzzy_config: ファジーマッチング設定（省略時はload_user_settingsから取得）
 
     Returns:
-        (分類, 信頼度スコア) のタプル
+        (分類, 信頼度スコア, スコープ, キーワード) のタプル。
+        スコープは 'case' / 'global'、キーワードに一致しなかった場合は両方とも空文字
     """
     # 後方互換性: patterns が指定されていて case/global が未指定の場合
     if global_patterns is None:
@@ -231,16 +285,16 @@ def classify_by_rules(
         fuzzy_config = get_fuzzy_config()
 
     if not text:
-        return UNCATEGORIZED, 0
+        return UNCATEGORIZED, 0, "", ""
 
     text_lower = text.lower()
 
-    def _substring_match(patterns_dict: dict, scope_name: str) -> tuple[str, int] | None:
+    def _substring_match(patterns_dict: dict, scope_name: str) -> tuple[str, int, str, str] | None:
         """
         サブストリングマッチングでカテゴリーを検索
 
         Returns:
-            マッチした場合は (カテゴリー, 100)、なければ None
+            マッチした場合は (カテゴリー, 100, スコープ, キーワード)、なければ None
         """
         # キーワード数の昇順でソート（少ないものが先）
         sorted_categories = _sort_categories_by_keyword_count(
@@ -252,7 +306,7 @@ def classify_by_rules(
             for keyword in keywords:
                 if keyword.lower() in text_lower:
                     logger.debug(f"Substring match ({scope_name}): '{text}' -> {category}")
-                    return category, 100
+                    return category, 100, scope_name, keyword
         return None
 
     # Phase 1: サブストリングマッチング（案件固有を先に評価）
@@ -268,28 +322,30 @@ def classify_by_rules(
         return result
 
     # 贈与判定（振込など）- 閾値以上の場合のみ
-    all_gift_keywords = _merge_keywords(GIFT_CATEGORY, case_patterns, global_patterns)
-    if any(kw.lower() in text_lower for kw in all_gift_keywords):
-        if amount_out >= gift_threshold:
-            return GIFT_CATEGORY, 100
-        # else: 閾値未満の場合はファジーマッチングに進む
+    gift_match = _keyword_match(text_lower, GIFT_CATEGORY, case_patterns, global_patterns)
+    if gift_match and amount_out >= gift_threshold:
+        return (GIFT_CATEGORY, 100, *gift_match)
+    # else: 閾値未満の場合はファジーマッチングに進む
 
     # Phase 2: ファジーマッチング（サブストリングマッチング失敗時）
     if fuzzy_config.get("enabled", False):
-        category, score = _fuzzy_match_category(
+        category, score, scope, keyword = _fuzzy_match_keyword(
             text, case_patterns, global_patterns, fuzzy_config
         )
         if category:
-            return category, score
+            return category, score, scope, keyword
 
     # Phase 3: 「その他」カテゴリー（常に最後に評価）
-    all_other_keywords = _merge_keywords("その他", case_patterns, global_patterns)
+    other_match = _keyword_match(text_lower, "その他", case_patterns, global_patterns)
+    if other_match:
+        return ("その他", 100, *other_match)
+
+    return UNCATEGORIZED, 0, "", ""
 
-    for kw in all_other_keywords:
-        if kw.lower() in text_lower:
-            return "その他", 100
 
-    return UNCATEGORIZED, 0
+def suggestion_score_floor(threshold: int) -> int:
+    """AI分類タブの閾値に対して候補として表示する最低スコア"""
+    return max(threshold - _SUGGESTION_THRESHOLD_OFFSET, _SUGGESTION_THRESHOLD_MIN)
 
 
 def get_fuzzy_suggestions(
@@ -330,10 +386,7 @@ def get_fuzzy_suggestions(
     if not text or not fuzzy_config.get("enabled", False):
         return []
 
-    threshold = max(
-        fuzzy_config.get("threshold", 90) - _SUGGESTION_THRESHOLD_OFFSET,
-        _SUGGESTION_THRESHOLD_MIN,
-    )
+    threshold = suggestion_score_floor(fuzzy_config.get("threshold", 90))
     use_token_set = fuzzy_config.get("use_token_set_ratio", True)
 
     # カテゴリーごとの最高スコアを記録
@@ -402,9 +455,12 @@ def classify_transactions(
     if "category" not in df.columns:
         df["category"] = None
 
-    # 信頼度スコア列を追加
+    # 信頼度スコア列・分類の根拠（一致したキーワード）列を追加
     if "classification_score" not in df.columns:
         df["classification_score"] = 0
+    for column in ("match_scope", "match_keyword"):
+        if column not in df.columns:
+            df[column] = ""
 
     # 分類対象: 摘要があり、まだ分類されていないもの
     target_mask = (
@@ -437,7 +493,7 @@ def classify_transactions(
         description = str(row["description"])
 
         if description not in classification_cache:
-            category, score = classify_by_rules(
+            classification_cache[description] = classify_with_match(
                 description,
                 row.get("amount_out", 0) or 0,
                 row.get("amount_in", 0) or 0,
@@ -446,7 +502,6 @@ def classify_transactions(
                 gift_threshold=gift_threshold,
                 fuzzy_config=fuzzy_config,
             )
-            classification_cache[description] = (category, score)
 
     # 分類結果を反映
     df.loc[target_mask, "category"] = df.loc[target_mask, "description"].map(
@@ -455,6 +510,12 @@ def classify_transactions(
     df.loc[target_mask, "classification_score"] = df.loc[target_mask, "description"].map(
         lambda d: classification_cache[d][1]
     )
+    df.loc[target_mask, "match_scope"] = df.loc[target_mask, "description"].map(
+        lambda d: classification_cache[d][2]
+    )
+    df.loc[target_mask, "match_keyword"] = df.loc[target_mask, "description"].map(
+        lambda d: classification_cache[d][3]
+    )
 
     # 統計情報をログ出力
     fuzzy_matches = (df.loc[target_mask, "classification_score"] < 100).sum()
@@ -464,6 +525,9 @@ def classify_transactions(
 
 
 def clear_fuzzy_cache():
-    """ファジーマッチングキャッシュをクリア（設定変更時に呼び出し）"""
+    """ファジーマッチングキャッシュをクリア（設定版数が変わると各プロセスで自動的に呼ばれる）"""
     _fuzzy_cache.clear()
     logger.info("Fuzzy matching cache cleared")
+
+
+add_version_listener(clear_fuzzy_cache)
@@ -0,0 +1,198 @@
+"""
+SQLite の全文検索（FTS5 trigram）による摘要検索
+
+PostgreSQL では description_search の trigram GIN インデックスで部分一致検索を行う。
+SQLite では同じ列を FTS5 の trigram 仮想テーブル（外部コンテンツ）に索引し、
+取引テーブルのトリガーで追加・更新・削除に追従させる。生SQLでの一括登録
+（insert_columns）や bulk_update も含め、どの経路で変更しても索引がずれない。
+
+Django の SQLite でのスキーマ変更（AlterField など）は取引テーブルを作り直すため、
+トリガーが消えて仮想テーブルだけが残る。トリガーがそろっていない索引は使わず
+（部分一致だけで検索する）、マイグレーション後の post_migrate で repair が
+トリガーを作り直して索引を再構築する。
+
+filter_by_keyword は3文字以上のキーワードをこの索引で絞り込み、そのうえで従来どおり
+description_search の部分一致で確定する（trigram は3文字未満の語を検索できないため、
+短いキーワードは部分一致だけで判定する）。仮想テーブルがない場合（SQLite の trigram
+非対応・マイグレーション未適用）や PostgreSQL では何もしない。
+"""
+import logging
+
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# trigram トークナイザーで検索できる最短の語の長さ
+MIN_TERM_LENGTH = 3
+
+# {DB別名: 存在する FTS テーブル名のセット}（接続を開いたときに読み直す）
+_available: dict[str, set[str]] = {}
+
+
+# 同期用トリガー名の接尾辞（追加・削除・更新）
+_TRIGGER_SUFFIXES = ('ai', 'ad', 'au')
+
+
+def fts_table(db_table: str) -> str:
+    """取引テーブルに対応する FTS5 仮想テーブルの名前"""
+    return f'{db_table}_fts'
+
+
+def _statements(db_table: str, column: str) -> list[str]:
+    fts = fts_table(db_table)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5("
+        f"{column}, content='{db_table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {db_table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        # 既存の取引を索引する
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install(connection, db_table: str = 'analyzer_transaction', column: str = 'description_search') -> bool:
+    """
+    FTS5 仮想テーブルと同期用トリガーを作成する（SQLite 以外では何もしない）
+
+    Returns:
+        作成した場合 True（SQLite が trigram トークナイザーに対応していない場合は False）
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    statements = _statements(db_table, column)
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(statements[0])
+        except OperationalError as e:
+            logger.warning(f"SQLite の FTS5 trigram が使えないため、摘要検索は部分一致で行います: {e}")
+            return False
+        for sql in statements[1:]:
+            cursor.execute(sql)
+    _fts_tables(connection).add(fts_table(db_table))
+    return True
+
+
+def uninstall(connection, db_table: str = 'analyzer_transaction'):
+    """install で作成した仮想テーブルとトリガーを削除する"""
+    if connection.vendor != 'sqlite':
+        return
+    fts = fts_table(db_table)
+    with connection.cursor() as cursor:
+        _drop_triggers(cursor, fts)
+        cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+    _fts_tables(connection).discard(fts)
+
+
+def _drop_triggers(cursor, fts: str):
+    for suffix in _TRIGGER_SUFFIXES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+
+
+def repair(connection, db_table: str = 'analyzer_transaction', column: str = 'description_search') -> bool:
+    """
+    トリガーが失われた FTS 索引を作り直す（テーブルを作り直すマイグレーションの後に呼ぶ）
+
+    仮想テーブルがあって同期用トリガーがそろっていない場合だけ、トリガーを作成して
+    索引を取引テーブルから再構築する。
+
+    Returns:
+        作り直した場合 True
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    fts = fts_table(db_table)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts])
+        exists = cursor.fetchone() is not None
+    if not exists or fts in refresh(connection):
+        return False
+    with connection.cursor() as cursor:
+        _drop_triggers(cursor, fts)
+        for sql in _statements(db_table, column)[1:]:
+            cursor.execute(sql)
+    refresh(connection)
+    logger.warning(f"摘要検索の FTS 索引のトリガーが失われていたため作り直しました: {fts}")
+    return True
+
+
+def repair_after_migrate(sender, using, **kwargs):
+    """post_migrate のハンドラー（AnalyzerConfig.ready で接続する）"""
+    repair(connections[using])
+
+
+def _load_fts_tables(connection) -> set[str]:
+    """同期用トリガーがすべてそろっている FTS テーブルの名前"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s ESCAPE '\\'",
+            [r'%\_fts%'],
+        )
+        rows = cursor.fetchall()
+    triggers = {name for type_, name in rows if type_ == 'trigger'}
+    return {
+        name for type_, name in rows
+        if type_ == 'table' and name.endswith('_fts')
+        and all(f'{name}_{suffix}' in triggers for suffix in _TRIGGER_SUFFIXES)
+    }
+
+
+def refresh(connection) -> set[str]:
+    """使える FTS テーブルを読み直す（スキーマを変更した後に呼ぶ）"""
+    _available[connection.alias] = _load_fts_tables(connection)
+    return _available[connection.alias]
+
+
+def _fts_tables(connection) -> set[str]:
+    if connection.alias not in _available:
+        _available[connection.alias] = _load_fts_tables(connection)
+    return _available[connection.alias]
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    # 検索のたびに確認しないよう、接続を開いたときに FTS テーブルの有無を読んでおく
+    if connection.vendor == 'sqlite':
+        refresh(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='analyzer.sqlite_fts.connection_created')
+
+
+def is_available(connection, db_table: str) -> bool:
+    """FTS5 仮想テーブルと同期用トリガーがそろっているか"""
+    if connection.vendor != 'sqlite':
+        return False
+    return fts_table(db_table) in _fts_tables(connection)
+
+
+def match_query(keywords: list[str]) -> str:
+    """3文字以上のキーワードを AND でつないだ FTS5 の検索式（対象がなければ空文字）"""
+    terms = [
+        '"' + keyword.replace('"', '""') + '"'
+        for keyword in keywords
+        if len(keyword) >= MIN_TERM_LENGTH
+    ]
+    return ' AND '.join(terms)
+
+
+def filter_match(queryset, keywords: list[str]):
+    """
+    正規化済みのキーワードを FTS5 の索引で絞り込む（使えない場合は queryset をそのまま返す）
+
+    索引は候補の絞り込みにだけ使い、一致の判定は呼び出し側の部分一致で行う。
+    """
+    query = match_query(keywords)
+    if not query:
+        return queryset
+    connection = connections[queryset.db]
+    db_table = queryset.model._meta.db_table
+    if not is_available(connection, db_table):
+        return queryset
+    fts = fts_table(db_table)
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [query]))
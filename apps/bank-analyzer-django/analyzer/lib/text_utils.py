@@ -6,6 +6,8 @@
 """
 import unicodedata
 
+from . import sqlite_fts
+
 # カタカナ→ひらがな変換テーブル（NFKC後の全角カタカナに適用）
 _KATAKANA_TO_HIRAGANA = str.maketrans(
     'アイウエオカキクケコサシスセソタチツテト'
@@ -64,6 +66,8 @@ def filter_by_keyword(items, keyword: str):
 
     QuerySet・list[dict]・list[Model] いずれにも対応する。
     QuerySetの場合は検索条件をSQLへ追加し、遅延評価のまま返す。
+    SQLite では3文字以上のキーワードを FTS5 trigram の索引で絞り込んでから
+    部分一致で確定する（PostgreSQL では trigram GIN インデックスが使われる）。
 
     Args:
         items: QuerySet, list[dict], or list[Model]
@@ -81,6 +85,7 @@ def filter_by_keyword(items, keyword: str):
 
     # 正規化済みの検索列を使い、AND条件をDB側で評価する。
     if hasattr(items, 'model'):
+        items = sqlite_fts.filter_match(items, keywords)
         for kw in keywords:
             items = items.filter(description_search__contains=kw)
         return items
@@ -97,28 +102,3 @@ def filter_by_keyword(items, keyword: str):
         item for item in items
         if matches_all_keywords(getattr(item, 'description', ''), keywords)
     ]
-
-
-def df_filter_by_keyword(df, keyword: str, column: str = 'description'):
-    """DataFrameをキーワードでフィルタリングする
-
-    filter_by_keyword のDataFrame特化版。
-    descriptionカラム（またはcolumn指定）に対してAND検索を行う。
-
-    Args:
-        df: pandas DataFrame
-        keyword: 検索キーワード（空文字の場合はそのまま返す）
-        column: フィルタ対象カラム名
-
-    Returns:
-        フィルタ適用後のDataFrame
-    """
-    if not keyword:
-        return df
-
-    keywords = split_keywords(keyword)
-    if not keywords:
-        return df
-
-    mask = df[column].fillna('').apply(lambda d: matches_all_keywords(d, keywords))
-    return df[mask].copy()
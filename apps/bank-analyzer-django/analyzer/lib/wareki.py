@@ -0,0 +1,70 @@
+"""
+和暦変換
+
+日付を変換する format_wareki を提供する。取引は同じ日付が多いため、
+日付・書式ごとの結果をキャッシュし、画面表示・エクスポートで同じ日付を何度も変換しない。
+
+書式:
+    'full'  -> "令和6年1月26日"（元年は「元年」）
+    'short' -> "R6.1.26"
+    'year'  -> "令和6年"
+明治より前の日付は西暦で表記する。
+"""
+from datetime import date
+from functools import lru_cache
+
+from .constants import ERAS
+
+
+def get_japanese_era(d: date) -> tuple[str, int]:
+    """
+    日付から元号と年を取得
+
+    Args:
+        d: 日付
+
+    Returns:
+        (元号名, 和暦年) のタプル
+    """
+    for era_start, era_name, _ in ERAS:
+        if d >= era_start:
+            year = d.year - era_start.year + 1
+            return era_name, year
+    # 明治以前は西暦を返す
+    return "", d.year
+
+
+@lru_cache(maxsize=8192)
+def format_wareki(value: date, format_type: str = 'full') -> str:
+    """
+    日付を和暦文字列に変換（同じ日付・書式の結果はキャッシュする）
+
+    Args:
+        value: 日付（datetime は呼び出し側で date に変換しておく）
+        format_type: 'full', 'short', 'year'
+    """
+    era_name, era_year = get_japanese_era(value)
+
+    if not era_name:
+        # 明治以前
+        if format_type == 'short':
+            return f"{value.year}.{value.month}.{value.day}"
+        elif format_type == 'year':
+            return f"{value.year}年"
+        return f"{value.year}年{value.month}月{value.day}日"
+
+    # 元年表記
+    year_str = "元" if era_year == 1 else str(era_year)
+
+    if format_type == 'short':
+        # 略称形式: R6.1.26
+        for era_start, _, era_abbr in ERAS:
+            if value >= era_start:
+                return f"{era_abbr}{era_year}.{value.month}.{value.day}"
+
+    elif format_type == 'year':
+        # 年のみ: 令和6年
+        return f"{era_name}{year_str}年"
+
+    # フル形式: 令和6年1月26日
+    return f"{era_name}{year_str}年{value.month}月{value.day}日"
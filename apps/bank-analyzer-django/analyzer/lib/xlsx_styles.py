@@ -0,0 +1,97 @@
+"""
+Excel出力の共通セルスタイル
+
+フォント・塗り・罫線・配置・表示形式の組を NamedStyle としてワークブックに
+一度だけ登録し、各セルにはスタイル名で適用する。セルごとに Font や Border を
+生成すると保存時に openpyxl が重複排除する必要があり、生成時間と
+スタイルテーブルのサイズが増えるため、全てのExcel出力でこの登録簿を使う。
+"""
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+FONT_NAME = '游ゴシック'
+AMOUNT_FORMAT = '#,##0'
+
+# --- 汎用（取引一覧・月次集計） ---
+STYLE_TITLE = 'ba_title'            # 帳票タイトル
+STYLE_BANNER = 'ba_banner'          # 色付きの見出しバー
+STYLE_LABEL = 'ba_label'            # 項目名（お客様名など）
+STYLE_VALUE = 'ba_value'            # 項目値
+STYLE_HEADER = 'ba_header'          # 表の見出し行
+STYLE_DATE = 'ba_date'              # 和暦日付
+STYLE_AMOUNT = 'ba_amount'          # 金額（カンマ区切り）
+STYLE_LARGE = 'ba_large'            # 多額取引の金額
+STYLE_FLAGGED = 'ba_flagged'        # 付箋付き取引の摘要
+
+# --- 通帳有無一覧表 ---
+STYLE_INV_SUBTITLE = 'ba_inv_subtitle'  # 相続開始日
+STYLE_INV_NOTE = 'ba_inv_note'          # 作成日
+STYLE_INV_HEADER = 'ba_inv_header'      # 見出し
+STYLE_INV_BORDER = 'ba_inv_border'      # 罫線のみ
+STYLE_INV_CENTER = 'ba_inv_center'      # 中央寄せ
+STYLE_INV_INFO = 'ba_inv_info'          # 口座情報（入力欄色）
+STYLE_INV_YEAR = 'ba_inv_year'          # 年別の有無（入力欄色）
+STYLE_INV_TEXT = 'ba_inv_text'          # 備考
+STYLE_INV_AMOUNT = 'ba_inv_amount'      # 残高
+STYLE_INV_TOTAL_LABEL = 'ba_inv_total_label'  # 合計行「計」
+STYLE_INV_TOTAL = 'ba_inv_total'        # 合計金額
+
+
+def _build_styles() -> list[NamedStyle]:
+    thin = Side(style='thin')
+    grid = Border(left=thin, right=thin, top=thin, bottom=thin)
+    peach = PatternFill('solid', fgColor='FFDAB9')
+    inv_font = Font(name=FONT_NAME, size=9)
+    inv_bold = Font(name=FONT_NAME, size=9, bold=True)
+    center_wrap = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    left_wrap = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    right = Alignment(horizontal='right', vertical='center')
+
+    return [
+        NamedStyle(STYLE_TITLE, font=Font(name=FONT_NAME, size=14, bold=True)),
+        NamedStyle(
+            STYLE_BANNER,
+            font=Font(name=FONT_NAME, size=16, bold=True, color='FFFFFF'),
+            fill=PatternFill('solid', fgColor='2563EB'),
+            alignment=Alignment(horizontal='left', vertical='center'),
+        ),
+        NamedStyle(STYLE_LABEL, font=Font(name=FONT_NAME, bold=True, color='475569')),
+        NamedStyle(STYLE_VALUE, font=Font(name=FONT_NAME, color='0F172A')),
+        NamedStyle(
+            STYLE_HEADER,
+            font=Font(name=FONT_NAME, bold=True, color='0F172A'),
+            fill=PatternFill('solid', fgColor='E2E8F0'),
+            border=Border(bottom=Side(style='thin', color='94A3B8')),
+            alignment=Alignment(horizontal='center', vertical='center'),
+        ),
+        NamedStyle(STYLE_DATE, alignment=Alignment(horizontal='center')),
+        NamedStyle(STYLE_AMOUNT, number_format=AMOUNT_FORMAT, alignment=Alignment(horizontal='right')),
+        NamedStyle(
+            STYLE_LARGE,
+            number_format=AMOUNT_FORMAT,
+            font=Font(bold=True, color='DC3545'),
+            alignment=Alignment(horizontal='right'),
+        ),
+        NamedStyle(STYLE_FLAGGED, fill=PatternFill('solid', fgColor='FFE5CC')),
+
+        NamedStyle(STYLE_INV_SUBTITLE, font=Font(name=FONT_NAME, size=12),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle(STYLE_INV_NOTE, font=Font(name=FONT_NAME, size=8),
+                   alignment=Alignment(horizontal='right', vertical='center', wrap_text=True)),
+        NamedStyle(STYLE_INV_HEADER, font=inv_bold, alignment=center_wrap, border=grid),
+        NamedStyle(STYLE_INV_BORDER, border=grid),
+        NamedStyle(STYLE_INV_CENTER, font=inv_font, alignment=center_wrap, border=grid),
+        NamedStyle(STYLE_INV_INFO, font=inv_font, alignment=left_wrap, border=grid, fill=peach),
+        NamedStyle(STYLE_INV_YEAR, font=inv_font, alignment=center_wrap, border=grid, fill=peach),
+        NamedStyle(STYLE_INV_TEXT, font=inv_font, alignment=left_wrap, border=grid),
+        NamedStyle(STYLE_INV_AMOUNT, font=inv_font, alignment=right, border=grid, number_format=AMOUNT_FORMAT),
+        NamedStyle(STYLE_INV_TOTAL_LABEL, font=inv_bold, alignment=right, border=grid),
+        NamedStyle(STYLE_INV_TOTAL, font=inv_bold, alignment=right, border=grid, number_format=AMOUNT_FORMAT),
+    ]
+
+
+def register_styles(workbook) -> None:
+    """ワークブックに共通スタイルを登録する（登録済みの名前はスキップ）"""
+    registered = set(workbook.named_styles)
+    for style in _build_styles():
+        if style.name not in registered:
+            workbook.add_named_style(style)
@@ -0,0 +1,134 @@
+"""
+Excel書き出しエンジン
+
+openpyxl の write_only モードで行を逐次書き出す。
+通常モードと違いシート全体のセルをメモリに保持しないため、
+行数の多い案件でも生成時間・メモリ使用量が行数に比例して膨らまない。
+
+write_only モードの制約:
+    - 列幅・印刷設定は行を書き込む前に設定する
+    - セルの書式は行ごとに WriteOnlyCell で指定する（後から変更できない）
+    - 結合セルは merged_cells に範囲を追加する
+
+セルの書式は xlsx_styles の共通スタイル名で指定する。
+"""
+import tempfile
+from typing import IO, Any, Iterable, Sequence
+
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.properties import PageSetupProperties
+
+from .xlsx_styles import STYLE_HEADER, register_styles
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# シート名の最大文字数（Excelの制限）
+MAX_SHEET_TITLE = 31
+
+
+class XlsxSheet:
+    """write_only シートへの行追加を担う
+
+    column_styles に列番号（0始まり）→ スタイル名を指定すると、
+    append した行の該当列にそのスタイルを適用する。
+    """
+
+    def __init__(self, worksheet, column_styles: dict[int, str] | None = None):
+        self.worksheet = worksheet
+        self.column_styles = column_styles or {}
+        self.row_count = 0
+
+    def cell(self, value: Any = None, style: str | None = None) -> Cell:
+        """スタイル名を適用したセルを作成（append に渡す）"""
+        cell = WriteOnlyCell(self.worksheet, value)
+        if style:
+            cell.style = style
+        return cell
+
+    def append_header(self, values: Iterable[Any], style: str = STYLE_HEADER) -> None:
+        """見出し行を追加"""
+        self.worksheet.append([self.cell(value, style) for value in values])
+        self.row_count += 1
+
+    def append(self, values: Sequence[Any], styles: dict[int, str] | None = None) -> None:
+        """列スタイルを適用して行を追加
+
+        Args:
+            values: 行の値（Cell を渡した列はそのまま使う）
+            styles: この行だけ列スタイルを上書きする 列番号 → スタイル名
+        """
+        column_styles = {**self.column_styles, **styles} if styles else self.column_styles
+        if column_styles:
+            values = list(values)
+            for idx, style in column_styles.items():
+                if idx < len(values) and not isinstance(values[idx], Cell):
+                    values[idx] = self.cell(values[idx], style)
+        self.worksheet.append(values)
+        self.row_count += 1
+
+    def merge(self, start_row: int, start_column: int, end_row: int, end_column: int) -> None:
+        """セル範囲を結合（値は左上セルに append 済み・予定のものが使われる）"""
+        self.worksheet.merged_cells.add(
+            f"{get_column_letter(start_column)}{start_row}:{get_column_letter(end_column)}{end_row}"
+        )
+
+
+class XlsxWriter:
+    """write_only モードのワークブックを組み立て、一時ファイルへ保存する"""
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+        register_styles(self.workbook)
+
+    def add_sheet(
+        self,
+        title: str,
+        widths: Sequence[float] = (),
+        *,
+        column_styles: dict[int, str] | None = None,
+        tab_color: str | None = None,
+        landscape: bool = False,
+        fit_to_height: int = 0,
+    ) -> XlsxSheet:
+        """
+        シートを追加する（A4・列幅1ページに収める印刷設定）
+
+        Args:
+            title: シート名（31文字を超える部分は切り捨て）
+            widths: A列からの列幅
+            column_styles: 列番号（0始まり）→ スタイル名
+            tab_color: シート見出しの色
+            landscape: 横向き印刷にするか
+            fit_to_height: 縦方向のページ数（0 は制限なし）
+        """
+        ws = self.workbook.create_sheet(title=str(title)[:MAX_SHEET_TITLE])
+        for idx, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+        if tab_color:
+            ws.sheet_properties.tabColor = tab_color
+        ws.page_setup.paperSize = 9  # A4
+        ws.page_setup.orientation = 'landscape' if landscape else 'portrait'
+        ws.page_setup.fitToWidth = 1
+        ws.page_setup.fitToHeight = fit_to_height
+        ws.sheet_properties.pageSetUpPr = PageSetupProperties(fitToPage=True)
+        return XlsxSheet(ws, column_styles)
+
+    def write(self, fp: IO[bytes]) -> None:
+        """書き込み用のバイナリファイルへ保存（write_only ワークブックは一度しか保存できない）"""
+        self.workbook.save(fp)
+
+    def save(self) -> IO[bytes]:
+        """一時ファイルに保存し、先頭に巻き戻したファイルオブジェクトを返す
+
+        ファイルは close 時に削除される（FileResponse は送信後に close する）。
+        """
+        tmp = tempfile.TemporaryFile()
+        try:
+            self.write(tmp)
+        except BaseException:
+            tmp.close()
+            raise
+        tmp.seek(0)
+        return tmp
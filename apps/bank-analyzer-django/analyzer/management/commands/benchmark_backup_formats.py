@@ -0,0 +1,107 @@
+"""
+バックアップ形式のベンチマークコマンド
+
+合成データの案件を作成し、JSON v1.1 と列指向バックアップ（v2.0 zip）について
+ファイルサイズ・出力時間・復元時間を比較する。
+計測に使った案件は最後にロールバックするため、DBには何も残らない。
+
+使用例:
+    python manage.py benchmark_backup_formats --rows 100000
+"""
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from analyzer.models import Account, Case, Transaction
+from analyzer.services import AccountStatsService, BackupService, TransactionService
+
+BANKS = [
+    ('みずほ銀行', '新宿支店', '普通', '1234567', '山田太郎'),
+    ('三菱UFJ銀行', '渋谷支店', '普通', '2345678', '山田太郎'),
+    ('ゆうちょ銀行', '〇一八店', '通常貯金', '3456789', '山田花子'),
+]
+CATEGORIES = ['生活費', '給与', '保険', '公共料金', '振込', '未分類']
+
+
+def _create_case(rows: int) -> Case:
+    case = Case.objects.create(name=f"ベンチマーク_{time.time_ns()}")
+    accounts = Account.objects.bulk_create([
+        Account(case=case, account_number=number, bank_name=bank, branch_name=branch,
+                account_type=account_type, holder=holder)
+        for bank, branch, account_type, number, holder in BANKS
+    ])
+    start = date(2015, 1, 1)
+    Transaction.objects.bulk_create([
+        Transaction(
+            case=case,
+            account=accounts[i % len(accounts)],
+            date=start + timedelta(days=i % 3650),
+            description=f'振込 テスト{i % 500}',
+            amount_out=(i * 7919) % 900_000 if i % 2 else 0,
+            amount_in=0 if i % 2 else (i * 7919) % 900_000,
+            balance=(i * 104_729) % 10_000_000,
+            category=CATEGORIES[i % len(CATEGORIES)],
+            is_large=i % 97 == 0,
+        )
+        for i in range(rows)
+    ], batch_size=5000)
+    AccountStatsService.refresh(case)
+    return case
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "JSON v1.1 と列指向バックアップのサイズ・出力時間・復元時間を比較します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='生成する取引数（デフォルト: 100000）')
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        results = []
+        with tempfile.TemporaryDirectory() as tmp, db_transaction.atomic():
+            case = _create_case(count)
+            json_path = Path(tmp) / 'backup.json'
+            archive_path = Path(tmp) / 'backup.zip'
+
+            def write_archive():
+                with open(archive_path, 'wb') as f:
+                    BackupService.write_archive(case, f)
+
+            def restore_json():
+                with open(json_path, 'rb') as f:
+                    return TransactionService.import_from_json_file(f)
+
+            def restore_archive():
+                with open(archive_path, 'rb') as f:
+                    return TransactionService.import_from_archive(f)
+
+            for label, write, restore, path in (
+                ('JSON v1.1', lambda: BackupService.write_json(case, json_path), restore_json, json_path),
+                ('列指向 v2.0 (zip)', write_archive, restore_archive, archive_path),
+            ):
+                _, export_time = _timed(write)
+                (_, restored), restore_time = _timed(restore)
+                if restored != count:
+                    self.stderr.write(f"{label}: 復元件数が一致しません ({restored}/{count})")
+                results.append((label, path.stat().st_size, export_time, restore_time))
+
+            db_transaction.set_rollback(True)
+
+        self.stdout.write(f"{count:,}件の取引")
+        base_size, base_export, base_restore = results[0][1:]
+        for label, size, export_time, restore_time in results:
+            self.stdout.write(
+                f"  {label:<18} {size / 1024:10.1f}KB ({size / base_size:5.0%})  "
+                f"出力 {export_time:6.2f}秒 ({export_time / base_export:5.0%})  "
+                f"復元 {restore_time:6.2f}秒 ({restore_time / base_restore:5.0%})"
+            )
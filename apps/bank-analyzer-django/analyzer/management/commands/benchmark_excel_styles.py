@@ -0,0 +1,126 @@
+"""
+Excelスタイル方式のベンチマークコマンド
+
+同じ取引表を「セルごとに Font/PatternFill/Border/Alignment を生成する従来方式」と
+「共通 NamedStyle をスタイル名で適用する方式」で生成し、生成時間とファイルサイズを比較する。
+DBは使わず合成データで計測する。
+
+使用例:
+    python manage.py benchmark_excel_styles --rows 60000
+"""
+import time
+from datetime import date, timedelta
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from analyzer.lib.xlsx_styles import (
+    AMOUNT_FORMAT, FONT_NAME, STYLE_AMOUNT, STYLE_DATE, STYLE_HEADER, STYLE_LARGE, register_styles,
+)
+from analyzer.lib.xlsx_writer import XlsxWriter
+from analyzer.lib.wareki import format_wareki
+
+HEADERS = ['日付', '銀行名', '支店名', '種別', '口座番号', '摘要', '払戻', 'お預り', '分類']
+LARGE_THRESHOLD = 500_000
+
+
+def _rows(count: int):
+    start = date(2015, 1, 1)
+    for i in range(count):
+        amount = (i * 7919) % 900_000
+        yield [
+            format_wareki(start + timedelta(days=i % 3650), 'short'),
+            'みずほ銀行', '新宿支店', '普通', '1234567',
+            f'振込 テスト{i % 500}',
+            amount if i % 2 else 0,
+            0 if i % 2 else amount,
+            '生活費',
+        ]
+
+
+def _build_per_cell(rows) -> Workbook:
+    """従来方式: セルごとにスタイルオブジェクトを生成する"""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for cell in ws[1]:
+        cell.font = Font(name=FONT_NAME, bold=True, color='0F172A')
+        cell.fill = PatternFill('solid', fgColor='E2E8F0')
+        cell.border = Border(bottom=Side(style='thin', color='94A3B8'))
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    for row in rows:
+        ws.append(row)
+    for date_cell, *_, out_cell, in_cell, _cat in ws.iter_rows(min_row=2):
+        date_cell.alignment = Alignment(horizontal='center')
+        for cell in (out_cell, in_cell):
+            cell.number_format = AMOUNT_FORMAT
+            cell.alignment = Alignment(horizontal='right')
+            if (cell.value or 0) >= LARGE_THRESHOLD:
+                cell.font = Font(bold=True, color='DC3545')
+    return wb
+
+
+def _build_named(rows) -> Workbook:
+    """共通 NamedStyle をスタイル名で適用する（通常モード）"""
+    wb = Workbook()
+    register_styles(wb)
+    ws = wb.active
+    ws.append(HEADERS)
+    for cell in ws[1]:
+        cell.style = STYLE_HEADER
+    for row in rows:
+        ws.append(row)
+    for date_cell, *_, out_cell, in_cell, _cat in ws.iter_rows(min_row=2):
+        date_cell.style = STYLE_DATE
+        for cell in (out_cell, in_cell):
+            cell.style = STYLE_LARGE if (cell.value or 0) >= LARGE_THRESHOLD else STYLE_AMOUNT
+    return wb
+
+
+def _build_named_write_only(rows) -> XlsxWriter:
+    """共通 NamedStyle + write_only エンジン（エクスポートで使う方式）"""
+    writer = XlsxWriter()
+    sheet = writer.add_sheet('取引', column_styles={0: STYLE_DATE, 6: STYLE_AMOUNT, 7: STYLE_AMOUNT})
+    sheet.append_header(HEADERS)
+    for row in rows:
+        highlights = {idx: STYLE_LARGE for idx in (6, 7) if row[idx] >= LARGE_THRESHOLD}
+        sheet.append(row, highlights)
+    return writer
+
+
+class Command(BaseCommand):
+    help = "Excelのスタイル適用方式ごとの生成時間・ファイルサイズを比較します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=60000, help='生成する行数（デフォルト: 60000）')
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        rows = list(_rows(count))
+
+        results = []
+        for label, build in (
+            ('セル単位スタイル', _build_per_cell),
+            ('NamedStyle', _build_named),
+            ('NamedStyle + write_only', _build_named_write_only),
+        ):
+            started = time.perf_counter()
+            built = build(rows)
+            if isinstance(built, XlsxWriter):
+                with built.save() as f:
+                    size = len(f.read())
+            else:
+                buf = BytesIO()
+                built.save(buf)
+                size = buf.tell()
+            results.append((label, time.perf_counter() - started, size))
+
+        self.stdout.write(f"{count:,}行の取引表")
+        base_time, base_size = results[0][1], results[0][2]
+        for label, elapsed, size in results:
+            self.stdout.write(
+                f"  {label:<24} {elapsed:7.2f}秒 ({elapsed / base_time:5.0%})  "
+                f"{size / 1024:9.1f}KB ({size / base_size:5.0%})"
+            )
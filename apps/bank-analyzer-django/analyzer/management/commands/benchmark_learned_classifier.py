@@ -0,0 +1,77 @@
+"""
+学習済み分類モデルの推論速度のベンチマークコマンド
+
+合成した摘要でモデルを学習し、摘要1万件あたりの推論時間を計測する。
+--current を指定すると、保存済みの最新のモデルで計測する。DB・モデルファイルには何も書き込まない。
+
+使用例:
+    python manage.py benchmark_learned_classifier
+    python manage.py benchmark_learned_classifier --descriptions 50000 --current
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.lib import learned_classifier
+
+PAYEES = {
+    '生活費': ['イオン', 'セブンイレブン', 'ローソン', 'ファミリーマート', 'ヨドバシカメラ'],
+    '公共料金': ['東京電力', '東京ガス', '水道局', 'NTT東日本', 'ソフトバンク'],
+    '保険': ['日本生命', '第一生命', '東京海上日動', 'アフラック'],
+    '給与': ['給与', '賞与', '株式会社山田商事', '有限会社田中工務店'],
+    '事業・不動産': ['家賃', '管理費', '三井不動産', '大和ハウス'],
+}
+PREFIXES = ['', 'カ）', 'ｶ)', 'デビット ', '口座振替 ', '振込 ']
+
+
+def _descriptions(count: int, seed: int) -> tuple[list[str], list[str]]:
+    rng = random.Random(seed)
+    categories = list(PAYEES)
+    descriptions, labels = [], []
+    for i in range(count):
+        category = rng.choice(categories)
+        descriptions.append(f"{rng.choice(PREFIXES)}{rng.choice(PAYEES[category])} {i % 997:03d}")
+        labels.append(category)
+    return descriptions, labels
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "学習済み分類モデルの推論速度（摘要1万件あたり）を計測します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--descriptions', type=int, default=10000, help='推論する摘要数（デフォルト: 10000）')
+        parser.add_argument('--train', type=int, default=5000, help='学習に使う摘要数（デフォルト: 5000）')
+        parser.add_argument('--current', action='store_true', help='保存済みの最新のモデルで計測する')
+
+    def handle(self, *args, **options):
+        count = options['descriptions']
+        if options['current']:
+            model = learned_classifier.get_model()
+            if model is None:
+                raise CommandError("保存済みのモデルがありません（train_learned_classifier で作成してください）")
+            self.stdout.write(f"モデル v{model.meta.get('version')} (分類 {len(model.categories)}種類)")
+        else:
+            model, fit_time = _timed(lambda: learned_classifier.NaiveBayesClassifier.fit(*_descriptions(options['train'], 1)))
+            self.stdout.write(
+                f"学習: 摘要 {options['train']:,}件 {fit_time:.2f}秒 "
+                f"(分類 {len(model.categories)}種類, n-gram {len(model.vocabulary):,}種類)"
+            )
+
+        descriptions, _ = _descriptions(count, 2)
+        predicted, predict_time = _timed(lambda: model.predict(descriptions, top_n=3))
+        unique = len(set(descriptions))
+        self.stdout.write(
+            f"推論: 摘要 {count:,}件（異なる摘要 {unique:,}件） {predict_time:.3f}秒, "
+            f"候補あり {len(predicted):,}件"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"摘要1万件あたり {predict_time / max(unique, 1) * 10000:.3f}秒 "
+            f"({unique / predict_time if predict_time else 0:,.0f}件/秒)"
+        ))
@@ -10,6 +10,7 @@ from django.core.management.base import BaseCommand
 
 from analyzer.models import Account, Case, Transaction
 from analyzer.lib.constants import UNCATEGORIZED
+from analyzer.services import AccountStatsService
 
 
 # ===== 口座定義 =====
@@ -309,6 +310,9 @@ class Command(BaseCommand):
             )
             total_count += len(tx_objects)
 
+        # bulk_create は口座の集計値（件数・取引期間）を更新しないため、まとめて再計算する
+        AccountStatsService.refresh(case)
+
         self.stdout.write(self.style.SUCCESS(
             f'\n合計 {total_count} 件の取引データを作成しました。'
         ))
@@ -1,18 +1,88 @@
-"""Export all Bank Analyzer cases as JSON backup files."""
+"""Export all Bank Analyzer cases as JSON (or columnar zip) backup files."""
+import hashlib
 import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
-from django.db.models import Sum
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 from analyzer.lib import config
 from analyzer.models import Case
+from analyzer.services import BackupService
 from analyzer.views._helpers import sanitize_filename
 
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Backup files written by this command ("0001_<case name>_backup.json[.gz]" or ".zip").
+BACKUP_FILE_PATTERN = re.compile(r"^\d{4,}_.*_backup\.(json(\.gz)?|zip)$")
+
+
+def _backup_suffix(fmt, compress):
+    if fmt == "parquet":
+        return ".zip"
+    return ".json.gz" if compress else ".json"
+
+
+def _init_worker():
+    # Needed for the spawn start method; a no-op for forked workers.
+    django.setup()
+
+
+def _export_case(case_id, output_dir, fmt, indent, compress, user_settings, previous):
+    """Write one case backup and return its manifest entry (runs in worker processes).
+
+    If the content (ignoring the export timestamp) matches the previous manifest,
+    the existing file is kept untouched.
+    """
+    started = time.perf_counter()
+    case = Case.objects.get(pk=case_id)
+    suffix = _backup_suffix(fmt, compress)
+    path = Path(output_dir) / f"{case.pk:04d}_{sanitize_filename(case.name)}_backup{suffix}"
+    staging = path.with_name(path.name + ".new")
+
+    if fmt == "parquet":
+        try:
+            with open(staging, "wb") as f:
+                content_hash = BackupService.write_archive(case, f, user_settings=user_settings)
+        except BaseException:
+            staging.unlink(missing_ok=True)
+            raise
+    else:
+        content_hash = BackupService.write_json(
+            case, staging, indent=indent, compress=compress, user_settings=user_settings,
+        )
+    unchanged = bool(
+        previous
+        and previous.get("content_hash") == content_hash
+        and previous.get("file") == path.name
+        and path.exists()
+    )
+    if unchanged:
+        staging.unlink()
+    else:
+        os.replace(staging, path)
+
+    return {
+        "name": case.name,
+        "file": path.name,
+        "revision": case.revision,
+        "content_hash": content_hash,
+        "transactions": case.transactions.count(),
+        "bytes": path.stat().st_size,
+        "duration": round(time.perf_counter() - started, 3),
+        "status": "unchanged" if unchanged else "exported",
+    }
+
 
 class Command(BaseCommand):
-    help = "Export all cases as JSON backup files."
+    help = "Export all cases as JSON (or columnar zip) backup files."
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -20,55 +90,132 @@ class Command(BaseCommand):
             required=True,
             help="Directory where JSON backup files will be written.",
         )
+        parser.add_argument(
+            "--format",
+            choices=["json", "parquet"],
+            default="json",
+            help="Backup format: JSON v1.1 (default) or the columnar zip with Parquet files.",
+        )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Write JSON without indentation.",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress each backup file with gzip (.json.gz).",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of worker processes (default: 1).",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                f"Skip cases whose revision or content hash matches the previous {MANIFEST_NAME}, "
+                "and remove backup files of deleted or renamed cases."
+            ),
+        )
 
     def handle(self, *args, **options):
+        if options["jobs"] < 1:
+            raise CommandError("--jobs must be 1 or greater.")
+        fmt = options["format"]
+        if fmt == "parquet" and (options["gzip"] or options["compact"]):
+            raise CommandError("--gzip and --compact apply to the JSON format only.")
+
         output_dir = Path(options["output_dir"])
         output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = output_dir / MANIFEST_NAME
 
+        indent = None if options["compact"] else 2
+        compress = options["gzip"]
+        suffix = _backup_suffix(fmt, compress)
         user_settings = config.load_user_settings()
-        exported_count = 0
-
-        for case in Case.objects.all().order_by("id"):
-            export_data = self._build_case_export(case, user_settings)
-            filename = f"{case.pk:04d}_{sanitize_filename(case.name)}_backup.json"
-            path = output_dir / filename
-            path.write_text(
-                json.dumps(export_data, ensure_ascii=False, indent=2),
-                encoding="utf-8",
-            )
-            exported_count += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Exported {exported_count} case JSON file(s)."))
-
-    def _build_case_export(self, case, user_settings):
-        transactions = case.transactions.all().order_by("date", "id")
-        totals = transactions.aggregate(total_in=Sum("amount_in"), total_out=Sum("amount_out"))
-
-        export_fields = [
-            "date", "bank_name", "branch_name", "account_type", "account_number",
-            "description", "amount_out", "amount_in", "balance",
-            "category", "holder", "is_large", "is_transfer", "transfer_to",
-            "is_flagged", "memo",
+        manifest_options = {
+            "format": fmt,
+            "compact": options["compact"],
+            "gzip": compress,
+            "settings_hash": hashlib.sha256(
+                json.dumps(user_settings, sort_keys=True, ensure_ascii=False).encode("utf-8")
+            ).hexdigest(),
+        }
+        previous_cases = (
+            self._load_previous(manifest_path, manifest_options) if options["incremental"] else {}
+        )
+
+        entries = {}
+        pending = []
+        for case_id, name, revision in Case.objects.order_by("id").values_list("id", "name", "revision"):
+            previous = previous_cases.get(str(case_id))
+            filename = f"{case_id:04d}_{sanitize_filename(name)}_backup{suffix}"
+            if (
+                previous
+                and previous.get("revision") == revision
+                and previous.get("file") == filename
+                and (output_dir / filename).exists()
+            ):
+                entries[str(case_id)] = {**previous, "duration": 0, "status": "skipped"}
+            else:
+                pending.append((case_id, previous))
+
+        task_args = [
+            (case_id, str(output_dir), fmt, indent, compress, user_settings, previous)
+            for case_id, previous in pending
         ]
+        if options["jobs"] > 1 and len(task_args) > 1:
+            # Do not let forked workers share the parent's database connection.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["jobs"], initializer=_init_worker) as pool:
+                results = pool.map(_export_case, *zip(*task_args))
+                for (case_id, *_), entry in zip(task_args, results):
+                    entries[str(case_id)] = entry
+        else:
+            for args in task_args:
+                entries[str(args[0])] = _export_case(*args)
 
-        transactions_data = []
-        for tx_dict in transactions.with_account_info().values(*export_fields):
-            if tx_dict["date"]:
-                tx_dict["date"] = tx_dict["date"].isoformat()
-            transactions_data.append(tx_dict)
-
-        return {
-            "version": "1.0",
-            "exported_at": datetime.now().isoformat(),
-            "case": {
-                "name": case.name,
-                "created_at": case.created_at.isoformat() if case.created_at else None,
-            },
-            "transactions": transactions_data,
-            "statistics": {
-                "total_transactions": len(transactions_data),
-                "total_in": totals["total_in"] or 0,
-                "total_out": totals["total_out"] or 0,
-            },
-            "settings": user_settings,
-        }
+        self._write_manifest(manifest_path, {
+            "version": MANIFEST_VERSION,
+            "generated_at": datetime.now().isoformat(),
+            **manifest_options,
+            "cases": dict(sorted(entries.items(), key=lambda item: int(item[0]))),
+        })
+
+        if options["incremental"]:
+            current_files = {entry["file"] for entry in entries.values()}
+            for path in output_dir.iterdir():
+                if BACKUP_FILE_PATTERN.match(path.name) and path.name not in current_files:
+                    path.unlink()
+
+        statuses = [entry["status"] for entry in entries.values()]
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {statuses.count('exported')} case {'archive' if fmt == 'parquet' else 'JSON'} file(s); "
+            f"{statuses.count('unchanged')} unchanged, {statuses.count('skipped')} skipped."
+        ))
+
+    @staticmethod
+    def _load_previous(manifest_path: Path, manifest_options: dict) -> dict:
+        """Return the per-case entries of the previous manifest.
+
+        The manifest is ignored when missing, unreadable, or written with a different
+        format or different embedded settings.
+        """
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or any(manifest.get(k) != v for k, v in manifest_options.items()):
+            return {}
+        return manifest.get("cases", {})
+
+    @staticmethod
+    def _write_manifest(manifest_path: Path, manifest: dict) -> None:
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
@@ -0,0 +1,34 @@
+"""
+エクスポート成果物キャッシュの掃除コマンド
+
+案件の現在の版数より古い成果物と、削除済み案件の成果物を削除する。
+エクスポート時にも対象案件の古い版数は削除されるが、エクスポートされなく
+なった案件や削除済み案件の分はこのコマンドで定期的に掃除する。
+
+使用例:
+    python manage.py purge_export_cache
+    python manage.py purge_export_cache --all
+"""
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from analyzer.services import ExportCacheService
+
+
+class Command(BaseCommand):
+    help = "古いエクスポート成果物キャッシュを削除します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='現在の版数も含めてキャッシュをすべて削除する')
+
+    def handle(self, *args, **options):
+        root = ExportCacheService.cache_dir()
+        if options['all']:
+            if root.is_dir():
+                shutil.rmtree(root)
+            self.stdout.write(self.style.SUCCESS(f"キャッシュをすべて削除しました: {root}"))
+            return
+
+        removed = ExportCacheService.purge_stale()
+        self.stdout.write(self.style.SUCCESS(f"{removed}件のキャッシュディレクトリを削除しました"))
@@ -0,0 +1,32 @@
+"""
+口座集計の再計算コマンド
+
+口座に保存している取引の集計値（件数・最初/最後の取引日）を取引から計算し直す。
+通常は取込・編集・削除のたびに更新されるが、DBを直接編集した場合などに
+集計値がずれたときの修復に使う。
+
+使用例:
+    python manage.py rebuild_account_stats
+    python manage.py rebuild_account_stats --case 3
+"""
+from django.core.management.base import BaseCommand
+
+from analyzer.models import Case
+from analyzer.services import AccountStatsService
+
+
+class Command(BaseCommand):
+    help = "口座の取引集計値を取引データから再計算します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', type=int, action='append', help='対象の案件ID（複数指定可、省略時は全案件）')
+
+    def handle(self, *args, **options):
+        cases = Case.objects.order_by('id')
+        if options['case']:
+            cases = cases.filter(pk__in=options['case'])
+
+        total = 0
+        for case in cases:
+            total += AccountStatsService.refresh(case)
+        self.stdout.write(self.style.SUCCESS(f"{total}口座の集計値を更新しました"))
@@ -0,0 +1,33 @@
+"""
+AI分類候補の事前計算コマンド
+
+全案件（または指定案件）のAI分類候補を最新のパターンで計算し直す。
+候補はパターン・設定・モデルの保存時や取引・分類の変更時に差分だけ更新され、AI分類タブは
+保存済みの候補を読むだけになる。DBを直接変更した後など、候補を作り直したい場合に実行する。
+
+使用例:
+    python manage.py refresh_ai_suggestions
+    python manage.py refresh_ai_suggestions --case 3 --force
+"""
+from django.core.management.base import BaseCommand
+
+from analyzer.models import Case
+from analyzer.services import AISuggestionService
+
+
+class Command(BaseCommand):
+    help = "AI分類候補を最新のパターンで事前計算します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', type=int, action='append', help='対象の案件ID（複数指定可、省略時は全案件）')
+        parser.add_argument('--force', action='store_true', help='計算済みの候補も含めてすべて再計算する')
+
+    def handle(self, *args, **options):
+        cases = Case.objects.order_by('id')
+        if options['case']:
+            cases = cases.filter(pk__in=options['case'])
+
+        total = 0
+        for case in cases:
+            total += AISuggestionService.refresh(case, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"{total}件の摘要についてAI分類候補を計算しました"))
@@ -0,0 +1,40 @@
+"""
+学習済み分類モデルの学習コマンド
+
+全案件の分類変更履歴から手動で決めた分類を集め、文字n-gramのナイーブベイズ分類器を
+学習して LEARNED_MODEL_DIR に次の版数で保存する。保存後に全案件のAI分類候補を
+新しいモデルで計算し直す。
+
+使用例:
+    python manage.py train_learned_classifier
+    python manage.py train_learned_classifier --min-samples 50 --keep 5
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.services import LearnedClassifierService
+
+
+class Command(BaseCommand):
+    help = "分類変更履歴から学習済み分類モデルを学習します"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-samples', type=int, default=20, help='学習に必要な最少の摘要数（デフォルト: 20）')
+        parser.add_argument('--alpha', type=float, default=0.1, help='加算スムージングの値（デフォルト: 0.1）')
+        parser.add_argument('--keep', type=int, default=3, help='残しておく過去の版の数（デフォルト: 3）')
+
+    def handle(self, *args, **options):
+        if options['keep'] < 1:
+            raise CommandError("--keep は1以上を指定してください")
+
+        result = LearnedClassifierService.train(
+            min_samples=options['min_samples'],
+            alpha=options['alpha'],
+            keep=options['keep'],
+        )
+        if result is None:
+            raise CommandError("学習データが不足しています（手動で分類した摘要が少ないか、分類が1種類だけです）")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"モデル v{result['version']} を保存しました: {result['path']} "
+            f"(摘要 {result['samples']:,}件, 分類 {result['categories']}種類, n-gram {result['vocabulary']:,}種類)"
+        ))
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0018_classificationchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="case",
+            name="revision",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="データ版数",
+            ),
+        ),
+    ]
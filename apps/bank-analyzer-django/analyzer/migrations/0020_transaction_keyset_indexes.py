@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0019_case_revision"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="transaction",
+            name="analyzer_tr_case_id_ff6ea7_idx",
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["case", "date", "id"], name="analyzer_tr_case_id_7cee5a_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["case", "amount_out", "id"], name="analyzer_tr_case_id_0c087e_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["case", "amount_in", "id"], name="analyzer_tr_case_id_41939d_idx"),
+        ),
+    ]
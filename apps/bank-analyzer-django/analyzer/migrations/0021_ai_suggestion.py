@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0020_transaction_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AISuggestion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("description", models.CharField(max_length=255, verbose_name="摘要")),
+                ("category", models.CharField(blank=True, default="", max_length=100, verbose_name="提案分類")),
+                ("score", models.IntegerField(default=0, verbose_name="信頼度")),
+                ("alternatives", models.JSONField(default=list, verbose_name="その他の候補")),
+                ("pattern_version", models.CharField(max_length=64, verbose_name="パターン版")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="計算日時")),
+                ("case", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="ai_suggestions", to="analyzer.case", verbose_name="案件")),
+            ],
+            options={
+                "verbose_name": "AI分類候補",
+                "verbose_name_plural": "AI分類候補",
+                "indexes": [models.Index(fields=["case", "pattern_version", "score"], name="analyzer_ai_case_id_bd1315_idx")],
+                "constraints": [models.UniqueConstraint(fields=("case", "description"), name="analyzer_ai_suggestion_unique")],
+            },
+        ),
+    ]
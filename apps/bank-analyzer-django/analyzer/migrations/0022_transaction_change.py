@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0021_ai_suggestion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransactionChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("revision", models.PositiveBigIntegerField(verbose_name="データ版数")),
+                ("transaction_identifier", models.PositiveBigIntegerField(blank=True, null=True, verbose_name="取引ID")),
+                ("op", models.CharField(choices=[("create", "追加"), ("update", "更新"), ("delete", "削除"), ("reset", "再読込")], max_length=10, verbose_name="操作")),
+                ("fields", models.JSONField(blank=True, default=list, verbose_name="変更項目")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="記録日時")),
+                ("case", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="transaction_changes", to="analyzer.case", verbose_name="案件")),
+            ],
+            options={
+                "verbose_name": "取引変更フィード",
+                "verbose_name_plural": "取引変更フィード",
+                "ordering": ["revision", "id"],
+                "indexes": [models.Index(fields=["case", "revision"], name="analyzer_tr_case_id_bc4861_idx")],
+            },
+        ),
+    ]
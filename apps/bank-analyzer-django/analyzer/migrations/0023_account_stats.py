@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import ExtractYear
+
+
+def populate_account_stats(apps, schema_editor):
+    Account = apps.get_model("analyzer", "Account")
+    Transaction = apps.get_model("analyzer", "Transaction")
+
+    def latest_balance(reference_date=None):
+        qs = Transaction.objects.filter(account=OuterRef("pk"), balance__isnull=False)
+        if reference_date:
+            qs = qs.filter(date__lte=reference_date)
+        return Subquery(qs.order_by(F("date").desc(nulls_last=True), "-id").values("balance")[:1])
+
+    totals = {
+        row["account_id"]: row
+        for row in Transaction.objects.exclude(account_id=None).order_by().values("account_id").annotate(
+            count=Count("id"), first_date=Min("date"), last_date=Max("date"),
+        )
+    }
+    years = defaultdict(set)
+    for account_id, year in (
+        Transaction.objects.exclude(account_id=None).filter(date__isnull=False).order_by()
+        .values_list("account_id", ExtractYear("date")).distinct()
+    ):
+        years[account_id].add(year)
+
+    accounts = Account.objects.select_related("case").annotate(computed_last_balance=latest_balance())
+    batch = []
+    for account in accounts.iterator(chunk_size=500):
+        total = totals.get(account.pk, {})
+        first_date = total.get("first_date")
+        account.tx_count = total.get("count", 0)
+        account.first_tx_date = first_date
+        account.last_tx_date = total.get("last_date")
+        account.last_balance = account.computed_last_balance
+        account.reference_balance = account.computed_last_balance
+        if account.case.reference_date:
+            account.reference_balance = (
+                Account.objects.filter(pk=account.pk)
+                .annotate(balance=latest_balance(account.case.reference_date))
+                .values_list("balance", flat=True)[0]
+            )
+        account.tx_year_bits = sum(
+            1 << (year - first_date.year) for year in years[account.pk] if year - first_date.year < 63
+        ) if first_date else 0
+        batch.append(account)
+    Account.objects.bulk_update(
+        batch,
+        ["tx_count", "first_tx_date", "last_tx_date", "last_balance", "reference_balance", "tx_year_bits"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0022_transaction_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="account",
+            name="first_tx_date",
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name="最初の取引日"),
+        ),
+        migrations.AddField(
+            model_name="account",
+            name="last_balance",
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name="最終残高"),
+        ),
+        migrations.AddField(
+            model_name="account",
+            name="last_tx_date",
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name="最後の取引日"),
+        ),
+        migrations.AddField(
+            model_name="account",
+            name="reference_balance",
+            field=models.IntegerField(blank=True, editable=False, help_text="基準日以前で最も近い取引の残高（基準日未設定時は最終残高）", null=True, verbose_name="基準日残高"),
+        ),
+        migrations.AddField(
+            model_name="account",
+            name="tx_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="取引数"),
+        ),
+        migrations.AddField(
+            model_name="account",
+            name="tx_year_bits",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="取引年ビットマップ"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["account", "date", "id"], name="analyzer_tr_account_1a532d_idx"),
+        ),
+        migrations.RunPython(populate_account_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from analyzer.lib.constants import normalize_patterns
+
+
+def import_user_settings_file(apps, schema_editor):
+    """従来の data/user_settings.json の内容を設定テーブルに移す（ファイルは残す）"""
+    path = Path(settings.BASE_DIR) / "data" / "user_settings.json"
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    if not isinstance(data, dict):
+        return
+
+    UserSetting = apps.get_model("analyzer", "UserSetting")
+    PatternCategory = apps.get_model("analyzer", "PatternCategory")
+    PatternKeyword = apps.get_model("analyzer", "PatternKeyword")
+    SettingsVersion = apps.get_model("analyzer", "SettingsVersion")
+
+    patterns = normalize_patterns(data.pop("CLASSIFICATION_PATTERNS", None))
+    UserSetting.objects.bulk_create([UserSetting(key=key, value=value) for key, value in data.items()])
+    for position, (name, keywords) in enumerate(patterns.items()):
+        category = PatternCategory.objects.create(name=name, position=position)
+        PatternKeyword.objects.bulk_create([
+            PatternKeyword(category=category, keyword=keyword, position=index)
+            for index, keyword in enumerate(keywords)
+        ])
+    SettingsVersion.objects.update_or_create(pk=1, defaults={"version": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0023_account_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatternCategory",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100, unique=True, verbose_name="カテゴリー")),
+                ("position", models.PositiveIntegerField(default=0, verbose_name="表示順")),
+            ],
+            options={
+                "verbose_name": "分類パターンのカテゴリー",
+                "verbose_name_plural": "分類パターンのカテゴリー",
+                "ordering": ["position", "id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="SettingsVersion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("version", models.PositiveBigIntegerField(default=0, verbose_name="設定版数")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新日時")),
+            ],
+            options={
+                "verbose_name": "設定版数",
+                "verbose_name_plural": "設定版数",
+            },
+        ),
+        migrations.CreateModel(
+            name="UserSetting",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=100, unique=True, verbose_name="設定キー")),
+                ("value", models.JSONField(verbose_name="値")),
+            ],
+            options={
+                "verbose_name": "ユーザー設定",
+                "verbose_name_plural": "ユーザー設定",
+                "ordering": ["key"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PatternKeyword",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("keyword", models.CharField(max_length=255, verbose_name="キーワード")),
+                ("position", models.PositiveIntegerField(default=0, verbose_name="表示順")),
+                ("category", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="keywords", to="analyzer.patterncategory", verbose_name="カテゴリー")),
+            ],
+            options={
+                "verbose_name": "分類パターンのキーワード",
+                "verbose_name_plural": "分類パターンのキーワード",
+                "ordering": ["category__position", "position", "id"],
+                "constraints": [models.UniqueConstraint(fields=("category", "keyword"), name="analyzer_pattern_keyword_unique")],
+            },
+        ),
+        migrations.RunPython(import_user_settings_file, migrations.RunPython.noop),
+    ]
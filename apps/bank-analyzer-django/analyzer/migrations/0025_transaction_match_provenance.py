@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0024_settings_store"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="match_keyword",
+            field=models.CharField(blank=True, default="", max_length=255, verbose_name="一致キーワード"),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="match_scope",
+            field=models.CharField(blank=True, default="", help_text="global: グローバルパターン, case: 案件固有パターン", max_length=10, verbose_name="一致スコープ"),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="match_version",
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name="一致時の設定版数"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["match_keyword", "match_scope", "case"], name="analyzer_tr_match_k_8fdbf3_idx"),
+        ),
+    ]
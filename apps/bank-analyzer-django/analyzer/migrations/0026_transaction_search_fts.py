@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from analyzer.lib import sqlite_fts
+
+
+def create_fts(apps, schema_editor):
+    """SQLite のみ、摘要検索用の FTS5 trigram 仮想テーブルと同期用トリガーを作成する"""
+    sqlite_fts.install(schema_editor.connection)
+
+
+def drop_fts(apps, schema_editor):
+    sqlite_fts.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0025_transaction_match_provenance"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0026_transaction_search_fts"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="account",
+            name="last_balance",
+        ),
+        migrations.RemoveField(
+            model_name="account",
+            name="reference_balance",
+        ),
+        migrations.RemoveField(
+            model_name="account",
+            name="tx_year_bits",
+        ),
+    ]
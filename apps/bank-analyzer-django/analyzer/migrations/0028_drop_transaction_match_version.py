@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analyzer", "0027_drop_unused_account_stats"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="transaction",
+            name="match_version",
+        ),
+    ]
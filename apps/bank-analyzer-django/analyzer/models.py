@@ -1,6 +1,7 @@
 from django.contrib.postgres.indexes import GinIndex
-from django.db import models
+from django.db import connections, models
 from django.db.models import F
+from django.db.models.functions import Now
 
 from .lib.constants import UNCATEGORIZED
 from .lib.text_utils import normalize_text
@@ -37,16 +38,90 @@ class Case(models.Model):
         help_text="案件固有のキーワードパターン"
     )
 
+    # 案件・口座・取引が変更されるたびに増える版数（エクスポート成果物・画面のキャッシュキー、ETag）
+    revision = models.PositiveBigIntegerField(default=0, editable=False, verbose_name="データ版数")
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.pk is None or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        # 同時更新で版数が巻き戻らないよう DB 側で加算する
+        self.revision = F('revision') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'revision'}
+        super().save(*args, **kwargs)
+        if hasattr(self.revision, 'resolve_expression'):
+            # Django 6.0 未満は式で保存したフィールドを自動で再読込しない
+            self.refresh_from_db(fields=['revision'])
+
+    @staticmethod
+    def bump_revision(case_ids) -> None:
+        """指定した案件の版数を1つ進める（更新日時も Last-Modified 用に進める）"""
+        case_ids = {case_id for case_id in case_ids if case_id is not None}
+        if case_ids:
+            Case.objects.filter(pk__in=case_ids).update(revision=F('revision') + 1, updated_at=Now())
+
     class Meta:
         verbose_name = "案件"
         verbose_name_plural = "案件一覧"
         ordering = ["-created_at"]
 
 
-class Account(models.Model):
+class CaseScopedQuerySet(models.QuerySet):
+    """一括更新・削除のたびに対象案件の版数を進める QuerySet
+
+    QuerySet.update / delete と bulk_create はモデルの save() を経由しないため、
+    ここで Case.revision を進める（bulk_update は内部で update を呼ぶ）。
+    """
+
+    def _case_ids(self) -> list:
+        return list(self.order_by().values_list('case_id', flat=True).distinct())
+
+    def update(self, **kwargs):
+        case_ids = self._case_ids()
+        count = super().update(**kwargs)
+        if count:
+            Case.bump_revision(case_ids)
+        return count
+
+    update.alters_data = True
+
+    def delete(self):
+        case_ids = self._case_ids()
+        result = super().delete()
+        if result[0]:
+            Case.bump_revision(case_ids)
+        return result
+
+    delete.alters_data = True
+
+    def bulk_create(self, objs, **kwargs):
+        objs = super().bulk_create(objs, **kwargs)
+        Case.bump_revision(obj.case_id for obj in objs)
+        return objs
+
+
+class CaseScopedModel(models.Model):
+    """案件に属するモデル（保存・削除で案件の版数を進める）"""
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Case.bump_revision([self.case_id])
+
+    def delete(self, *args, **kwargs):
+        case_id = self.case_id
+        result = super().delete(*args, **kwargs)
+        Case.bump_revision([case_id])
+        return result
+
+    class Meta:
+        abstract = True
+
+
+class Account(CaseScopedModel):
     """口座モデル - 銀行口座情報を管理"""
     case = models.ForeignKey(
         Case,
@@ -68,6 +143,13 @@ class Account(models.Model):
     inventory_remarks = models.TextField(blank=True, default='', verbose_name="備考/利用状況")
     print_order = models.IntegerField(default=0, verbose_name="印刷順序")
 
+    # 取引の集計値（AccountStatsService が取込・編集・削除のたびに更新する）
+    tx_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="取引数")
+    first_tx_date = models.DateField(null=True, blank=True, editable=False, verbose_name="最初の取引日")
+    last_tx_date = models.DateField(null=True, blank=True, editable=False, verbose_name="最後の取引日")
+
+    objects = CaseScopedQuerySet.as_manager()
+
     def __str__(self):
         parts = [self.bank_name or '', self.branch_name or '', self.account_number]
         return ' '.join(p for p in parts if p)
@@ -81,7 +163,7 @@ class Account(models.Model):
         ordering = ['print_order', 'bank_name', 'branch_name']
 
 
-class TransactionQuerySet(models.QuerySet):
+class TransactionQuerySet(CaseScopedQuerySet):
     """口座情報をアノテーションするカスタムQuerySet"""
 
     def with_account_info(self):
@@ -102,8 +184,65 @@ class TransactionQuerySet(models.QuerySet):
                 fields.append('description_search')
         return super().bulk_update(objs, fields, **kwargs)
 
-
-class Transaction(models.Model):
+    def insert_columns(self, columns: dict[str, list]) -> int:
+        """列名→値リストの辞書を、モデルを生成せずに一括 INSERT する
+
+        列指向バックアップの復元用。PostgreSQL では列ごとの配列を UNNEST して
+        1文で、その他のDBでは複数行 VALUES で登録する。description_search は
+        異なる摘要ごとに1回だけ正規化し、指定のない列には既定値を入れる。
+
+        Args:
+            columns: フィールド名（外部キーは case_id などの attname）→ 値リスト
+
+        Returns:
+            登録した件数
+        """
+        count = len(columns['case_id'])
+        if not count:
+            return 0
+
+        search_of = {
+            description: normalize_text(description or '')
+            for description in set(columns.get('description', []))
+        }
+        columns = {
+            **columns,
+            'description_search': [search_of[d] for d in columns.get('description', [None] * count)],
+        }
+        connection = connections[self.db]
+        fields = [
+            field for field in self.model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        values = []
+        for field in fields:
+            if field.attname in columns:
+                values.append([field.get_db_prep_save(v, connection) for v in columns[field.attname]])
+            else:
+                values.append([field.get_db_prep_save(field.get_default(), connection)] * count)
+
+        ops = connection.ops
+        table = ops.quote_name(self.model._meta.db_table)
+        column_sql = ', '.join(ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                arrays = ', '.join(f'%s::{field.db_type(connection)}[]' for field in fields)
+                cursor.execute(f'INSERT INTO {table} ({column_sql}) SELECT * FROM UNNEST({arrays})', values)
+            else:
+                rows = list(zip(*values))
+                batch_size = max(ops.bulk_batch_size(fields, rows), 1)
+                placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+                for start in range(0, count, batch_size):
+                    batch = rows[start:start + batch_size]
+                    cursor.execute(
+                        f'INSERT INTO {table} ({column_sql}) VALUES ' + ', '.join([placeholder] * len(batch)),
+                        [value for row in batch for value in row],
+                    )
+        Case.bump_revision(set(columns['case_id']))
+        return count
+
+
+class Transaction(CaseScopedModel):
     """取引モデル - 銀行取引明細を管理"""
     case = models.ForeignKey(
         Case,
@@ -144,6 +283,17 @@ class Transaction(models.Model):
         help_text="0: 未分類, 100: 完全一致, 90+: ファジーマッチ"
     )
 
+    # 規則による分類の根拠（一致したキーワード）。パターンの変更時に影響する取引だけを分類し直す。
+    # 手動・AIなどキーワード以外で分類を変えると空になる
+    match_scope = models.CharField(
+        max_length=10,
+        blank=True,
+        default='',
+        verbose_name="一致スコープ",
+        help_text="global: グローバルパターン, case: 案件固有パターン",
+    )
+    match_keyword = models.CharField(max_length=255, blank=True, default='', verbose_name="一致キーワード")
+
     # 付箋・メモ機能
     is_flagged = models.BooleanField(default=False, verbose_name="要確認フラグ")
     memo = models.TextField(null=True, blank=True, verbose_name="メモ")
@@ -165,13 +315,20 @@ class Transaction(models.Model):
         verbose_name_plural = "取引一覧"
         ordering = ["date", "id"]
         indexes = [
-            models.Index(fields=["case", "date"]),
+            # 取引一覧のキーセットページネーション（並び順 + id）用
+            models.Index(fields=["case", "date", "id"]),
+            models.Index(fields=["case", "amount_out", "id"]),
+            models.Index(fields=["case", "amount_in", "id"]),
             models.Index(fields=["case", "account"]),
+            # 口座ごとの最終残高（通帳有無一覧表の AccountStatsService.latest_balances）用
+            models.Index(fields=["account", "date", "id"]),
             models.Index(fields=["category"]),
             models.Index(fields=["case", "is_flagged"]),
             models.Index(fields=["case", "category"]),
             models.Index(fields=["case", "is_large"]),
             models.Index(fields=["case", "is_transfer"]),
+            # キーワード変更時の再分類対象（ReclassificationService）用
+            models.Index(fields=["match_keyword", "match_scope", "case"]),
             GinIndex(
                 fields=["description_search"],
                 name="analyzer_tx_desc_trgm",
@@ -244,3 +401,138 @@ class ClassificationChange(models.Model):
             models.Index(fields=["case", "created_at"]),
             models.Index(fields=["case", "reverted_at"]),
         ]
+
+
+class AISuggestion(models.Model):
+    """摘要ごとのAI分類候補（事前計算結果）
+
+    未分類取引の摘要ごとにファジーマッチングの上位候補を保存する。
+    pattern_version は計算に使った分類パターン・ファジー設定のハッシュで、
+    現在の値と異なる行は古い候補として再計算される。
+    """
+
+    case = models.ForeignKey(
+        Case,
+        on_delete=models.CASCADE,
+        related_name="ai_suggestions",
+        verbose_name="案件",
+    )
+    description = models.CharField(max_length=255, verbose_name="摘要")
+    category = models.CharField(max_length=100, blank=True, default="", verbose_name="提案分類")
+    score = models.IntegerField(default=0, verbose_name="信頼度")
+    alternatives = models.JSONField(default=list, verbose_name="その他の候補")
+    pattern_version = models.CharField(max_length=64, verbose_name="パターン版")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="計算日時")
+
+    class Meta:
+        verbose_name = "AI分類候補"
+        verbose_name_plural = "AI分類候補"
+        constraints = [
+            models.UniqueConstraint(fields=["case", "description"], name="analyzer_ai_suggestion_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["case", "pattern_version", "score"]),
+        ]
+
+
+class TransactionChange(models.Model):
+    """取引の変更フィード（開いている画面への差分配信用）
+
+    サービス層で取引を変更するたびに、変更後の案件版数・取引ID・変更された項目を記録する。
+    op='reset' は行単位で表せない変更（取込・口座の統合など）で、受け取った画面は再読込する。
+    """
+
+    OP_CREATE = "create"
+    OP_UPDATE = "update"
+    OP_DELETE = "delete"
+    OP_RESET = "reset"
+    OP_CHOICES = [
+        (OP_CREATE, "追加"),
+        (OP_UPDATE, "更新"),
+        (OP_DELETE, "削除"),
+        (OP_RESET, "再読込"),
+    ]
+
+    case = models.ForeignKey(
+        Case,
+        on_delete=models.CASCADE,
+        related_name="transaction_changes",
+        verbose_name="案件",
+    )
+    revision = models.PositiveBigIntegerField(verbose_name="データ版数")
+    transaction_identifier = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="取引ID")
+    op = models.CharField(max_length=10, choices=OP_CHOICES, verbose_name="操作")
+    fields = models.JSONField(default=list, blank=True, verbose_name="変更項目")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="記録日時")
+
+    class Meta:
+        verbose_name = "取引変更フィード"
+        verbose_name_plural = "取引変更フィード"
+        ordering = ["revision", "id"]
+        indexes = [
+            models.Index(fields=["case", "revision"]),
+        ]
+
+
+class SettingsVersion(models.Model):
+    """ユーザー設定・グローバル分類パターンの版数（pk=1 の1行のみ）
+
+    設定かパターンを保存するたびに version を1つ進める。各ワーカーはリクエストごとに
+    この行だけを読み、手元のキャッシュの版数と異なる場合に設定を読み直す。
+    """
+
+    version = models.PositiveBigIntegerField(default=0, verbose_name="設定版数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "設定版数"
+        verbose_name_plural = "設定版数"
+
+
+class UserSetting(models.Model):
+    """ユーザー設定（設定キーごとに1行、分類パターン以外）"""
+
+    key = models.CharField(max_length=100, unique=True, verbose_name="設定キー")
+    value = models.JSONField(verbose_name="値")
+
+    class Meta:
+        verbose_name = "ユーザー設定"
+        verbose_name_plural = "ユーザー設定"
+        ordering = ["key"]
+
+
+class PatternCategory(models.Model):
+    """グローバル分類パターンのカテゴリー（キーワードのない空カテゴリーも保持）"""
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="カテゴリー")
+    position = models.PositiveIntegerField(default=0, verbose_name="表示順")
+
+    class Meta:
+        verbose_name = "分類パターンのカテゴリー"
+        verbose_name_plural = "分類パターンのカテゴリー"
+        ordering = ["position", "id"]
+
+
+class PatternKeyword(models.Model):
+    """グローバル分類パターンのキーワード
+
+    保存時は (カテゴリー, キーワード) ごとに既存行を更新するため、
+    変更していないキーワードのIDは保存をまたいで変わらない。
+    """
+
+    category = models.ForeignKey(
+        PatternCategory,
+        on_delete=models.CASCADE,
+        related_name="keywords",
+        verbose_name="カテゴリー",
+    )
+    keyword = models.CharField(max_length=255, verbose_name="キーワード")
+    position = models.PositiveIntegerField(default=0, verbose_name="表示順")
+
+    class Meta:
+        verbose_name = "分類パターンのキーワード"
+        verbose_name_plural = "分類パターンのキーワード"
+        ordering = ["category__position", "position", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["category", "keyword"], name="analyzer_pattern_keyword_unique"),
+        ]
@@ -7,11 +7,29 @@
 from .transaction import TransactionService
 from .analysis import AnalysisService
 from .classification_history import ClassificationHistoryService
+from .backup import BackupService
+from .account_stats import AccountStatsService
+from .ai_suggestion import AISuggestionService
+from .change_feed import ChangeFeedService
+from .export_cache import ExportCacheService
+from .filter_cache import FilterCacheService
+from .keyword_impact import KeywordImpactService
+from .learned_classifier import LearnedClassifierService
+from .reclassification import ReclassificationService
 from .utils import parse_int_ids
 
 __all__ = [
     'TransactionService',
     'AnalysisService',
     'ClassificationHistoryService',
+    'BackupService',
+    'AccountStatsService',
+    'AISuggestionService',
+    'ChangeFeedService',
+    'ExportCacheService',
+    'FilterCacheService',
+    'KeywordImpactService',
+    'LearnedClassifierService',
+    'ReclassificationService',
     'parse_int_ids',
 ]
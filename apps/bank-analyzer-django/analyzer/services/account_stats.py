@@ -0,0 +1,122 @@
+"""
+口座集計サービス
+
+口座ごとの取引の集計値（件数・最初/最後の取引日）を Account に非正規化して保存する。
+取込・編集・削除のサービスは変更した口座について refresh を呼び、
+概要タブや案件一覧は取引テーブルを集計せずに口座の値を読む。
+集計値がずれた場合は rebuild_account_stats コマンドで再計算する。
+
+基準日残高と取引のある年は通帳有無一覧表を開いたときだけ必要になるため保存せず、
+latest_balances / transaction_years で口座数によらず一定のクエリ数で求める。
+"""
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.db import connections
+from django.db.models import Count, F, Max, Min, Window
+from django.db.models.functions import ExtractYear, RowNumber
+
+from ..models import Account, Case
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = ('tx_count', 'first_tx_date', 'last_tx_date')
+
+
+class AccountStatsService:
+    """口座の集計値に関するビジネスロジック"""
+
+    @staticmethod
+    def latest_balances(transactions) -> dict[int, int]:
+        """
+        口座ごとに最も新しい取引の残高を1クエリで返す
+
+        PostgreSQL では DISTINCT ON (account_id)、その他のDBでは
+        ROW_NUMBER() で口座ごとの先頭行だけを取得する。
+
+        Args:
+            transactions: 対象の取引QuerySet（基準日などで絞り込み済み）
+
+        Returns:
+            {口座ID: 残高}（残高のある取引がない口座は含まない）
+        """
+        transactions = transactions.filter(account__isnull=False, balance__isnull=False)
+        ordering = (F('date').desc(nulls_last=True), F('id').desc())
+        if connections[transactions.db].vendor == 'postgresql':
+            latest = transactions.order_by('account_id', *ordering).distinct('account_id')
+        else:
+            latest = transactions.order_by().annotate(
+                balance_rank=Window(RowNumber(), partition_by=F('account_id'), order_by=ordering),
+            ).filter(balance_rank=1)
+        return dict(latest.values_list('account_id', 'balance'))
+
+    @staticmethod
+    def transaction_years(transactions) -> dict[int, set[int]]:
+        """口座ごとの取引のある年を1クエリ（口座・年での GROUP BY）で返す"""
+        years = defaultdict(set)
+        rows = (
+            transactions.filter(account__isnull=False, date__isnull=False)
+            .order_by()
+            .values_list('account_id', ExtractYear('date'))
+            .annotate(count=Count('id'))
+        )
+        for account_id, year, _ in rows:
+            years[account_id].add(year)
+        return years
+
+    @staticmethod
+    def refresh(case: Case, account_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        口座の集計値を取引から再計算して保存する
+
+        口座数によらず一定のクエリ数（口座、件数・日付）で計算し、
+        値が変わった口座だけを更新する。
+
+        Args:
+            case: 対象の案件
+            account_ids: 対象の口座ID（省略時は案件の全口座）
+
+        Returns:
+            更新した口座数
+        """
+        accounts = case.accounts.all()
+        if account_ids is not None:
+            account_ids = {pk for pk in account_ids if pk is not None}
+            if not account_ids:
+                return 0
+            accounts = accounts.filter(pk__in=account_ids)
+        accounts = list(accounts)
+        if not accounts:
+            return 0
+
+        transactions = case.transactions.filter(account_id__in=[acc.pk for acc in accounts]).order_by()
+        totals = {
+            row['account_id']: row
+            for row in transactions.values('account_id').annotate(
+                count=Count('id'), first_date=Min('date'), last_date=Max('date'),
+            )
+        }
+
+        changed = []
+        for acc in accounts:
+            total = totals.get(acc.pk, {})
+            values = {
+                'tx_count': total.get('count', 0),
+                'first_tx_date': total.get('first_date'),
+                'last_tx_date': total.get('last_date'),
+            }
+            if any(getattr(acc, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(acc, field, value)
+                changed.append(acc)
+
+        if changed:
+            Account.objects.bulk_update(changed, STATS_FIELDS, batch_size=500)
+            logger.info(f"口座集計を更新: case_id={case.id}, accounts={len(changed)}")
+        return len(changed)
+
+    @staticmethod
+    def account_ids_of(transactions) -> set[int]:
+        """取引QuerySetが属する口座IDのセット（削除前の対象口座の把握用）"""
+        return set(transactions.order_by().values_list('account_id', flat=True).distinct()) - {None}
@@ -0,0 +1,242 @@
+"""
+AI分類候補サービス
+
+未分類取引の摘要ごとにファジーマッチングの上位候補を事前計算して AISuggestion に保存する。
+学習済みモデル（train_learned_classifier で作成）があれば、その候補も摘要をまとめて推論し、
+同じカテゴリーは高い方のスコアを採って合わせる。
+AI分類タブは保存済みの候補を閾値でSQL絞り込みし、ページ単位で読むだけで再計算はしない。
+候補には分類パターン・ファジー設定・モデルの版数のハッシュ（pattern_version）を付けて保存し、
+パターン・設定・モデルを保存した側（refresh_cases）や未分類の摘要を増やす操作の側で更新する。
+"""
+import hashlib
+import json
+import logging
+from typing import Iterable, Optional
+
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from ..models import AISuggestion, Case
+from ..lib import config, learned_classifier, llm_classifier
+from ..lib.constants import UNCATEGORIZED, normalize_patterns
+
+logger = logging.getLogger(__name__)
+
+# 事前計算に使う閾値（AI分類タブの閾値スライダーの最小値）
+# これ以上の閾値での候補は、保存した候補をスコアで絞り込めば得られる
+PRECOMPUTE_THRESHOLD = 70
+
+# 一度に保存する候補数
+_BULK_BATCH_SIZE = 1000
+
+# 摘要ごとに保存する候補数（提案 + その他の候補）
+_TOP_N = 3
+
+
+def merge_suggestions(*candidates: list[tuple[str, int]], top_n: int = _TOP_N) -> list[tuple[str, int]]:
+    """複数の候補リストを合わせる（同じカテゴリーは高い方のスコア、スコアの降順で top_n 件）"""
+    best = {}
+    for suggestions in candidates:
+        for category, score in suggestions:
+            if score > best.get(category, -1):
+                best[category] = score
+    return sorted(best.items(), key=lambda item: -item[1])[:top_n]
+
+
+class AISuggestionService:
+    """AI分類候補の事前計算・取得に関するビジネスロジック"""
+
+    @staticmethod
+    def _global_digest() -> str:
+        """グローバルパターン・ファジー設定のハッシュ"""
+        fuzzy_config = config.get_fuzzy_config()
+        payload = json.dumps({
+            'global': config.get_classification_patterns(),
+            'enabled': fuzzy_config.get('enabled', False),
+            'use_token_set_ratio': fuzzy_config.get('use_token_set_ratio', True),
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def pattern_version(case: Case) -> str:
+        """候補の計算結果に影響する分類パターン・ファジー設定・モデルの版数のハッシュ（グローバル分は設定版数ごとに1回計算）"""
+        payload = json.dumps({
+            'global': config.cached_for_version('ai_suggestion_digest', AISuggestionService._global_digest),
+            'case': normalize_patterns(case.custom_patterns or {}),
+            'learned': learned_classifier.current_version(),
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _unclassified(case: Case):
+        """候補の対象となる未分類取引（摘要あり・要確認以外）"""
+        return case.transactions.filter(
+            category=UNCATEGORIZED,
+            is_flagged=False,
+        ).exclude(description__isnull=True).exclude(description='')
+
+    @staticmethod
+    def refresh(case: Case, force: bool = False) -> int:
+        """
+        案件のAI分類候補を最新の状態にする
+
+        パターン版が古い候補と、未分類取引がなくなった摘要の候補を削除し、
+        候補が未計算の摘要だけをファジーマッチングする（学習済みモデルの推論はまとめて1回）。
+
+        Args:
+            case: 対象の案件
+            force: True の場合は全摘要を再計算する
+
+        Returns:
+            新たに計算した摘要の数
+        """
+        version = AISuggestionService.pattern_version(case)
+        suggestions = case.ai_suggestions.all()
+        unclassified = AISuggestionService._unclassified(case)
+        if force:
+            suggestions.delete()
+        else:
+            suggestions.exclude(pattern_version=version).delete()
+            suggestions.exclude(description__in=unclassified.values('description')).delete()
+
+        descriptions = list(
+            unclassified.exclude(description__in=case.ai_suggestions.values('description'))
+            .order_by().values_list('description', flat=True).distinct()
+        )
+        if not descriptions:
+            return 0
+
+        case_patterns = case.custom_patterns or {}
+        global_patterns = config.get_classification_patterns()
+        fuzzy_config = {**config.get_fuzzy_config(), 'threshold': PRECOMPUTE_THRESHOLD}
+        learned = learned_classifier.get_learned_suggestions(
+            descriptions, top_n=_TOP_N, min_score=PRECOMPUTE_THRESHOLD,
+        )
+
+        objs = []
+        for description in descriptions:
+            top = llm_classifier.get_fuzzy_suggestions(
+                description,
+                case_patterns=case_patterns,
+                global_patterns=global_patterns,
+                fuzzy_config=fuzzy_config,
+                top_n=_TOP_N,
+            )
+            if description in learned:
+                top = merge_suggestions(top, learned[description])
+            category, score = top[0] if top else ('', 0)
+            objs.append(AISuggestion(
+                case=case,
+                description=description,
+                category=category,
+                score=round(score),
+                alternatives=[{'category': cat, 'score': round(s)} for cat, s in top[1:]],
+                pattern_version=version,
+            ))
+        # 同時に更新された場合は先に保存された候補を残す
+        AISuggestion.objects.bulk_create(objs, batch_size=_BULK_BATCH_SIZE, ignore_conflicts=True)
+        logger.info(f"AI分類候補を更新: case_id={case.id}, descriptions={len(objs)}")
+        return len(objs)
+
+    @staticmethod
+    def refresh_cases(case_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        分類パターン・設定・学習済みモデルの変更後に、影響する案件の候補を更新する
+
+        Args:
+            case_ids: 対象の案件ID（None の場合は全案件。グローバルの変更はすべての案件に影響する）
+
+        Returns:
+            新たに計算した摘要の数（全案件の合計）
+        """
+        cases = Case.objects.order_by('id')
+        if case_ids is not None:
+            cases = cases.filter(pk__in=list(case_ids))
+        return sum(AISuggestionService.refresh(case) for case in cases.iterator())
+
+    @staticmethod
+    def build_tab_data(case: Case, threshold: int) -> dict:
+        """
+        AI分類タブの表示データ（遅延QuerySet）を返す
+
+        閾値での絞り込み・グルーピング・並び替えはDB側で行い、
+        ビューでページネーションすると表示ページ分だけが取得される。
+
+        Args:
+            case: 対象の案件（候補は refresh 済みであること）
+            threshold: 閾値スライダーの値
+
+        Returns:
+            groups（摘要ごとの件数・合計・提案分類・信頼度、件数の多い順）,
+            transactions（提案付きの未分類取引、新しい順）, suggestions_count, score_floor を含む辞書
+        """
+        score_floor = llm_classifier.suggestion_score_floor(threshold)
+        suggestions = case.ai_suggestions.filter(
+            pattern_version=AISuggestionService.pattern_version(case),
+            score__gte=score_floor,
+        )
+        current = suggestions.filter(description=OuterRef('description'))
+        suggested = {
+            'suggested_category': Subquery(current.values('category')[:1]),
+            'score': Subquery(current.values('score')[:1]),
+        }
+        transactions = AISuggestionService._unclassified(case).filter(
+            description__in=suggestions.values('description'),
+        )
+
+        groups = (
+            transactions.order_by()
+            .values('description')
+            .annotate(
+                count=Count('id'),
+                total_out=Coalesce(Sum('amount_out'), 0),
+                total_in=Coalesce(Sum('amount_in'), 0),
+            )
+            .annotate(**suggested)
+            .order_by('-count', '-score', 'description')
+        )
+        return {
+            'groups': groups,
+            'transactions': transactions.annotate(
+                **suggested,
+                alternatives=Subquery(current.values('alternatives')[:1]),
+            ).order_by('-date', '-id'),
+            'suggestions_count': transactions.count(),
+            'score_floor': score_floor,
+        }
+
+    @staticmethod
+    def format_transactions(transactions, score_floor: int) -> list[dict]:
+        """提案付き取引を表示用の辞書にする（その他の候補は閾値未満を除く）"""
+        result = []
+        for tx in transactions:
+            alternatives = tx.alternatives
+            if isinstance(alternatives, str):
+                alternatives = json.loads(alternatives)
+            result.append({
+                'tx_id': tx.id,
+                'date': tx.date,
+                'description': tx.description,
+                'amount_out': tx.amount_out or 0,
+                'amount_in': tx.amount_in or 0,
+                'suggested_category': tx.suggested_category,
+                'score': tx.score,
+                'alternative_suggestions': [
+                    alt for alt in alternatives or [] if alt['score'] >= score_floor
+                ],
+            })
+        return result
+
+    @staticmethod
+    def fill_group_tx_ids(groups, case: Case) -> list[dict]:
+        """表示するグループに取引IDを付ける（表示ページ分の摘要だけを取得）"""
+        groups = list(groups)
+        tx_ids = {g['description']: [] for g in groups}
+        rows = AISuggestionService._unclassified(case).filter(
+            description__in=list(tx_ids),
+        ).order_by('-date', '-id').values_list('description', 'id')
+        for description, tx_id in rows:
+            tx_ids[description].append(tx_id)
+        for g in groups:
+            g['tx_ids'] = tx_ids[g['description']]
+        return groups
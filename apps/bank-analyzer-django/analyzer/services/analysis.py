@@ -5,12 +5,14 @@
 """
 import json
 import logging
-from collections import defaultdict, OrderedDict
+from collections import defaultdict
 from datetime import date
 
 import pandas as pd
-from django.db.models import Q, Sum
-from django.db.models.functions import TruncMonth
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections
+from django.db.models import Count, F, Max, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, RowNumber, TruncMonth
 
 from ..models import Case, Transaction
 from ..lib import analyzer, llm_classifier, config
@@ -174,15 +176,13 @@ class AnalysisService:
 
     @staticmethod
     def _build_account_summary(case: Case) -> list:
-        """口座サマリーデータを生成（Account テーブルから直接取得）"""
-        from django.db.models import Count, Max
+        """口座サマリーデータを生成（口座に保存済みの集計値を読むだけで取引は集計しない）"""
         accounts = (
             case.accounts
-            .annotate(
-                count=Count('transactions'),
-                last_date=Max('transactions__date'),
+            .values(
+                'account_number', 'holder', 'bank_name', 'branch_name', 'account_type',
+                count=F('tx_count'), last_date=F('last_tx_date'),
             )
-            .values('account_number', 'holder', 'bank_name', 'branch_name', 'account_type', 'count', 'last_date')
             .order_by('bank_name', 'branch_name', 'account_number')
         )
         return list(accounts)
@@ -355,176 +355,109 @@ class AnalysisService:
         return transfer_pairs
 
     # =========================================================================
-    # AI分類提案
+    # 未分類グルーピング
     # =========================================================================
 
     @staticmethod
-    def _build_ai_suggestions(case: Case, filter_state: dict) -> dict:
+    def build_unclassified_groups(transactions, keyword: str = '') -> dict:
         """
-        AI分類提案データを生成
+        未分類取引を摘要でグルーピングする（集計・並び替えはDB側で行う）
 
-        評価順序:
-        1. 案件固有パターン（キーワード数が少ないカテゴリーから）
-        2. グローバルパターン（キーワード数が少ないカテゴリーから）
+        グループは GROUP BY 摘要 の遅延QuerySetとして返すため、ページネーションすると
+        表示するページ分のグループだけが LIMIT/OFFSET 付きで取得される。
+        取引IDとサンプルは fill_group_details で表示ページ分だけ取得する。
 
         Args:
-            case: 対象の案件
-            filter_state: フィルター条件
+            transactions: 未分類取引のQuerySet（並び順が取引IDとサンプルの順になる）
+            keyword: キーワードフィルタ
 
         Returns:
-            AI提案データの辞書 (ai_suggestions, suggestions_count, unclassified_count, fuzzy_threshold)
+            groups（件数の多い順のグループQuerySet）, tx_total, max_group_count を含む辞書
         """
-        fuzzy_config = config.get_fuzzy_config()
-        fuzzy_threshold = filter_state.get('fuzzy_threshold') or fuzzy_config.get('threshold', 90)
-        case_patterns = case.custom_patterns or {}
-        global_patterns = config.get_classification_patterns()
-
-        # 未分類の取引を取得（countとデータ取得を1クエリに統合）
-        unclassified_qs = case.transactions.filter(
-            category=UNCATEGORIZED,
-            is_flagged=False,
-        ).only('id', 'date', 'description', 'amount_out', 'amount_in')
-        unclassified_count = unclassified_qs.count()
-
-        if unclassified_count == 0:
-            return {
-                'ai_suggestions': [],
-                'suggestions_count': 0,
-                'unclassified_count': 0,
-                'fuzzy_threshold': fuzzy_threshold,
-            }
-
-        unclassified_txs = unclassified_qs.order_by('-date', '-id')[:100]
-
-        suggestions = []
-        for tx in unclassified_txs:
-            if not tx.description:
-                continue
+        if keyword:
+            transactions = filter_by_keyword(transactions, keyword)
 
-            # ファジーマッチングで提案を取得（案件固有を優先）
-            top_suggestions = llm_classifier.get_fuzzy_suggestions(
-                tx.description,
-                case_patterns=case_patterns,
-                global_patterns=global_patterns,
-                fuzzy_config={'threshold': fuzzy_threshold, **fuzzy_config},
-                top_n=3
+        groups = (
+            transactions.order_by()
+            .annotate(group_key=Coalesce('description', Value('')))
+            .values('group_key')
+            .annotate(
+                count=Count('id'),
+                total_out=Coalesce(Sum('amount_out'), 0),
+                total_in=Coalesce(Sum('amount_in'), 0),
             )
-
-            if top_suggestions:
-                main_category, main_score = top_suggestions[0]
-                alternative_suggestions = [
-                    {'category': cat, 'score': score}
-                    for cat, score in top_suggestions[1:]
-                ]
-
-                suggestions.append({
-                    'tx_id': tx.id,
-                    'date': tx.date,
-                    'description': tx.description,
-                    'amount_out': tx.amount_out or 0,
-                    'amount_in': tx.amount_in or 0,
-                    'suggested_category': main_category,
-                    'score': main_score,
-                    'alternative_suggestions': alternative_suggestions,
-                })
-
-        # グルーピング: 同じ(description, suggested_category)をまとめる
-        grouped = OrderedDict()
-        for s in suggestions:
-            key = (s['description'], s['suggested_category'])
-            if key not in grouped:
-                grouped[key] = {
-                    'description': s['description'],
-                    'suggested_category': s['suggested_category'],
-                    'score': s['score'],
-                    'alternative_suggestions': s['alternative_suggestions'],
-                    'tx_ids': [],
-                    'total_out': 0,
-                    'total_in': 0,
-                    'count': 0,
-                    'sample_date': s['date'],
-                }
-            g = grouped[key]
-            g['tx_ids'].append(s['tx_id'])
-            g['total_out'] += s['amount_out']
-            g['total_in'] += s['amount_in']
-            g['count'] += 1
-            # Keep highest score
-            if s['score'] > g['score']:
-                g['score'] = s['score']
-
-        ai_groups = list(grouped.values())
-        # Sort by count descending, then score descending
-        ai_groups.sort(key=lambda g: (-g['count'], -g['score']))
+            .order_by('-count', 'group_key')
+        )
+        totals = groups.aggregate(tx_total=Sum('count'), max_group_count=Max('count'))
 
         return {
-            'ai_suggestions': suggestions,
-            'ai_groups': ai_groups,
-            'suggestions_count': len(suggestions),
-            'unclassified_count': unclassified_count,
-            'fuzzy_threshold': fuzzy_threshold,
+            'groups': groups,
+            'tx_total': totals['tx_total'] or 0,
+            'max_group_count': totals['max_group_count'] or 1,
         }
 
-    # =========================================================================
-    # 未分類グルーピング
-    # =========================================================================
-
     @staticmethod
-    def build_unclassified_groups(transactions, keyword: str = '') -> dict:
+    def fill_group_details(groups, transactions, sample_size: int = 3) -> list[dict]:
         """
-        未分類取引を摘要でグルーピングし、各グループのサジェストを生成
+        表示するグループに取引ID・サンプル取引を付けて表示用の辞書にする
+
+        PostgreSQL では取引IDを ArrayAgg で1クエリにまとめ、サンプルは摘要ごとの
+        ROW_NUMBER() 窓関数で先頭 sample_size 件だけを取得する。
 
         Args:
-            transactions: 未分類取引のQuerySet or list
-            keyword: キーワードフィルタ
+            groups: build_unclassified_groups の groups（表示ページ分）
+            transactions: グルーピング元の取引QuerySet（with_account_info 済み・並び順付き）
+            sample_size: グループごとのサンプル件数
 
         Returns:
-            groups, tx_total, max_group_count, suggestions_json を含む辞書
+            description, count, total_out, total_in, tx_ids_json, first_tx_id, samples を含む辞書のリスト
         """
-        if keyword:
-            transactions = filter_by_keyword(transactions, keyword)
+        groups = list(groups)
+        if not groups:
+            return []
 
-        group_map = defaultdict(lambda: {
-            'count': 0,
-            'total_out': 0,
-            'total_in': 0,
-            'tx_ids': [],
-            'samples': [],
-        })
-        iterable = transactions if isinstance(transactions, list) else transactions.iterator()
-        for tx in iterable:
-            desc = tx.description or '（摘要なし）'
-            g = group_map[desc]
-            g['count'] += 1
-            g['total_out'] += tx.amount_out or 0
-            g['total_in'] += tx.amount_in or 0
-            g['tx_ids'].append(tx.id)
-            if len(g['samples']) < 3:
-                g['samples'].append({
-                    'date': tx.date,
-                    'bank_name': getattr(tx, 'bank_name', '') or '',
-                    'amount_out': tx.amount_out or 0,
-                    'amount_in': tx.amount_in or 0,
-                })
-
-        groups = []
-        for desc, data in group_map.items():
-            groups.append({
-                'description': desc,
-                'count': data['count'],
-                'total_out': data['total_out'],
-                'total_in': data['total_in'],
-                'tx_ids_json': json.dumps(data['tx_ids']),
-                'first_tx_id': data['tx_ids'][0] if data['tx_ids'] else None,
-                'samples': data['samples'],
+        ordering = list(transactions.query.order_by) or ['id']
+        rows = transactions.annotate(
+            group_key=Coalesce('description', Value('')),
+        ).filter(group_key__in=[g['group_key'] for g in groups])
+
+        if connections[transactions.db].vendor == 'postgresql':
+            tx_ids = dict(
+                rows.order_by()
+                .values('group_key')
+                .annotate(ids=ArrayAgg('id', ordering=ordering))
+                .values_list('group_key', 'ids')
+            )
+        else:
+            tx_ids = defaultdict(list)
+            for key, tx_id in rows.order_by(*ordering).values_list('group_key', 'id'):
+                tx_ids[key].append(tx_id)
+
+        samples = defaultdict(list)
+        sample_rows = rows.annotate(
+            sample_rank=Window(RowNumber(), partition_by=F('group_key'), order_by=ordering),
+        ).filter(sample_rank__lte=sample_size).order_by('group_key', 'sample_rank')
+        for row in sample_rows.values('group_key', 'date', 'bank_name', 'amount_out', 'amount_in'):
+            samples[row['group_key']].append({
+                'date': row['date'],
+                'bank_name': row['bank_name'] or '',
+                'amount_out': row['amount_out'] or 0,
+                'amount_in': row['amount_in'] or 0,
             })
-        groups.sort(key=lambda g: g['count'], reverse=True)
 
-        return {
-            'groups': groups,
-            'tx_total': sum(g['count'] for g in groups),
-            'max_group_count': groups[0]['count'] if groups else 1,
-        }
+        result = []
+        for g in groups:
+            ids = tx_ids.get(g['group_key']) or []
+            result.append({
+                'description': g['group_key'] or '（摘要なし）',
+                'count': g['count'],
+                'total_out': g['total_out'],
+                'total_in': g['total_in'],
+                'tx_ids_json': json.dumps(ids),
+                'first_tx_id': ids[0] if ids else None,
+                'samples': samples[g['group_key']],
+            })
+        return result
 
     @staticmethod
     def build_group_suggestions(groups_page, case) -> str:
@@ -0,0 +1,422 @@
+"""
+バックアップサービス
+
+案件のJSONバックアップを生成するビジネスロジックを提供する。
+取引はサーバーサイドカーソルで少しずつ読み出し、JSON断片として逐次出力するため、
+取引件数に関わらずメモリ使用量は一定に保たれる。
+
+列指向バックアップ（v2.0）は case.json・accounts.parquet・transactions.parquet を
+まとめた zip で、口座情報は accounts.parquet に1回だけ持ち、取引の摘要・分類などは
+辞書エンコードするため JSON より大幅に小さく、復元時も列ごとに一括で読み込める。
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+import zlib
+from datetime import date, datetime
+from functools import partial
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.db.models import Count, Sum
+
+from ..models import Case
+from ..lib import config
+
+logger = logging.getLogger(__name__)
+
+# バックアップ形式のバージョン（1.1: 口座の通帳有無一覧表データを含む）
+BACKUP_VERSION = '1.1'
+
+# バックアップに含める取引フィールド
+BACKUP_TRANSACTION_FIELDS = [
+    'date', 'bank_name', 'branch_name', 'account_type', 'account_number',
+    'description', 'amount_out', 'amount_in', 'balance',
+    'category', 'holder', 'is_large', 'is_transfer', 'transfer_to',
+    'is_flagged', 'memo', 'match_scope', 'match_keyword',
+]
+
+# サーバーサイドカーソルから1回に取得する取引数（出力もこの単位でまとめる）
+EXPORT_CHUNK_SIZE = 2000
+
+# 列指向バックアップ（zip）の形式バージョンと構成ファイル
+ARCHIVE_VERSION = '2.0'
+ARCHIVE_CASE_FILE = 'case.json'
+ARCHIVE_ACCOUNTS_FILE = 'accounts.parquet'
+ARCHIVE_TRANSACTIONS_FILE = 'transactions.parquet'
+
+# 口座の通帳有無一覧表データ（passbook_years は JSON 文字列で保持する）
+ARCHIVE_ACCOUNT_SCHEMA = pa.schema([
+    ('account_number', pa.string()),
+    ('bank_name', pa.string()),
+    ('branch_name', pa.string()),
+    ('account_type', pa.string()),
+    ('holder', pa.string()),
+    ('passbook_balance', pa.int64()),
+    ('certificate_balance', pa.int64()),
+    ('has_accrued_interest', pa.bool_()),
+    ('passbook_years', pa.string()),
+    ('inventory_remarks', pa.string()),
+    ('print_order', pa.int64()),
+])
+
+# 取引は口座番号だけを持ち、口座のメタデータは accounts.parquet から引く
+ARCHIVE_TRANSACTION_SCHEMA = pa.schema([
+    ('account_number', pa.string()),
+    ('date', pa.date32()),
+    ('description', pa.string()),
+    ('amount_out', pa.int64()),
+    ('amount_in', pa.int64()),
+    ('balance', pa.int64()),
+    ('category', pa.string()),
+    ('is_large', pa.bool_()),
+    ('is_transfer', pa.bool_()),
+    ('transfer_to', pa.string()),
+    ('is_flagged', pa.bool_()),
+    ('memo', pa.string()),
+    ('match_scope', pa.string()),
+    ('match_keyword', pa.string()),
+])
+
+# 辞書エンコードする列（同じ値が繰り返し現れる列）
+ARCHIVE_DICTIONARY_COLUMNS = [
+    'account_number', 'description', 'category', 'transfer_to', 'match_scope', 'match_keyword',
+]
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _HashingWriter(io.RawIOBase):
+    """書き込んだバイト列のハッシュを取りながら下位のファイルへ渡す"""
+
+    def __init__(self, raw: IO[bytes], hasher):
+        self._raw = raw
+        self._hasher = hasher
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._hasher.update(data)
+        self._raw.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+
+class BackupService:
+    """JSONバックアップに関するビジネスロジック"""
+
+    @staticmethod
+    def build_accounts_data(case: Case) -> list[dict]:
+        """口座の通帳有無一覧表データ（v1.1 の accounts）を作成"""
+        return [
+            {
+                'account_number': acc.account_number,
+                'bank_name': acc.bank_name,
+                'branch_name': acc.branch_name,
+                'account_type': acc.account_type,
+                'holder': acc.holder,
+                'passbook_balance': acc.passbook_balance,
+                'certificate_balance': acc.certificate_balance,
+                'has_accrued_interest': acc.has_accrued_interest,
+                'passbook_years': acc.passbook_years,
+                'inventory_remarks': acc.inventory_remarks,
+                'print_order': acc.print_order,
+            }
+            for acc in case.accounts.all().order_by('print_order', 'bank_name', 'branch_name')
+        ]
+
+    @staticmethod
+    def iter_json(
+        case: Case,
+        indent: int | None = 2,
+        user_settings: dict | None = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        exported_at: str | None = None,
+    ) -> Iterator[str]:
+        """
+        案件のJSONバックアップを断片ごとに返す
+
+        出力を連結すると json.dumps でまとめて生成した場合と同じ内容になる。
+
+        Args:
+            case: 対象案件
+            indent: インデント幅（None の場合は空白なしのコンパクト形式）
+            user_settings: 埋め込む設定（省略時は現在の設定）
+            chunk_size: サーバーサイドカーソルの取得件数
+            exported_at: 出力日時（省略時は現在日時）
+
+        Yields:
+            JSON文字列の断片
+        """
+        transactions = case.transactions.all().order_by('date', 'id')
+        totals = transactions.aggregate(
+            total_transactions=Count('id'),
+            total_in=Sum('amount_in'),
+            total_out=Sum('amount_out'),
+        )
+        if user_settings is None:
+            user_settings = config.load_user_settings()
+
+        header = {
+            'version': BACKUP_VERSION,
+            'exported_at': exported_at or datetime.now().isoformat(),
+            'case': BackupService._case_header(case),
+            'accounts': BackupService.build_accounts_data(case),
+        }
+        trailer = {
+            'statistics': {
+                'total_transactions': totals['total_transactions'],
+                'total_in': totals['total_in'] or 0,
+                'total_out': totals['total_out'] or 0,
+            },
+            'settings': user_settings,
+        }
+
+        # json.dumps(indent=...) と同じ区切り・改行で出力する
+        if indent is None:
+            dumps = partial(json.dumps, ensure_ascii=False, default=_json_default, separators=(',', ':'))
+            newline, pad, colon = '', '', ':'
+        else:
+            dumps = partial(json.dumps, ensure_ascii=False, default=_json_default, indent=indent)
+            newline, pad, colon = '\n', ' ' * indent, ': '
+
+        def nested(value, depth: int) -> str:
+            text = dumps(value)
+            return text.replace('\n', '\n' + pad * depth) if newline else text
+
+        def members(data: dict) -> str:
+            return ','.join(f"{newline}{pad}{dumps(key)}{colon}{nested(value, 1)}" for key, value in data.items())
+
+        yield '{' + members(header) + f',{newline}{pad}"transactions"{colon}['
+
+        rows = (
+            transactions.with_account_info()
+            .values(*BACKUP_TRANSACTION_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        row_prefix = newline + pad * 2
+        count = 0
+        buffer = []
+        for tx_dict in rows:
+            buffer.append(('' if count == 0 else ',') + row_prefix + nested(tx_dict, 2))
+            count += 1
+            if len(buffer) >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+        yield (f'{newline}{pad}]' if count else ']') + ',' + members(trailer) + newline + '}'
+        logger.info(f"JSONバックアップ出力完了: case_id={case.pk}, transactions={count}")
+
+    @staticmethod
+    def iter_gzip(chunks: Iterable[str]) -> Iterator[bytes]:
+        """文字列断片をgzip圧縮しながら返す"""
+        compressor = zlib.compressobj(wbits=31)  # 31 = gzip ヘッダ付き
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def write_json(
+        case: Case,
+        path: Path,
+        indent: int | None = 2,
+        compress: bool = False,
+        user_settings: dict | None = None,
+    ) -> str:
+        """
+        案件のJSONバックアップをファイルへ逐次書き出す
+
+        一時ファイルに書き込んでから置き換えるため、途中で失敗しても
+        既存のバックアップファイルは壊れない。
+
+        Returns:
+            出力日時を除いた内容の SHA-256（内容が同じなら出力日時が違っても一致する）
+        """
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        opener = partial(gzip.open, tmp_path, 'wt') if compress else partial(open, tmp_path, 'w')
+        exported_at = datetime.now().isoformat()
+        hasher = hashlib.sha256()
+        try:
+            with opener(encoding='utf-8') as f:
+                chunks = BackupService.iter_json(
+                    case, indent=indent, user_settings=user_settings, exported_at=exported_at,
+                )
+                for i, chunk in enumerate(chunks):
+                    f.write(chunk)
+                    # 出力日時は先頭の断片にだけ含まれる
+                    hasher.update((chunk.replace(exported_at, '', 1) if i == 0 else chunk).encode('utf-8'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _case_header(case: Case) -> dict:
+        return {
+            'name': case.name,
+            'created_at': case.created_at.isoformat() if case.created_at else None,
+            'reference_date': case.reference_date.isoformat() if case.reference_date else None,
+        }
+
+    @staticmethod
+    def write_archive(
+        case: Case,
+        fp: IO[bytes],
+        user_settings: dict | None = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        exported_at: str | None = None,
+    ) -> str:
+        """
+        案件の列指向バックアップ（v2.0 の zip）を書き出す
+
+        取引はサーバーサイドカーソルで chunk_size 件ずつ読み出し、
+        そのまま Parquet の行グループとして書き込む。
+
+        Args:
+            case: 対象案件
+            fp: 書き込み先のバイナリファイル
+            user_settings: 埋め込む設定（省略時は現在の設定）
+            chunk_size: サーバーサイドカーソルの取得件数（行グループの行数）
+            exported_at: 出力日時（省略時は現在日時）
+
+        Returns:
+            出力日時を除いた内容の SHA-256
+        """
+        transactions = case.transactions.all().order_by('date', 'id')
+        totals = transactions.aggregate(
+            total_transactions=Count('id'),
+            total_in=Sum('amount_in'),
+            total_out=Sum('amount_out'),
+        )
+        if user_settings is None:
+            user_settings = config.load_user_settings()
+
+        header = {
+            'version': ARCHIVE_VERSION,
+            'case': BackupService._case_header(case),
+            'statistics': {
+                'total_transactions': totals['total_transactions'],
+                'total_in': totals['total_in'] or 0,
+                'total_out': totals['total_out'] or 0,
+            },
+            'settings': user_settings,
+        }
+        hasher = hashlib.sha256(json.dumps(header, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        header = {'exported_at': exported_at or datetime.now().isoformat(), **header}
+
+        accounts = BackupService.build_accounts_data(case)
+        for acc in accounts:
+            acc['passbook_years'] = json.dumps(acc['passbook_years'] or {}, ensure_ascii=False)
+        account_table = pa.Table.from_pylist(accounts, schema=ARCHIVE_ACCOUNT_SCHEMA)
+
+        columns = ARCHIVE_TRANSACTION_SCHEMA.names
+        rows = transactions.values_list(
+            'account__account_number', *columns[1:],
+        ).iterator(chunk_size=chunk_size)
+
+        with zipfile.ZipFile(fp, 'w') as zf:
+            zf.writestr(
+                ARCHIVE_CASE_FILE,
+                json.dumps(header, ensure_ascii=False, indent=2),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            # Parquet は自前で圧縮済みのため zip 側では圧縮しない
+            with zf.open(ARCHIVE_ACCOUNTS_FILE, 'w') as member:
+                pq.write_table(account_table, _HashingWriter(member, hasher), compression='zstd')
+            with zf.open(ARCHIVE_TRANSACTIONS_FILE, 'w', force_zip64=True) as member:
+                with pq.ParquetWriter(
+                    _HashingWriter(member, hasher), ARCHIVE_TRANSACTION_SCHEMA,
+                    compression='zstd', use_dictionary=ARCHIVE_DICTIONARY_COLUMNS,
+                ) as writer:
+                    count = 0
+                    buffer = []
+                    for row in rows:
+                        buffer.append(row)
+                        if len(buffer) >= chunk_size:
+                            writer.write_table(BackupService._transaction_table(buffer))
+                            count += len(buffer)
+                            buffer = []
+                    if buffer or not count:
+                        writer.write_table(BackupService._transaction_table(buffer))
+                        count += len(buffer)
+
+        logger.info(f"列指向バックアップ出力完了: case_id={case.pk}, transactions={count}")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _transaction_table(rows: list[tuple]) -> pa.Table:
+        """取引の行タプルのリストを列ごとの配列に変換する"""
+        columns = list(zip(*rows)) if rows else [[] for _ in ARCHIVE_TRANSACTION_SCHEMA]
+        return pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, ARCHIVE_TRANSACTION_SCHEMA)],
+            schema=ARCHIVE_TRANSACTION_SCHEMA,
+        )
+
+    @staticmethod
+    def iter_archive(fp: IO[bytes], batch_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple[str, Any]]:
+        """
+        列指向バックアップ（zip）を (キー, 値) の列として読み出す
+
+        case.json の各キーと accounts を JSON バックアップと同じ形で返したあと、
+        ('transaction_columns', 列名→値リストの辞書のイテレータ) を返す。
+        取引は batch_size 件ずつ列単位で読み出すため、全件を展開しない。
+
+        Raises:
+            ValueError: zip または構成ファイルが不正な場合
+        """
+        try:
+            zf = zipfile.ZipFile(fp)
+        except zipfile.BadZipFile as e:
+            raise ValueError("バックアップファイルがzip形式ではありません") from e
+
+        with zf:
+            names = set(zf.namelist())
+            missing = [
+                name for name in (ARCHIVE_CASE_FILE, ARCHIVE_ACCOUNTS_FILE, ARCHIVE_TRANSACTIONS_FILE)
+                if name not in names
+            ]
+            if missing:
+                raise ValueError(f"バックアップに必要なファイルがありません: {', '.join(missing)}")
+
+            with zf.open(ARCHIVE_CASE_FILE) as f:
+                header = json.load(f)
+            if not isinstance(header, dict):
+                raise ValueError(f"{ARCHIVE_CASE_FILE} の形式が不正です")
+            yield from header.items()
+
+            with zf.open(ARCHIVE_ACCOUNTS_FILE) as f:
+                accounts = pq.read_table(f).to_pylist()
+            for acc in accounts:
+                acc['passbook_years'] = json.loads(acc['passbook_years'] or '{}')
+            yield 'accounts', accounts
+
+            with zf.open(ARCHIVE_TRANSACTIONS_FILE) as f:
+                parquet = pq.ParquetFile(f)
+                # 後から追加した列（match_scope など）は古いアーカイブにないため、ある列だけ読む
+                present = set(parquet.schema_arrow.names)
+                columns = [name for name in ARCHIVE_TRANSACTION_SCHEMA.names if name in present]
+                yield 'transaction_columns', (
+                    batch.to_pydict()
+                    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns)
+                )
@@ -0,0 +1,121 @@
+"""
+取引変更フィードサービス
+
+サービス層で取引を変更したときに、変更後の案件版数（Case.revision）と
+取引ID・変更項目を TransactionChange に記録する。開いている分析画面は
+`GET /case/<pk>/api/changes/?since=<版数>` で差分だけを受け取り、表示中の行を書き換える。
+
+記録は取引の変更と同じトランザクションの中で行う。変更で進めた版数はコミットまで
+案件の行ロックで守られるため、同時に別の変更があっても自分の変更の版数で記録できる。
+"""
+from typing import Iterable
+
+from django.db import transaction as db_transaction
+
+from ..models import Case, TransactionChange
+
+# 保持する版数の幅（これより古い版数からの差分要求には再読込を返す）
+CHANGE_FEED_RETENTION = 1000
+
+# 一度に返す・記録する変更取引数の上限（超える場合は再読込のほうが速い）
+CHANGE_FEED_MAX_ROWS = 500
+
+_BULK_BATCH_SIZE = 1000
+
+
+class ChangeFeedService:
+    """取引変更フィードの記録・取得に関するビジネスロジック"""
+
+    @staticmethod
+    def _current_revision(case: Case) -> int:
+        return Case.objects.filter(pk=case.pk).values_list('revision', flat=True).first() or 0
+
+    @staticmethod
+    @db_transaction.atomic
+    def _save(case: Case, entries: list[dict]) -> None:
+        # 取引の変更で版数を進めた案件の行をロックしたまま読む（他の変更はコミットまで待つ）
+        revision = (
+            Case.objects.select_for_update().filter(pk=case.pk).values_list('revision', flat=True).first() or 0
+        )
+        TransactionChange.objects.bulk_create(
+            [TransactionChange(case=case, revision=revision, **entry) for entry in entries],
+            batch_size=_BULK_BATCH_SIZE,
+        )
+        case.transaction_changes.filter(revision__lte=revision - CHANGE_FEED_RETENTION).delete()
+
+    @staticmethod
+    def record(case: Case, tx_ids: Iterable[int], fields: Iterable[str], op: str = TransactionChange.OP_UPDATE) -> None:
+        """
+        取引の変更を記録する（取引を変更した後、同じトランザクションの中で呼ぶ）
+
+        Args:
+            case: 対象の案件
+            tx_ids: 変更した取引ID
+            fields: 変更した項目（serialize_transaction のキー）。追加・削除では空でよい
+            op: 'create' / 'update' / 'delete'
+        """
+        tx_ids = sorted(set(tx_ids))
+        if not tx_ids:
+            return
+        if len(tx_ids) > CHANGE_FEED_MAX_ROWS:
+            # 差分で返せない件数なので、取引ごとに書かず再読込の記録1行にする
+            ChangeFeedService.record_reset(case)
+            return
+        fields = sorted(set(fields))
+        ChangeFeedService._save(case, [
+            {'transaction_identifier': tx_id, 'op': op, 'fields': fields}
+            for tx_id in tx_ids
+        ])
+
+    @staticmethod
+    def record_reset(case: Case) -> None:
+        """行単位で表せない変更（取込・口座の統合など）を記録する"""
+        ChangeFeedService._save(case, [{'op': TransactionChange.OP_RESET}])
+
+    @staticmethod
+    def changes_since(case: Case, since: int) -> dict:
+        """
+        指定した版数より後の取引変更を、取引ごとにまとめて返す
+
+        同じ取引への複数の変更は1件にまとめ、変更後の値は呼び出し側で現在の取引から読む。
+
+        Args:
+            case: 対象の案件
+            since: 画面が表示している版数
+
+        Returns:
+            revision（現在の版数）, reload（差分では追従できない場合 True）,
+            changes（[{'id', 'op', 'fields'}]、取引ID順）を含む辞書
+        """
+        revision = ChangeFeedService._current_revision(case)
+        result = {'revision': revision, 'reload': False, 'changes': []}
+        if since == revision:
+            return result
+        if since > revision or since <= revision - CHANGE_FEED_RETENTION:
+            result['reload'] = True
+            return result
+
+        entries = case.transaction_changes.filter(revision__gt=since).values_list(
+            'transaction_identifier', 'op', 'fields',
+        )
+        merged = {}
+        for tx_id, op, fields in entries.order_by('revision', 'id').iterator():
+            if op == TransactionChange.OP_RESET:
+                result['reload'] = True
+                return result
+            change = merged.setdefault(tx_id, {'id': tx_id, 'op': op, 'fields': set()})
+            if op == TransactionChange.OP_UPDATE:
+                # 追加後の更新は追加のまま（全項目を返す）
+                change['fields'].update(fields)
+            else:
+                # 追加・削除は最後の操作を採る（復元による再追加も含む）
+                change['op'] = op
+            if len(merged) > CHANGE_FEED_MAX_ROWS:
+                result['reload'] = True
+                return result
+
+        result['changes'] = [
+            {**change, 'fields': sorted(change['fields'])}
+            for _, change in sorted(merged.items())
+        ]
+        return result
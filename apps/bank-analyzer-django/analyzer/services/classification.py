@@ -67,6 +67,20 @@ def match_with_priority(
     return match_pattern(description, global_patterns)
 
 
+def match_scope_of(match_type: Optional[str]) -> str:
+    """match_with_priority のマッチタイプを分類の根拠のスコープ（'case' / 'global'）に変換"""
+    return 'case' if match_type == 'case' else 'global'
+
+
+def match_provenance(transactions) -> dict[int, tuple[str, str]]:
+    """
+    規則で分類した取引の根拠を返す（ClassificationHistoryService.apply_changes の matches 用）
+
+    classify_unclassified_transactions が設定した match_scope / match_keyword を読む。
+    """
+    return {tx.id: (tx.match_scope, tx.match_keyword) for tx in transactions if tx.match_keyword}
+
+
 def calculate_match_score(match_type: str, keyword: str, description: str) -> int:
     """
     マッチタイプに基づいて信頼度スコアを計算
@@ -97,6 +111,8 @@ def classify_unclassified_transactions(
     """
     未分類取引に対して分類を実行（bulk_update用のリストを返す）
 
+    返す取引には分類の根拠（match_scope / match_keyword）も設定する。
+
     Args:
         case: 対象の案件
         use_fuzzy: ファジーマッチングを使用するか
@@ -122,7 +138,7 @@ def classify_unclassified_transactions(
             if not tx.description:
                 continue
 
-            category, score = llm_classifier.classify_by_rules(
+            category, score, scope, keyword = llm_classifier.classify_with_match(
                 tx.description,
                 tx.amount_out or 0,
                 tx.amount_in or 0,
@@ -134,6 +150,7 @@ def classify_unclassified_transactions(
             if category != UNCATEGORIZED and score >= min_score:
                 tx.category = category
                 tx.classification_score = score
+                tx.match_scope, tx.match_keyword = scope, keyword
                 updates.append(tx)
     else:
         # シンプルなサブストリングマッチング
@@ -147,6 +164,7 @@ def classify_unclassified_transactions(
 
             if category:
                 tx.category = category
+                tx.match_scope, tx.match_keyword = match_scope_of(match_type), keyword
                 updates.append(tx)
 
     return updates
@@ -4,9 +4,15 @@ import uuid
 from django.db import transaction as db_transaction
 from django.utils import timezone
 
+from ..lib.constants import UNCATEGORIZED
 from ..models import Case, ClassificationChange, Transaction
+from .ai_suggestion import AISuggestionService
+from .change_feed import ChangeFeedService
 from .utils import parse_int_ids
 
+# 分類の根拠（一致したキーワード）を保持する項目
+MATCH_FIELDS = ["match_scope", "match_keyword"]
+
 
 class ClassificationHistoryService:
     """分類変更を操作単位で記録し、LIFO順で復元する。"""
@@ -18,7 +24,16 @@ class ClassificationHistoryService:
         category_updates: dict[str | int, str],
         *,
         source: str = "manual",
+        matches: dict[int, tuple[str, str]] | None = None,
     ) -> tuple[int, str | None]:
+        """
+        分類を変更し、変更前後を1つの操作として記録する
+
+        matches には規則で分類した取引の根拠 {取引ID: (スコープ, キーワード)} を渡す。
+        分類を変えた取引は根拠を上書きし（matches にない取引は空にする）、
+        分類が同じでも根拠だけ変わった取引は履歴を残さずに根拠だけ更新する。
+        未分類に戻した取引があれば、その摘要のAI分類候補を計算する。
+        """
         if not category_updates:
             return 0, None
 
@@ -32,15 +47,24 @@ class ClassificationHistoryService:
         transactions = list(
             case.transactions.select_for_update()
             .filter(id__in=tx_ids)
-            .only("id", "description", "category")
+            .only("id", "description", "category", *MATCH_FIELDS)
         )
+        matches = matches or {}
         changes = []
         updates = []
+        match_updates = []
         change_group = uuid.uuid4()
 
         for tx in transactions:
             new_category = normalized.get(str(tx.id))
-            if not new_category or tx.category == new_category:
+            if not new_category:
+                continue
+            scope, keyword = matches.get(tx.id, ("", ""))
+            match_changed = (tx.match_scope, tx.match_keyword) != (scope, keyword)
+            tx.match_scope, tx.match_keyword = scope, keyword
+            if tx.category == new_category:
+                if match_changed and tx.id in matches:
+                    match_updates.append(tx)
                 continue
             changes.append(
                 ClassificationChange(
@@ -57,11 +81,16 @@ class ClassificationHistoryService:
             tx.category = new_category
             updates.append(tx)
 
+        if match_updates:
+            Transaction.objects.bulk_update(match_updates, MATCH_FIELDS)
         if not updates:
             return 0, None
 
         ClassificationChange.objects.bulk_create(changes)
-        Transaction.objects.bulk_update(updates, ["category"])
+        Transaction.objects.bulk_update(updates, ["category", *MATCH_FIELDS])
+        ChangeFeedService.record(case, [tx.id for tx in updates], ["category"])
+        if any(tx.category == UNCATEGORIZED for tx in updates):
+            AISuggestionService.refresh(case)
         return len(updates), str(change_group)
 
     @staticmethod
@@ -134,16 +163,21 @@ class ClassificationHistoryService:
         for change in changes:
             tx = transactions[change.transaction_identifier]
             tx.category = change.old_category
+            # 変更前の根拠は記録していないため空にする（パターン変更時の再分類の対象外になる）
+            tx.match_scope, tx.match_keyword = "", ""
             updates.append(tx)
             restored_categories.add(change.old_category)
 
-        Transaction.objects.bulk_update(updates, ["category"])
+        Transaction.objects.bulk_update(updates, ["category", *MATCH_FIELDS])
+        ChangeFeedService.record(case, [tx.id for tx in updates], ["category"])
         reverted_at = timezone.now()
         ClassificationChange.objects.filter(
             case=case,
             change_group=group_uuid,
             reverted_at__isnull=True,
         ).update(reverted_at=reverted_at)
+        if UNCATEGORIZED in restored_categories:
+            AISuggestionService.refresh(case)
 
         return {
             "success": True,
@@ -0,0 +1,113 @@
+"""
+エクスポート成果物キャッシュサービス
+
+案件のエクスポートファイルを <EXPORT_CACHE_DIR>/<案件キー>/<版数>/<成果物名> に保存し、
+案件の版数（Case.revision）が変わるまで再利用する。版数は案件・口座・取引の
+変更で必ず進むため、変更後の最初のリクエストだけが生成コストを払う。
+
+案件キーは「ID-作成日時」とし、DBを作り直してIDが再利用されても
+別案件の成果物を配信しないようにする。
+"""
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO, Callable
+
+from django.conf import settings
+
+from ..models import Case
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCacheService:
+    """エクスポート成果物のキャッシュに関するビジネスロジック"""
+
+    @staticmethod
+    def cache_dir() -> Path:
+        """キャッシュのルートディレクトリ"""
+        return Path(settings.EXPORT_CACHE_DIR)
+
+    @staticmethod
+    def case_key(case_id: int, created_at) -> str:
+        """案件ごとのディレクトリ名"""
+        return f"{case_id}-{created_at:%Y%m%d%H%M%S%f}"
+
+    @staticmethod
+    def artifact_path(case: Case, name: str) -> Path:
+        """案件の現在の版数に対応する成果物のパス"""
+        case_dir = ExportCacheService.cache_dir() / ExportCacheService.case_key(case.pk, case.created_at)
+        return case_dir / str(case.revision) / name
+
+    @staticmethod
+    def get_or_build(case: Case, name: str, build: Callable[[IO[bytes]], None]) -> Path:
+        """
+        成果物のパスを返す（無ければ生成して保存する）
+
+        一時ファイルに書き込んでから置き換えるため、生成途中のファイルが
+        配信されることはない。同時に生成した場合も内容は同じなので後勝ちでよい。
+
+        Args:
+            case: 対象案件（版数は取得時点のもの）
+            name: 成果物名（設定値などの生成条件を含めて一意にする）
+            build: 書き込み先のバイナリファイルを受け取って内容を書き出す関数
+
+        Returns:
+            成果物のパス
+        """
+        path = ExportCacheService.artifact_path(case, name)
+        if path.exists():
+            logger.debug(f"エクスポートキャッシュ利用: case_id={case.pk}, revision={case.revision}, name={name}")
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                build(f)
+            # Nginx（別ユーザー）から読めるようにする
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        logger.info(f"エクスポート成果物を生成: case_id={case.pk}, revision={case.revision}, name={name}")
+        ExportCacheService._purge_revisions(path.parent.parent, case.revision)
+        return path
+
+    @staticmethod
+    def _purge_revisions(case_dir: Path, current_revision: int) -> int:
+        """案件ディレクトリ内の古い版数を削除し、削除した数を返す
+
+        配信中・生成中の可能性がある現在以降の版数は残す。
+        """
+        removed = 0
+        for revision_dir in case_dir.iterdir():
+            if revision_dir.is_dir() and revision_dir.name.isdigit() and int(revision_dir.name) < current_revision:
+                shutil.rmtree(revision_dir, ignore_errors=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def purge_stale() -> int:
+        """全案件の古い版数と削除済み案件の成果物を削除し、削除したディレクトリ数を返す"""
+        root = ExportCacheService.cache_dir()
+        if not root.is_dir():
+            return 0
+        revisions = {
+            ExportCacheService.case_key(case_id, created_at): revision
+            for case_id, created_at, revision in Case.objects.values_list('pk', 'created_at', 'revision')
+        }
+        removed = 0
+        for case_dir in root.iterdir():
+            if not case_dir.is_dir():
+                continue
+            if case_dir.name not in revisions:
+                shutil.rmtree(case_dir, ignore_errors=True)
+                removed += 1
+            else:
+                removed += ExportCacheService._purge_revisions(case_dir, revisions[case_dir.name])
+        return removed
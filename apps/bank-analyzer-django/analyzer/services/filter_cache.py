@@ -0,0 +1,122 @@
+"""
+絞り込み結果キャッシュサービス
+
+分析ダッシュボードの絞り込み条件（build_filter_state の出力）を正規化してキーにし、
+件数・入出金合計・先頭ページの取引IDを Django のキャッシュに保存する。
+キーには案件の版数（Case.revision）を含めるため、案件のデータが変わると
+自動的に別キーになり、変更前の結果が使われることはない。
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from ..models import Case
+from ..lib.text_utils import split_keywords
+from .export_cache import ExportCacheService
+from .utils import parse_amount_str
+
+# キャッシュの有効期間（秒）
+FILTER_CACHE_TIMEOUT = 60 * 60
+
+# タブごとに結果へ影響する絞り込み条件
+_SCOPE_FIELDS = {
+    'all': (
+        'bank', 'account', 'category', 'category_mode', 'keyword',
+        'date_from', 'date_to', 'amount_type', 'amount_min', 'amount_max',
+    ),
+    'unclassified': ('keyword',),
+}
+
+
+class FilterCacheService:
+    """絞り込み結果の集計キャッシュに関するビジネスロジック"""
+
+    @staticmethod
+    def canonical_state(filter_state: dict, scope: str = 'all') -> dict:
+        """
+        絞り込み条件を結果が同じなら同じ値になる形へ正規化する
+
+        複数選択は重複を除いて並べ替え、キーワードは正規化済みの語の集合（AND検索のため順不同）、
+        金額は数値にする。タブの結果に影響しない条件は含めない。
+        """
+        fields = _SCOPE_FIELDS[scope]
+        state = {}
+        for key in ('bank', 'account', 'category'):
+            if key in fields:
+                state[key] = sorted(set(filter_state.get(key) or []))
+        if 'category_mode' in fields and state.get('category'):
+            state['category_mode'] = 'exclude' if filter_state.get('category_mode') == 'exclude' else 'include'
+        if 'keyword' in fields:
+            state['keyword'] = sorted(set(split_keywords(filter_state.get('keyword') or '')))
+        for key in ('date_from', 'date_to'):
+            if key in fields:
+                state[key] = (filter_state.get(key) or '').strip()
+        if 'amount_type' in fields:
+            amount_type = filter_state.get('amount_type') or 'both'
+            state['amount_type'] = amount_type if amount_type in ('in', 'out') else 'both'
+        for key in ('amount_min', 'amount_max'):
+            if key in fields:
+                state[key] = parse_amount_str((filter_state.get(key) or '').strip())
+        return state
+
+    @staticmethod
+    def cache_key(case: Case, filter_state: dict, scope: str, kind: str) -> str:
+        """案件・版数・正規化した条件から決まるキャッシュキー"""
+        canonical = json.dumps(
+            FilterCacheService.canonical_state(filter_state, scope),
+            ensure_ascii=False, sort_keys=True,
+        )
+        digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+        case_key = ExportCacheService.case_key(case.pk, case.created_at)
+        return f"analyzer:filter:{case_key}:{case.revision}:{scope}:{kind}:{digest}"
+
+    @staticmethod
+    def get_summary(case: Case, queryset, filter_state: dict, scope: str = 'all') -> dict:
+        """
+        絞り込み結果の件数・入出金合計を返す（キャッシュが無ければ1回の集計で求める）
+
+        Args:
+            case: 対象案件（版数は取得時点のもの）
+            queryset: filter_state を適用済みの取引QuerySet
+            filter_state: 絞り込み条件
+            scope: タブ（'all' / 'unclassified'）
+
+        Returns:
+            {'count': 件数, 'total_in': 入金合計, 'total_out': 出金合計}
+        """
+        def compute():
+            totals = queryset.order_by().aggregate(
+                count=Count('id'), total_in=Sum('amount_in'), total_out=Sum('amount_out'),
+            )
+            return {
+                'count': totals['count'],
+                'total_in': totals['total_in'] or 0,
+                'total_out': totals['total_out'] or 0,
+            }
+
+        key = FilterCacheService.cache_key(case, filter_state, scope, 'summary')
+        return cache.get_or_set(key, compute, FILTER_CACHE_TIMEOUT)
+
+    @staticmethod
+    def get_first_page_ids(
+        case: Case,
+        queryset,
+        filter_state: dict,
+        scope: str,
+        sort_key: str,
+        limit: int,
+    ) -> list[int]:
+        """
+        並び替え済みの絞り込み結果の先頭 limit 件の取引IDを返す
+
+        Args:
+            queryset: filter_state を適用し、表示順に並べた取引QuerySet
+            sort_key: 並び順を表す文字列（キーに含める）
+            limit: 取得件数（次ページ有無の判定分を含める）
+        """
+        key = FilterCacheService.cache_key(case, filter_state, scope, f'first:{sort_key}:{limit}')
+        return cache.get_or_set(
+            key, lambda: list(queryset.values_list('pk', flat=True)[:limit]), FILTER_CACHE_TIMEOUT,
+        )
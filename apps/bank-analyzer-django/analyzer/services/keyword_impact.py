@@ -0,0 +1,132 @@
+"""
+キーワード影響プレビューサービス
+
+パターン登録前に、キーワードに一致する取引を正規化済みの検索列（description_search）で
+絞り込む。PostgreSQL では trigram GIN インデックスが使われ、摘要を全件走査しない。
+候補は分類器と同じ判定（小文字化した部分一致）で確定し、案件ごとの件数・対象取引ID・
+登録後の分類の変化（X → Y）を1回のクエリ結果から計算する。
+"""
+from collections import Counter
+from typing import Optional
+
+from django.db.models import Q
+
+from ..lib import config, llm_classifier
+from ..lib.constants import UNCATEGORIZED
+from ..lib.text_utils import filter_by_keyword
+from ..models import Case, Transaction
+
+
+class KeywordImpactService:
+    """キーワード登録の影響範囲に関するビジネスロジック"""
+
+    @staticmethod
+    def contains(description: Optional[str], keyword: str) -> bool:
+        """分類器と同じ判定（小文字化した部分一致）で摘要がキーワードを含むか"""
+        return bool(description) and keyword.lower() in description.lower()
+
+    @staticmethod
+    def candidates(transactions, keyword: str):
+        """キーワードを含みうる取引（正規化済みの検索列で絞り込む。分類器の判定を含む上位集合）"""
+        return filter_by_keyword(transactions, keyword)
+
+    @staticmethod
+    def matching_ids(transactions, keyword: str) -> list[int]:
+        """キーワードを含む取引IDを返す（検索列で絞り込んでから分類器と同じ判定で確定）"""
+        rows = KeywordImpactService.candidates(transactions, keyword).values_list('id', 'description')
+        return [tx_id for tx_id, description in rows if KeywordImpactService.contains(description, keyword)]
+
+    @staticmethod
+    def preview(case: Case, keyword: str, category: Optional[str] = None, scope: str = 'global') -> dict:
+        """
+        キーワード登録の影響をプレビュー
+
+        全案件の未分類取引（要確認を除く）と現在の案件の取引を1クエリで取得し、
+        未分類の一致件数を案件ごとに数える。カテゴリーを指定した場合は、現在の案件の
+        一致取引について登録後の規則による分類を摘要ごとに1回だけ計算し、現在の分類との差を返す。
+
+        Args:
+            case: 現在の案件
+            keyword: 登録するキーワード
+            category: 登録先のカテゴリー（省略時は分類の変化を計算しない）
+            scope: 登録先のスコープ（'global' / 'case'）
+
+        Returns:
+            current_case_count, other_cases_count, total_count,
+            case_counts（{案件ID: 未分類の一致件数}）, transaction_ids（現在の案件の対象取引ID）,
+            changes（[{'from', 'to', 'count'}]、件数の多い順）を含む辞書
+        """
+        keyword = (keyword or '').strip()
+        result = {
+            'current_case_count': 0, 'other_cases_count': 0, 'total_count': 0,
+            'case_counts': {}, 'transaction_ids': [], 'changes': [],
+        }
+        if not keyword:
+            return result
+
+        transactions = Transaction.objects.filter(is_flagged=False).filter(
+            Q(category=UNCATEGORIZED) | Q(case=case),
+        )
+        rows = KeywordImpactService.candidates(transactions, keyword).order_by().values_list(
+            'case_id', 'id', 'description', 'amount_out', 'category',
+        )
+
+        case_counts = Counter()
+        current_rows = []
+        for case_id, tx_id, description, amount_out, tx_category in rows:
+            if not KeywordImpactService.contains(description, keyword):
+                continue
+            if case_id == case.pk:
+                current_rows.append((description, amount_out or 0, tx_category))
+            if tx_category == UNCATEGORIZED:
+                case_counts[case_id] += 1
+                if case_id == case.pk:
+                    result['transaction_ids'].append(tx_id)
+
+        current_count = case_counts.get(case.pk, 0)
+        total_count = sum(case_counts.values())
+        result.update(
+            current_case_count=current_count,
+            other_cases_count=total_count - current_count,
+            total_count=total_count,
+            case_counts=dict(case_counts),
+        )
+        if category:
+            result['changes'] = KeywordImpactService._category_changes(
+                case, keyword, category, scope, current_rows,
+            )
+        return result
+
+    @staticmethod
+    def _category_changes(case: Case, keyword: str, category: str, scope: str, rows: list[tuple]) -> list[dict]:
+        """キーワード登録後の規則による分類と現在の分類の差を集計"""
+        case_patterns = config.get_case_patterns(case)
+        global_patterns = config.get_classification_patterns()
+        target = case_patterns if scope == 'case' else global_patterns
+        keywords = target.setdefault(category, [])
+        if keyword not in keywords:
+            keywords.append(keyword)
+
+        gift_threshold = config.get_gift_threshold()
+        fuzzy_config = config.get_fuzzy_config()
+        predicted = {}
+        changes = Counter()
+        for description, amount_out, current in rows:
+            # 規則の結果は摘要と贈与閾値の判定だけで決まる
+            key = (description, amount_out >= gift_threshold)
+            if key not in predicted:
+                predicted[key], _ = llm_classifier.classify_by_rules(
+                    description, amount_out, 0,
+                    case_patterns=case_patterns,
+                    global_patterns=global_patterns,
+                    gift_threshold=gift_threshold,
+                    fuzzy_config=fuzzy_config,
+                )
+            after = predicted[key]
+            if after != current:
+                changes[(current, after)] += 1
+
+        return [
+            {'from': before, 'to': after, 'count': count}
+            for (before, after), count in changes.most_common()
+        ]
@@ -0,0 +1,81 @@
+"""
+学習済み分類モデルサービス
+
+分類変更履歴（ClassificationChange）のうち、手動で決めた分類を全案件から集めて
+文字n-gramのナイーブベイズ分類器を学習し、版数付きで保存する。
+学習は train_learned_classifier コマンドで行い、推論は AISuggestionService が
+ファジーマッチングの候補と並べて使う。保存した後に全案件のAI分類候補を新しい版で計算し直す。
+"""
+import logging
+from typing import Optional
+
+from django.db.models import Q
+
+from ..lib import learned_classifier
+from ..lib.constants import UNCATEGORIZED
+from ..models import ClassificationChange
+from .ai_suggestion import AISuggestionService
+
+logger = logging.getLogger(__name__)
+
+# 学習に使う変更元（手動での分類。規則・AI提案による分類は自己強化になるため使わない）
+TRAINING_SOURCES = ('manual', 'manual_same_description', 'transaction_edit')
+TRAINING_SOURCE_PREFIX = 'bulk_'
+
+
+class LearnedClassifierService:
+    """学習済み分類モデルの学習に関するビジネスロジック"""
+
+    @staticmethod
+    def training_data() -> tuple[list[str], list[str]]:
+        """
+        学習データ（摘要, 分類）を分類変更履歴から集める
+
+        取り消した変更と未分類への変更は除き、同じ摘要は最後に決めた分類を使う。
+
+        Returns:
+            (摘要のリスト, 分類のリスト)
+        """
+        changes = (
+            ClassificationChange.objects.filter(reverted_at__isnull=True)
+            .filter(Q(source__in=TRAINING_SOURCES) | Q(source__startswith=TRAINING_SOURCE_PREFIX))
+            .exclude(new_category=UNCATEGORIZED)
+            .exclude(transaction_description='')
+            .order_by('created_at', 'id')
+            .values_list('transaction_description', 'new_category')
+        )
+        latest = {}
+        for description, category in changes.iterator():
+            latest.pop(description, None)
+            latest[description] = category
+        return list(latest), list(latest.values())
+
+    @staticmethod
+    def train(min_samples: int = 20, alpha: float = 0.1, keep: int = 3) -> Optional[dict]:
+        """
+        分類変更履歴からモデルを学習して次の版数で保存し、全案件のAI分類候補を更新する
+
+        Args:
+            min_samples: 学習に必要な最少の摘要数
+            alpha: 加算スムージングの値
+            keep: 残しておく過去の版の数
+
+        Returns:
+            version, path, samples, categories, vocabulary を含む辞書。
+            学習データが足りない（摘要数が min_samples 未満、または分類が1種類以下）場合は None
+        """
+        descriptions, labels = LearnedClassifierService.training_data()
+        if len(descriptions) < min_samples or len(set(labels)) < 2:
+            logger.info(f"学習データが不足しています: samples={len(descriptions)}")
+            return None
+
+        model = learned_classifier.NaiveBayesClassifier.fit(descriptions, labels, alpha=alpha)
+        version, path = learned_classifier.save_model(model, keep=keep)
+        AISuggestionService.refresh_cases()
+        return {
+            'version': version,
+            'path': path,
+            'samples': len(descriptions),
+            'categories': len(model.categories),
+            'vocabulary': len(model.vocabulary),
+        }
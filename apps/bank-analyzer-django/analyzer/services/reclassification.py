@@ -0,0 +1,169 @@
+"""
+再分類サービス
+
+分類パターンのキーワードを変更・削除・移動したときに、影響する取引だけを分類し直す。
+規則で分類した取引には一致したキーワード（match_scope / match_keyword）が記録されているため、
+変更前のキーワードで分類された取引はそのインデックスで、変更後のキーワードを含む取引は
+検索用摘要（description_search）で絞り込む。作業量は全取引数ではなく影響する取引数に比例する。
+
+グローバルのキーワードは全案件、案件固有のキーワードはその案件の取引だけが対象。
+要確認の取引と、手動・AIで分類した取引（根拠のない取引）は変更しない。
+"""
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.db.models import Q
+
+from ..lib import config, llm_classifier
+from ..lib.constants import UNCATEGORIZED
+from ..models import Case, Transaction
+from .ai_suggestion import AISuggestionService
+from .classification_history import ClassificationHistoryService
+from .keyword_impact import KeywordImpactService
+
+logger = logging.getLogger(__name__)
+
+
+class ReclassificationService:
+    """キーワード変更に伴う再分類に関するビジネスロジック"""
+
+    @staticmethod
+    def _scoped(case: Optional[Case], scope: str):
+        """スコープのキーワードが影響しうる取引（グローバルは全案件、案件固有はその案件）"""
+        transactions = Transaction.objects.filter(is_flagged=False)
+        if scope == 'case':
+            return transactions.filter(case=case) if case is not None else transactions.none()
+        return transactions
+
+    @staticmethod
+    def affected_ids(
+        case: Optional[Case],
+        stale_keywords: Iterable[tuple[str, str]] = (),
+        new_keywords: Iterable[tuple[str, str]] = (),
+    ) -> dict[int, set[int]]:
+        """
+        キーワード変更の影響を受ける取引IDを案件ごとに返す
+
+        Args:
+            case: 案件固有のキーワードを変更した案件（グローバルのみなら None でよい）
+            stale_keywords: 削除・変更前・移動元の (スコープ, キーワード)。それで分類された取引が対象
+            new_keywords: 変更後・移動先の (スコープ, キーワード)。それを含む未分類の取引と、
+                規則で分類済みの取引（優先順位が変わりうる）が対象
+
+        Returns:
+            {案件ID: 取引IDのセット}
+        """
+        affected = defaultdict(set)
+
+        stale = defaultdict(set)
+        for scope, keyword in stale_keywords:
+            stale[scope].add(keyword)
+        condition = Q()
+        for scope, keywords in stale.items():
+            if scope == 'case' and case is None:
+                continue
+            scope_condition = Q(match_scope=scope, match_keyword__in=sorted(keywords))
+            if scope == 'case':
+                scope_condition &= Q(case=case)
+            condition |= scope_condition
+        if condition:
+            rows = Transaction.objects.filter(condition, is_flagged=False).values_list('case_id', 'id')
+            for case_id, tx_id in rows:
+                affected[case_id].add(tx_id)
+
+        for scope, keyword in set(new_keywords):
+            transactions = ReclassificationService._scoped(case, scope).filter(
+                Q(category=UNCATEGORIZED) | ~Q(match_keyword=''),
+            )
+            rows = KeywordImpactService.candidates(transactions, keyword).order_by().values_list(
+                'case_id', 'id', 'description',
+            )
+            for case_id, tx_id, description in rows:
+                if KeywordImpactService.contains(description, keyword):
+                    affected[case_id].add(tx_id)
+
+        return affected
+
+    @staticmethod
+    def reclassify(
+        case: Optional[Case],
+        stale_keywords: Iterable[tuple[str, str]] = (),
+        new_keywords: Iterable[tuple[str, str]] = (),
+        *,
+        source: str = 'pattern_update',
+    ) -> int:
+        """
+        キーワード変更の影響を受ける取引だけを現在のパターンで分類し直す
+
+        保存済みのパターン（PatternBatch.commit() の後）で規則による分類を行い、
+        分類が変わった取引を案件ごとに1つの操作として履歴付きで更新する。
+        パターンが変わると分類が変わらなくてもAI分類候補の版が古くなるため、
+        件数によらず影響する案件（グローバルの変更なら全案件）の候補を更新する。
+
+        Args:
+            case: 案件固有のキーワードを変更した案件（グローバルのみなら None でよい）
+            stale_keywords: PatternBatch.stale_keywords
+            new_keywords: PatternBatch.new_keywords
+            source: 分類変更履歴の変更元
+
+        Returns:
+            分類が変わった取引数（全案件の合計）
+        """
+        stale_keywords, new_keywords = list(stale_keywords), list(new_keywords)
+        affected = ReclassificationService.affected_ids(case, stale_keywords, new_keywords)
+
+        cases = Case.objects.in_bulk(list(affected))
+        total = 0
+        for case_id, tx_ids in affected.items():
+            if case_id in cases:
+                total += ReclassificationService._reclassify_case(cases[case_id], tx_ids, source)
+
+        scopes = {scope for scope, _ in stale_keywords + new_keywords}
+        if 'global' in scopes:
+            AISuggestionService.refresh_cases()
+        elif scopes and case is not None:
+            AISuggestionService.refresh(case)
+        return total
+
+    @staticmethod
+    def _reclassify_case(case: Case, tx_ids: set[int], source: str) -> int:
+        """案件の指定取引を規則で分類し直す（同じ摘要と贈与閾値の判定の組は1回だけ評価）"""
+        transactions = case.transactions.filter(id__in=tx_ids, is_flagged=False).only(
+            'id', 'description', 'amount_out', 'amount_in', 'category', 'classification_score',
+        )
+        case_patterns = config.get_case_patterns(case)
+        global_patterns = config.get_classification_patterns()
+        gift_threshold = config.get_gift_threshold()
+        fuzzy_config = config.get_fuzzy_config()
+
+        results = {}
+        category_updates = {}
+        matches = {}
+        scored = []
+        for tx in transactions:
+            amount_out = tx.amount_out or 0
+            key = (tx.description, amount_out >= gift_threshold)
+            if key not in results:
+                results[key] = llm_classifier.classify_with_match(
+                    tx.description or '', amount_out, tx.amount_in or 0,
+                    case_patterns=case_patterns,
+                    global_patterns=global_patterns,
+                    gift_threshold=gift_threshold,
+                    fuzzy_config=fuzzy_config,
+                )
+            category, score, scope, keyword = results[key]
+            category_updates[tx.id] = category
+            if keyword:
+                matches[tx.id] = (scope, keyword)
+            if tx.classification_score != score:
+                tx.classification_score = score
+                scored.append(tx)
+
+        count, _ = ClassificationHistoryService.apply_changes(
+            case, category_updates, source=source, matches=matches,
+        )
+        if scored:
+            Transaction.objects.bulk_update(scored, ['classification_score'])
+        logger.info(f"キーワード変更の再分類: case_id={case.id}, 対象={len(tx_ids)}件, 変更={count}件")
+        return count
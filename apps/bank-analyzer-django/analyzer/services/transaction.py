@@ -5,24 +5,31 @@
 """
 import logging
 from datetime import date
-from typing import Optional
+from itertools import batched, chain
+from typing import Any, BinaryIO, Iterable, Optional
 
 import pandas as pd
 from django.db import transaction as db_transaction, IntegrityError
 from django.utils import timezone
 from django.db.models import Count
 
-from ..models import Account, Case, DeletionBackup, Transaction
-from ..lib import analyzer, config, llm_classifier
+from ..models import Account, Case, DeletionBackup, Transaction, TransactionChange
+from ..lib import analyzer, config, json_stream, llm_classifier
 from ..lib.constants import UNCATEGORIZED
 from ..lib.text_utils import normalize_text
 from .utils import parse_date_value, parse_int_ids, get_transaction
 from .classification import (
     classify_unclassified_transactions,
     match_with_priority,
+    match_provenance,
+    match_scope_of,
     calculate_match_score,
 )
 from .classification_history import ClassificationHistoryService
+from .ai_suggestion import AISuggestionService
+from .account_stats import AccountStatsService
+from .change_feed import ChangeFeedService
+from .backup import ARCHIVE_VERSION, BackupService
 
 logger = logging.getLogger(__name__)
 
@@ -67,19 +74,232 @@ def get_or_create_account(
     return account
 
 
-def _get_cached_account(account_cache: dict, case: Case, row: dict) -> Account:
-    """口座をキャッシュ付きで取得/作成する共通処理"""
-    acct_number = str(row.get('account_number') or row.get('account_id') or 'unknown')
-    if acct_number not in account_cache:
-        account_cache[acct_number] = get_or_create_account(
-            case=case,
-            account_number=acct_number,
-            bank_name=row.get('bank_name'),
-            branch_name=row.get('branch_name'),
-            account_type=row.get('account_type'),
-            holder=row.get('holder'),
-        )
-    return account_cache[acct_number]
+class AccountResolver:
+    """案件の口座をまとめて解決する
+
+    既存口座を1クエリでロードし、不足口座は bulk_create、空欄メタデータの
+    補完や通帳有無一覧表データの復元は bulk_update で一括反映する。
+    インポート・JSON復元で口座ごとの SELECT/INSERT/UPDATE を発行しないための層。
+    """
+
+    METADATA_FIELDS = ('bank_name', 'branch_name', 'account_type', 'holder')
+
+    def __init__(self, case: Case):
+        self.case = case
+        self._accounts = {acc.account_number: acc for acc in case.accounts.all()}
+        self._dirty_fields: dict[str, set[str]] = {}
+
+    @staticmethod
+    def account_number_of(row) -> str:
+        """行データから口座番号を取り出す（未指定は 'unknown'）"""
+        return str(row.get('account_number') or row.get('account_id') or 'unknown')
+
+    @staticmethod
+    def _clean_metadata(row) -> dict:
+        """行データから口座メタデータを抽出（None/NaN/空文字は除外）"""
+        metadata = {}
+        for field in AccountResolver.METADATA_FIELDS:
+            value = row.get(field)
+            if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+                continue
+            metadata[field] = value
+        return metadata
+
+    def _mark_dirty(self, account: Account, field: str):
+        self._dirty_fields.setdefault(account.account_number, set()).add(field)
+
+    def _backfill(self, account: Account, metadata: dict):
+        """既存口座の空フィールドのみ補完する"""
+        for field, value in metadata.items():
+            if not getattr(account, field):
+                setattr(account, field, value)
+                self._mark_dirty(account, field)
+
+    def prepare(self, rows) -> None:
+        """行データに含まれる口座を一括で用意する
+
+        未登録の口座は最初に現れた行のメタデータで bulk_create し、
+        既存口座は空フィールドのみ後続行のメタデータで補完する。
+        """
+        pending: dict[str, Account] = {}
+        for row in rows:
+            number = self.account_number_of(row)
+            metadata = self._clean_metadata(row)
+            account = self._accounts.get(number)
+            if account is not None:
+                self._backfill(account, metadata)
+                continue
+            new_account = pending.get(number)
+            if new_account is None:
+                pending[number] = Account(case=self.case, account_number=number, **metadata)
+            else:
+                for field, value in metadata.items():
+                    if not getattr(new_account, field):
+                        setattr(new_account, field, value)
+
+        if not pending:
+            return
+
+        # 同時インポートで先に作成された口座とは衝突を無視し、作成後に再ロードする
+        Account.objects.bulk_create(pending.values(), ignore_conflicts=True)
+        for account in self.case.accounts.filter(account_number__in=list(pending)):
+            self._accounts[account.account_number] = account
+            self._backfill(account, self._clean_metadata(
+                {field: getattr(pending[account.account_number], field)
+                 for field in self.METADATA_FIELDS}
+            ))
+
+    def resolve(self, row) -> Account:
+        """行データに対応する口座を返す（prepare 未登録の口座はその場で作成）"""
+        number = self.account_number_of(row)
+        if number not in self._accounts:
+            self.prepare([row])
+        return self._accounts[number]
+
+    def apply_inventory(self, inventory: dict[str, dict]) -> int:
+        """通帳有無一覧表データ（JSON v1.1 の accounts）を口座に反映する"""
+        applied = 0
+        for number, acc_data in inventory.items():
+            account = self._accounts.get(number)
+            if account is None:
+                continue
+            values = {'has_accrued_interest': acc_data.get('has_accrued_interest', False)}
+            for field in ('passbook_balance', 'certificate_balance', 'print_order'):
+                if acc_data.get(field) is not None:
+                    values[field] = acc_data[field]
+            for field in ('passbook_years', 'inventory_remarks'):
+                if acc_data.get(field):
+                    values[field] = acc_data[field]
+            for field, value in values.items():
+                if getattr(account, field) != value:
+                    setattr(account, field, value)
+                    self._mark_dirty(account, field)
+            applied += 1
+        return applied
+
+    def flush(self) -> int:
+        """補完・復元で変更された口座を bulk_update で保存し、更新口座数を返す"""
+        if not self._dirty_fields:
+            return 0
+        fields = sorted(set().union(*self._dirty_fields.values()))
+        accounts = [self._accounts[number] for number in self._dirty_fields]
+        Account.objects.bulk_update(accounts, fields, batch_size=500)
+        self._dirty_fields.clear()
+        return len(accounts)
+
+
+# バックアップで復元に対応するバージョン（2.0 は列指向バックアップ）
+SUPPORTED_BACKUP_VERSIONS = ('1.0', '1.1', ARCHIVE_VERSION)
+
+# JSON復元時に1回で登録する取引数
+JSON_IMPORT_BATCH_SIZE = 5000
+
+
+def _validate_backup_version(version) -> None:
+    if version not in SUPPORTED_BACKUP_VERSIONS:
+        raise ValueError(f"未対応のバージョン: {version}")
+
+
+def _create_restored_case(original_name: str, max_retries: int = 100) -> Case:
+    """復元用の案件を作成する（重複名は「_復元N」を付けてリトライ）"""
+    case_name = original_name
+    for counter in range(1, max_retries + 1):
+        try:
+            with db_transaction.atomic():
+                return Case.objects.create(name=case_name)
+        except IntegrityError:
+            case_name = f"{original_name}_復元{counter}"
+    raise ValueError("案件名の生成に失敗しました。別の名前でインポートしてください。")
+
+
+class _BackupRestorer:
+    """JSONバックアップの取引をバッチ単位で案件に登録する"""
+
+    def __init__(self, header: dict):
+        case_data = header.get('case') or {}
+        self.case = _create_restored_case(case_data.get('name', 'インポート案件'))
+        self.count = 0
+
+        # 基準日の復元
+        ref_date = case_data.get('reference_date')
+        if ref_date:
+            self.case.reference_date = parse_date_value(ref_date)
+            self.case.save(update_fields=['reference_date'])
+
+        # 口座情報 (v1.1) は最初のバッチと合わせて一括解決する
+        self.inventory = self._inventory_of(header)
+        self._inventory_prepared = False
+        self.resolver = AccountResolver(self.case)
+
+    @staticmethod
+    def _inventory_of(header: dict) -> dict[str, dict]:
+        return {
+            acc_data.get('account_number', 'unknown'): acc_data
+            for acc_data in header.get('accounts', [])
+        }
+
+    def _prepare(self, rows) -> None:
+        if not self._inventory_prepared:
+            # 口座は一覧表データ → 取引の順で一括解決する
+            rows = chain(self.inventory.values(), rows)
+            self._inventory_prepared = True
+        self.resolver.prepare(rows)
+
+    def add_transactions(self, transactions: Iterable[dict], batch_size: int = JSON_IMPORT_BATCH_SIZE) -> None:
+        for batch in batched(transactions, batch_size):
+            self._prepare(batch)
+            Transaction.objects.bulk_create([
+                Transaction(
+                    case=self.case,
+                    account=self.resolver.resolve(tx_data),
+                    date=parse_date_value(tx_data.get('date')),
+                    description=tx_data.get('description'),
+                    amount_out=tx_data.get('amount_out', 0),
+                    amount_in=tx_data.get('amount_in', 0),
+                    balance=tx_data.get('balance'),
+                    is_large=tx_data.get('is_large', False),
+                    is_transfer=tx_data.get('is_transfer', False),
+                    transfer_to=tx_data.get('transfer_to'),
+                    category=tx_data.get('category', UNCATEGORIZED),
+                    is_flagged=tx_data.get('is_flagged', False),
+                    memo=tx_data.get('memo'),
+                    match_scope=tx_data.get('match_scope') or '',
+                    match_keyword=tx_data.get('match_keyword') or '',
+                )
+                for tx_data in batch
+            ])
+            self.count += len(batch)
+
+    def add_columns(self, columns: dict[str, list]) -> None:
+        """列指向バックアップの1バッチ（列名→値リスト）をモデルを生成せずに一括登録する"""
+        numbers = columns['account_number']
+        unique_numbers = set(numbers)
+        self._prepare({'account_number': number} for number in unique_numbers)
+        account_ids = {
+            number: self.resolver.resolve({'account_number': number}).pk
+            for number in unique_numbers
+        }
+        columns = {name: values for name, values in columns.items() if name != 'account_number'}
+        self.count += Transaction.objects.insert_columns({
+            **columns,
+            'case_id': [self.case.pk] * len(numbers),
+            'account_id': [account_ids[number] for number in numbers],
+            'category': [category or UNCATEGORIZED for category in columns['category']],
+            **{
+                name: [value or '' for value in columns[name]]
+                for name in ('match_scope', 'match_keyword') if name in columns
+            },
+        })
+
+    def finish(self, header: dict) -> None:
+        """口座の通帳有無一覧表データを復元する（取引より後に accounts がある場合も対応）"""
+        self.inventory.update(self._inventory_of(header))
+        self.resolver.prepare(self.inventory.values())
+        if self.inventory:
+            self.resolver.apply_inventory(self.inventory)
+            logger.info(f"口座情報を復元: {len(self.inventory)}件")
+        self.resolver.flush()
+        AccountStatsService.refresh(self.case)
 
 
 class TransactionService:
@@ -94,6 +314,8 @@ class TransactionService:
     _STRIP_FIELDS = ('memo',)
     # 口座フィールド（Account モデルに委譲）
     _ACCOUNT_FIELDS = ('bank_name', 'branch_name', 'account_number', 'account_type')
+    # update_transactionで変更フィードに記録する取引の項目
+    _EDIT_FEED_FIELDS = ('date', 'description', 'amount_out', 'amount_in', 'balance', 'memo')
 
     # =========================================================================
     # 分類関連
@@ -116,8 +338,10 @@ class TransactionService:
             category_updates = {tx.id: tx.category for tx in updates}
             count, _ = ClassificationHistoryService.apply_changes(
                 case, category_updates, source="auto_classifier",
+                matches=match_provenance(updates),
             )
             Transaction.objects.bulk_update(updates, ['classification_score'])
+            AISuggestionService.refresh(case)
             logger.info(f"自動分類完了: case_id={case.id}, count={count}")
             return count
 
@@ -141,7 +365,9 @@ class TransactionService:
                 case,
                 {tx.id: tx.category for tx in updates},
                 source="classification_rule",
+                matches=match_provenance(updates),
             )
+            AISuggestionService.refresh(case)
             logger.info(f"ルール適用完了: case_id={case.id}, count={count}")
             return count
 
@@ -219,21 +445,24 @@ class TransactionService:
         )
 
         updates = []
+        matches = {}
         for tx in txs:
             if not tx.description:
                 continue
 
-            category, _, _ = match_with_priority(tx.description, case_patterns, patterns)
+            category, keyword, match_type = match_with_priority(tx.description, case_patterns, patterns)
 
             if category:
                 tx.category = category
                 updates.append(tx)
+                matches[tx.id] = (match_scope_of(match_type), keyword)
 
         if updates:
             count, _ = ClassificationHistoryService.apply_changes(
                 case,
                 {tx.id: tx.category for tx in updates},
                 source="classification_preview",
+                matches=matches,
             )
             logger.info(f"選択分類適用: case_id={case.id}, count={count}")
             return count
@@ -295,6 +524,7 @@ class TransactionService:
                 case,
                 {tx.id: tx.category for tx in updates},
                 source="ai_bulk",
+                matches=match_provenance(updates),
             )
             Transaction.objects.bulk_update(updates, ['classification_score'])
             logger.info(f"AI提案一括適用: case_id={case.id}, min_score={min_score}, count={count}")
@@ -381,6 +611,7 @@ class TransactionService:
         return (count, change_group) if return_change_group else count
 
     @staticmethod
+    @db_transaction.atomic
     def update_transaction(case: Case, tx_id: int, data: dict) -> bool:
         """
         取引データを更新
@@ -399,6 +630,7 @@ class TransactionService:
 
         new_category = data.get('category')
         category_changed = new_category is not None and new_category != tx.category
+        old_description = tx.description
 
         date_str = data.get('date')
         if date_str:
@@ -429,14 +661,14 @@ class TransactionService:
             if value is not None:
                 account_data[field] = value.strip() if value else None
 
+        account_changed = []
         if account_data and tx.account:
             account = tx.account
-            changed = False
             for field, value in account_data.items():
                 if getattr(account, field) != value:
                     setattr(account, field, value)
-                    changed = True
-            if changed:
+                    account_changed.append(field)
+            if account_changed:
                 account.save()
 
         tx.save()
@@ -444,10 +676,20 @@ class TransactionService:
             ClassificationHistoryService.apply_changes(
                 case, {tx_id: new_category}, source="transaction_edit",
             )
+        ChangeFeedService.record(case, [tx.id], TransactionService._EDIT_FEED_FIELDS)
+        AccountStatsService.refresh(case, [tx.account_id])
+        if tx.description != old_description:
+            AISuggestionService.refresh(case)
+        if account_changed:
+            # 口座情報は同じ口座の全取引の表示に影響する
+            ChangeFeedService.record(
+                case, tx.account.transactions.values_list('id', flat=True), account_changed,
+            )
         logger.info(f"取引更新: case_id={case.id}, tx_id={tx_id}")
         return True
 
     @staticmethod
+    @db_transaction.atomic
     def toggle_flag(case: Case, tx_id: int) -> Optional[bool]:
         """
         取引の要確認フラグをトグル
@@ -465,10 +707,15 @@ class TransactionService:
 
         tx.is_flagged = not tx.is_flagged
         tx.save(update_fields=['is_flagged'])
+        ChangeFeedService.record(case, [tx.id], ['is_flagged'])
+        if not tx.is_flagged and tx.category == UNCATEGORIZED:
+            # 要確認を外した未分類取引はAI分類候補の対象に戻る
+            AISuggestionService.refresh(case)
         logger.info(f"フラグ更新: case_id={case.id}, tx_id={tx_id}, flagged={tx.is_flagged}")
         return tx.is_flagged
 
     @staticmethod
+    @db_transaction.atomic
     def update_memo(case: Case, tx_id: int, memo: str) -> bool:
         """
         取引のメモを更新
@@ -487,6 +734,7 @@ class TransactionService:
 
         tx.memo = memo.strip() if memo else None
         tx.save(update_fields=['memo'])
+        ChangeFeedService.record(case, [tx.id], ['memo'])
         logger.info(f"メモ更新: case_id={case.id}, tx_id={tx_id}")
         return True
 
@@ -495,6 +743,7 @@ class TransactionService:
     # =========================================================================
 
     @staticmethod
+    @db_transaction.atomic
     def delete_account_transactions(case: Case, account_number: str) -> int:
         """
         指定口座の取引を削除
@@ -509,7 +758,9 @@ class TransactionService:
         account = case.accounts.filter(account_number=account_number).first()
         if not account:
             return 0
+        tx_ids = list(account.transactions.values_list('id', flat=True))
         count, _ = account.transactions.all().delete()
+        ChangeFeedService.record(case, tx_ids, [], op=TransactionChange.OP_DELETE)
         # 取引がなくなった口座も削除
         if not account.transactions.exists():
             account.delete()
@@ -517,6 +768,7 @@ class TransactionService:
         return count
 
     @staticmethod
+    @db_transaction.atomic
     def delete_duplicates(case: Case, delete_ids: list[str]) -> int:
         """
         重複取引を削除
@@ -536,7 +788,12 @@ class TransactionService:
             logger.warning(f"不正な取引ID: {delete_ids}")
             return 0
 
-        count, _ = case.transactions.filter(id__in=int_ids).delete()
+        queryset = case.transactions.filter(id__in=int_ids)
+        tx_ids = list(queryset.values_list('id', flat=True))
+        account_ids = AccountStatsService.account_ids_of(queryset)
+        count, _ = queryset.delete()
+        ChangeFeedService.record(case, tx_ids, [], op=TransactionChange.OP_DELETE)
+        AccountStatsService.refresh(case, account_ids)
         logger.info(f"重複データ削除: case_id={case.id}, count={count}")
         return count
 
@@ -577,6 +834,8 @@ class TransactionService:
                 transaction_data=rows,
             )
             count, _ = queryset.delete()
+            ChangeFeedService.record(case, [row["id"] for row in rows], [], op=TransactionChange.OP_DELETE)
+            AccountStatsService.refresh(case, {row["account_id"] for row in rows})
         logger.info(f"ID範囲削除: case_id={case.id}, start_id={start_id}, end_id={end_id}, count={count}")
         return count
 
@@ -624,6 +883,11 @@ class TransactionService:
         with db_transaction.atomic():
             if restore_rows:
                 Transaction.objects.bulk_create(restore_rows, batch_size=500)
+                ChangeFeedService.record(
+                    case, [tx.id for tx in restore_rows], [], op=TransactionChange.OP_CREATE,
+                )
+                AccountStatsService.refresh(case, {tx.account_id for tx in restore_rows})
+                AISuggestionService.refresh(case)
             backup.restored_at = timezone.now()
             backup.save(update_fields=["restored_at"])
 
@@ -635,6 +899,7 @@ class TransactionService:
         return len(restore_rows), skipped
 
     @staticmethod
+    @db_transaction.atomic
     def delete_unclassified_transactions(case: Case, tx_ids: list[str]) -> tuple[int, list[int]]:
         """
         未分類取引だけを削除
@@ -662,7 +927,11 @@ class TransactionService:
         if not delete_ids:
             return 0, []
 
-        count, _ = case.transactions.filter(id__in=delete_ids, category=UNCATEGORIZED).delete()
+        queryset = case.transactions.filter(id__in=delete_ids, category=UNCATEGORIZED)
+        account_ids = AccountStatsService.account_ids_of(queryset)
+        count, _ = queryset.delete()
+        ChangeFeedService.record(case, delete_ids, [], op=TransactionChange.OP_DELETE)
+        AccountStatsService.refresh(case, account_ids)
         logger.info(f"未分類取引削除: case_id={case.id}, count={count}")
         return count, delete_ids
 
@@ -697,10 +966,15 @@ class TransactionService:
             return 0
 
         if field_name == 'description':
-            count = case.transactions.filter(description=old_value).update(
-                description=new_value,
-                description_search=normalize_text(new_value),
-            )
+            queryset = case.transactions.filter(description=old_value)
+            with db_transaction.atomic():
+                tx_ids = list(queryset.values_list('id', flat=True))
+                count = queryset.update(
+                    description=new_value,
+                    description_search=normalize_text(new_value),
+                )
+                ChangeFeedService.record(case, tx_ids, ['description'])
+                AISuggestionService.refresh(case)
         elif field_name == 'account_number':
             with db_transaction.atomic():
                 source = (
@@ -749,14 +1023,20 @@ class TransactionService:
 
                     source.transactions.update(account=target)
                     source.delete()
+                    ChangeFeedService.record_reset(case)
+                    AccountStatsService.refresh(case, [target.pk])
                     count = 1
                 else:
                     source.account_number = new_value
                     source.save(update_fields=['account_number'])
+                    ChangeFeedService.record_reset(case)
                     count = 1
         else:
             filter_kwargs = {field_name: old_value}
-            count = case.accounts.filter(**filter_kwargs).update(**{field_name: new_value})
+            with db_transaction.atomic():
+                count = case.accounts.filter(**filter_kwargs).update(**{field_name: new_value})
+                if count:
+                    ChangeFeedService.record_reset(case)
 
         logger.info(
             f"一括置換完了: case_id={case.id}, field={field_name}, "
@@ -812,96 +1092,114 @@ class TransactionService:
         Raises:
             ValueError: バージョン不正・案件名生成失敗時
         """
-        version = data.get('version', '1.0')
-        if version not in ('1.0', '1.1'):
-            raise ValueError(f"未対応のバージョン: {version}")
-
-        case_data = data.get('case', {})
-        original_name = case_data.get('name', 'インポート案件')
-
-        # 案件作成（重複名はリトライ）
-        case_name = original_name
-        counter = 0
-        max_retries = 100
-        new_case = None
-        while new_case is None and counter < max_retries:
-            try:
-                with db_transaction.atomic():
-                    new_case = Case.objects.create(name=case_name)
-            except IntegrityError:
-                counter += 1
-                case_name = f"{original_name}_復元{counter}"
-
-        if new_case is None:
-            raise ValueError("案件名の生成に失敗しました。別の名前でインポートしてください。")
+        return TransactionService._restore_backup(data.items(), restore_settings)
 
-        with db_transaction.atomic():
-            # 基準日の復元
-            ref_date = case_data.get('reference_date')
-            if ref_date:
-                new_case.reference_date = parse_date_value(ref_date)
-                new_case.save(update_fields=['reference_date'])
-
-            # 口座情報の復元 (v1.1)
-            account_inventory = {}
-            for acc_data in data.get('accounts', []):
-                acct_number = acc_data.get('account_number', 'unknown')
-                account_inventory[acct_number] = acc_data
-
-            transactions_data = data.get('transactions', [])
-            new_transactions = []
-            account_cache = {}
+    @staticmethod
+    def import_from_json_file(
+        fp: BinaryIO,
+        restore_settings: bool = False,
+        batch_size: int = JSON_IMPORT_BATCH_SIZE,
+    ) -> tuple[Case, int]:
+        """
+        JSONバックアップファイルを逐次読み込みして案件と取引を復元
 
-            for tx_data in transactions_data:
-                date_val = parse_date_value(tx_data.get('date'))
-                account = _get_cached_account(account_cache, new_case, tx_data)
+        ファイル全体をメモリに展開せず、transactions 配列は
+        JSON_IMPORT_BATCH_SIZE 件ずつ読み込んで登録する。
 
-                new_transactions.append(Transaction(
-                    case=new_case,
-                    account=account,
-                    date=date_val,
-                    description=tx_data.get('description'),
-                    amount_out=tx_data.get('amount_out', 0),
-                    amount_in=tx_data.get('amount_in', 0),
-                    balance=tx_data.get('balance'),
-                    is_large=tx_data.get('is_large', False),
-                    is_transfer=tx_data.get('is_transfer', False),
-                    transfer_to=tx_data.get('transfer_to'),
-                    category=tx_data.get('category', UNCATEGORIZED),
-                    is_flagged=tx_data.get('is_flagged', False),
-                    memo=tx_data.get('memo'),
-                ))
+        Args:
+            fp: バイナリモードのファイルオブジェクト（アップロードファイル等）
+            restore_settings: 設定も復元するか
+            batch_size: 1回で登録する取引数
+
+        Returns:
+            (作成された案件, インポートされた取引数) のタプル
+
+        Raises:
+            ValueError: バージョン不正・案件名生成失敗・JSON不正時
+        """
+        entries = json_stream.iter_object_items(fp, stream_keys=('transactions',))
+        return TransactionService._restore_backup(entries, restore_settings, batch_size)
+
+    @staticmethod
+    def import_from_archive(
+        fp: BinaryIO,
+        restore_settings: bool = False,
+        batch_size: int = JSON_IMPORT_BATCH_SIZE,
+    ) -> tuple[Case, int]:
+        """
+        列指向バックアップ（zip）から案件と取引を復元
+
+        transactions.parquet を batch_size 件ずつ列単位で読み込み、一括登録する。
+
+        Args:
+            fp: シーク可能なバイナリモードのファイルオブジェクト
+            restore_settings: 設定も復元するか
+            batch_size: 1回で登録する取引数
+
+        Returns:
+            (作成された案件, インポートされた取引数) のタプル
+
+        Raises:
+            ValueError: バージョン不正・案件名生成失敗・zip不正時
+        """
+        entries = BackupService.iter_archive(fp, batch_size)
+        return TransactionService._restore_backup(entries, restore_settings, batch_size)
+
+    @staticmethod
+    def _restore_backup(
+        entries: Iterable[tuple[str, Any]],
+        restore_settings: bool,
+        batch_size: int = JSON_IMPORT_BATCH_SIZE,
+    ) -> tuple[Case, int]:
+        """
+        (キー, 値) の列からバックアップを復元する
 
-            if new_transactions:
-                Transaction.objects.bulk_create(new_transactions)
-
-            # 口座の通帳有無一覧表データを復元
-            if account_inventory:
-                for acct_number, acc_data in account_inventory.items():
-                    try:
-                        account = Account.objects.get(case=new_case, account_number=acct_number)
-                    except Account.DoesNotExist:
-                        continue
-                    if acc_data.get('passbook_balance') is not None:
-                        account.passbook_balance = acc_data['passbook_balance']
-                    if acc_data.get('certificate_balance') is not None:
-                        account.certificate_balance = acc_data['certificate_balance']
-                    account.has_accrued_interest = acc_data.get('has_accrued_interest', False)
-                    if acc_data.get('passbook_years'):
-                        account.passbook_years = acc_data['passbook_years']
-                    if acc_data.get('inventory_remarks'):
-                        account.inventory_remarks = acc_data['inventory_remarks']
-                    if acc_data.get('print_order') is not None:
-                        account.print_order = acc_data['print_order']
-                    account.save()
-                logger.info(f"口座情報を復元: {len(account_inventory)}件")
-
-            if restore_settings and 'settings' in data:
-                config.save_user_settings(data['settings'])
+        transactions 以外のキーは保持し、transactions に到達した時点で案件を作成して
+        取引をバッチ登録する。全体を1トランザクションで実行するため、
+        途中で失敗した場合は案件ごとロールバックされる。
+        """
+        header = {}
+        restorer = None
+        pending_transactions = None
+
+        with db_transaction.atomic():
+            for key, value in entries:
+                if key == 'version':
+                    _validate_backup_version(value)
+
+                if key == 'transaction_columns':
+                    # 列指向バックアップは case.json・accounts を読み終えてから取引が来る
+                    restorer = restorer or _BackupRestorer(header)
+                    for columns in value:
+                        restorer.add_columns(columns)
+                elif key != 'transactions':
+                    header[key] = value
+                elif 'case' in header:
+                    restorer = restorer or _BackupRestorer(header)
+                    restorer.add_transactions(value, batch_size)
+                else:
+                    # エクスポートしたファイルは case が先に来る。順序が異なる場合のみ保持しておく
+                    pending_transactions = list(value)
+
+            _validate_backup_version(header.get('version', '1.0'))
+            restorer = restorer or _BackupRestorer(header)
+            if pending_transactions:
+                restorer.add_transactions(pending_transactions, batch_size)
+            restorer.finish(header)
+
+            settings_restored = restore_settings and 'settings' in header
+            if settings_restored:
+                config.save_user_settings(header['settings'])
                 logger.info("設定データを復元しました")
 
-        logger.info(f"JSONインポート完了: case_id={new_case.pk}, name={case_name}, transactions={len(new_transactions)}")
-        return new_case, len(new_transactions)
+        new_case = restorer.case
+        # 復元した案件（設定も復元した場合はパターンが変わるため全案件）のAI分類候補を計算しておく
+        if settings_restored:
+            AISuggestionService.refresh_cases()
+        else:
+            AISuggestionService.refresh(new_case)
+        logger.info(f"JSONインポート完了: case_id={new_case.pk}, name={new_case.name}, transactions={restorer.count}")
+        return new_case, restorer.count
 
     @staticmethod
     def commit_import(case: Case, rows: list[dict]) -> int:
@@ -929,12 +1227,15 @@ class TransactionService:
         df = analyzer.analyze_large_amounts(df)
 
         with db_transaction.atomic():
-            account_cache = {}
+            resolver = AccountResolver(case)
+            resolver.prepare(df.to_dict('records'))
+            resolver.flush()
             new_transactions = []
 
             for _, row in df.iterrows():
                 dt = parse_date_value(row['date'])
-                account = _get_cached_account(account_cache, case, row)
+                account = resolver.resolve(row)
+                match_keyword = row.get('match_keyword') or ''
 
                 new_transactions.append(Transaction(
                     case=case,
@@ -946,6 +1247,8 @@ class TransactionService:
                     balance=row.get('balance', 0) if pd.notna(row.get('balance')) else None,
                     is_large=row.get('is_large', False),
                     category=row.get('category') if pd.notna(row.get('category')) else UNCATEGORIZED,
+                    match_scope=(row.get('match_scope') or '') if match_keyword else '',
+                    match_keyword=match_keyword,
                 ))
 
             Transaction.objects.bulk_create(new_transactions)
@@ -964,6 +1267,11 @@ class TransactionService:
                         ))
                 if updates:
                     Transaction.objects.bulk_update(updates, ['is_transfer', 'transfer_to'])
+            ChangeFeedService.record_reset(case)
+            AccountStatsService.refresh(case, {tx.account_id for tx in new_transactions})
+
+        # 新しい摘要のAI分類候補を計算しておく
+        AISuggestionService.refresh(case)
 
         logger.info(f"取引インポート確定: case_id={case.id}, count={len(new_transactions)}")
         return len(new_transactions)
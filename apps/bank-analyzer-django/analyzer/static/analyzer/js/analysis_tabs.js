@@ -298,10 +298,14 @@ const AISuggestions = {
         const slider = document.getElementById('fuzzyThresholdSlider');
         if (!slider) return;
         const threshold = slider.value;
-        const currentUrl = new URL(window.location.href);
-        currentUrl.searchParams.set('fuzzy_threshold', threshold);
-        currentUrl.searchParams.set('regenerate_ai', 'true');
-        window.location.href = currentUrl.toString();
+        // 再生成はデータを書き換えるためPOSTで行い、完了後に閾値付きで表示し直す
+        postAction('regenerate_ai_suggestions', { fuzzy_threshold: threshold }, {
+            onSuccess: () => {
+                const currentUrl = new URL(window.location.href);
+                currentUrl.searchParams.set('fuzzy_threshold', threshold);
+                window.location.href = currentUrl.toString();
+            },
+        });
     },
 
     apply: function(txId, category) {
@@ -916,3 +916,37 @@ if (replaceFieldSelect) {
         });
     });
 }
+
+// ===== 他の画面での変更を表示中の行に反映 =====
+
+const CHANGE_POLL_INTERVAL = 30000;
+let caseRevision = window.CASE_REVISION;
+
+function pollCaseChanges() {
+    if (document.hidden || caseRevision == null) return;
+    fetch(getApiUrl('changes') + '?since=' + caseRevision)
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (!data.success) return;
+            if (data.reload) {
+                showToast('他の画面でデータが更新されました。再読み込みすると最新の内容を表示します。', 'info');
+            } else {
+                data.changes.forEach(function(change) {
+                    document.querySelectorAll('tr[data-tx-id="' + change.id + '"]').forEach(function(row) {
+                        if (change.op === 'delete') {
+                            fadeOutRow(row, function() { updateSelectionUI(); });
+                            return;
+                        }
+                        _updateRowCells(row, change.row);
+                        _updateEditButtonData(row, change.row);
+                        if (change.fields.indexOf('is_flagged') !== -1) {
+                            row.classList.toggle('table-warning', !!change.row.is_flagged);
+                        }
+                    });
+                });
+            }
+            caseRevision = data.revision;
+        })
+        .catch(function() {});
+}
+setInterval(pollCaseChanges, CHANGE_POLL_INTERVAL);
@@ -431,13 +431,19 @@ function promptAndRegisterPattern(opts) {
                 return;
             }
 
-            postAction('preview_pattern_impact', { keyword: keyword }, {
+            postAction('preview_pattern_impact', { keyword: keyword, category: category, scope: scope }, {
                 onSuccess: function(impact) {
                     var impactMessage =
                         'キーワード「' + keyword + '」を全案件に登録します。' +
                         '\n現在の案件: ' + impact.current_case_count + '件' +
-                        '\nその他の案件: ' + impact.other_cases_count + '件' +
-                        '\n今後の取込みにも適用されます。';
+                        '\nその他の案件: ' + impact.other_cases_count + '件';
+                    if (impact.changes && impact.changes.length) {
+                        impactMessage += '\n\n現在の案件で規則による分類が変わる取引:';
+                        impact.changes.forEach(function(change) {
+                            impactMessage += '\n・' + change.from + ' → ' + change.to + ': ' + change.count + '件';
+                        });
+                    }
+                    impactMessage += '\n今後の取込みにも適用されます。';
                     ConfirmModal.show({
                         title: '全案件への影響を確認',
                         message: impactMessage,
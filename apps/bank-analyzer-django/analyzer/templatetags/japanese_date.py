@@ -3,28 +3,11 @@ from datetime import date, datetime
 from django import template
 
 from analyzer.lib.constants import ERAS
+from analyzer.lib.wareki import format_wareki, get_japanese_era
 
 register = template.Library()
 
 
-def get_japanese_era(d: date) -> tuple[str, int]:
-    """
-    日付から元号と年を取得
-
-    Args:
-        d: 日付
-
-    Returns:
-        (元号名, 和暦年) のタプル
-    """
-    for era_start, era_name, _ in ERAS:
-        if d >= era_start:
-            year = d.year - era_start.year + 1
-            return era_name, year
-    # 明治以前は西暦を返す
-    return "", d.year
-
-
 @register.filter(name='wareki')
 def wareki(value, format_type='full'):
     """
@@ -40,7 +23,7 @@ def wareki(value, format_type='full'):
         format_type: 'full'（デフォルト）, 'short', 'year'
 
     Returns:
-        和暦文字列
+        和暦文字列（変換結果は日付・書式ごとにキャッシュされる）
     """
     if value is None:
         return "-"
@@ -59,31 +42,7 @@ def wareki(value, format_type='full'):
     if not isinstance(value, date):
         return str(value)
 
-    era_name, era_year = get_japanese_era(value)
-
-    if not era_name:
-        # 明治以前
-        if format_type == 'short':
-            return f"{value.year}.{value.month}.{value.day}"
-        elif format_type == 'year':
-            return f"{value.year}年"
-        return f"{value.year}年{value.month}月{value.day}日"
-
-    # 元年表記
-    year_str = "元" if era_year == 1 else str(era_year)
-
-    if format_type == 'short':
-        # 略称形式: R6.1.26
-        for era_start, _, era_abbr in ERAS:
-            if value >= era_start:
-                return f"{era_abbr}{era_year}.{value.month}.{value.day}"
-
-    elif format_type == 'year':
-        # 年のみ: 令和6年
-        return f"{era_name}{year_str}年"
-
-    # フル形式: 令和6年1月26日
-    return f"{era_name}{year_str}年{value.month}月{value.day}日"
+    return format_wareki(value, format_type)
 
 
 @register.filter(name='wareki_short')
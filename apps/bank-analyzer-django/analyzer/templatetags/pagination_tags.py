@@ -38,15 +38,21 @@ def _build_filter_params(filter_state: dict) -> list[tuple]:
 
 
 @register.simple_tag
-def pagination_url(tab, page, filter_state):
+def pagination_url(tab, page, filter_state, page_param='page'):
     """フィルター状態を保持したページネーションURLを生成
 
+    page にはキーセット方式のページトークン（KeysetPage.next_token 等）を渡す。
+    空文字の場合はページ指定なし（先頭ページ）のURLになる。
+
     使用例:
         {% load pagination_tags %}
-        {% pagination_url "all" 1 filter_state as url %}
-        <a href="{{ url }}">最初</a>
+        {% pagination_url "all" all_txs.next_token filter_state as url %}
+        <a href="{{ url }}">次へ</a>
     """
-    params = [('tab', tab), ('page', page)] + _build_filter_params(filter_state)
+    params = [('tab', tab)]
+    if page:
+        params.append((page_param, page))
+    params += _build_filter_params(filter_state)
     return '?' + urlencode(params)
 
 
@@ -4,19 +4,32 @@
 モデル、フォーム、サービス、テンプレートタグのテストを含む。
 """
 import json
+import tempfile
 
 from datetime import date, datetime
-from io import BytesIO
+from io import BytesIO, StringIO
+from pathlib import Path
 
-from django.test import TestCase, Client, override_settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse, set_script_prefix
 from django.core.files.uploadedfile import SimpleUploadedFile
 from openpyxl import load_workbook
 
-from .models import Account, Case, ClassificationChange, DeletionBackup, Transaction
+from .models import (
+    AISuggestion, Account, Case, ClassificationChange, DeletionBackup, PatternKeyword, SettingsVersion,
+    Transaction, TransactionChange, UserSetting,
+)
 from .forms import CaseForm, SettingsForm
 from .services import (
+    AccountStatsService,
+    AISuggestionService,
+    ChangeFeedService,
     ClassificationHistoryService,
+    KeywordImpactService,
+    LearnedClassifierService,
+    ReclassificationService,
     TransactionService,
     AnalysisService,
     parse_int_ids,
@@ -24,11 +37,21 @@ from .services import (
 from .templatetags.japanese_date import wareki, wareki_short, wareki_month_short, wareki_year, get_japanese_era
 from .handlers import parse_amount
 from .views import sanitize_filename
+from .lib import config, learned_classifier, sqlite_fts
 from .lib.importer import _convert_japanese_date
+from .lib.text_utils import filter_by_keyword
 from .lib.llm_classifier import classify_by_rules
 from .lib.constants import normalize_patterns
 
 
+def use_temp_export_cache(testcase):
+    """エクスポート成果物のキャッシュ先をテストごとの一時ディレクトリにする"""
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    testcase.enterContext(override_settings(EXPORT_CACHE_DIR=tmp.name))
+    return Path(tmp.name)
+
+
 class CaseModelTest(TestCase):
     """Caseモデルのテスト"""
 
@@ -422,6 +445,279 @@ class TransactionServiceTest(TestCase):
         self.assertEqual(values, [{"value": self.tx1.description, "count": 2}])
 
 
+class JsonRestoreTest(TestCase):
+    """JSONバックアップ復元のテスト"""
+
+    def _backup(self, name, tx_count):
+        return {
+            "version": "1.1",
+            "case": {"name": name, "reference_date": "2024-03-01"},
+            "accounts": [
+                {
+                    "account_number": "111", "bank_name": "A銀行",
+                    "passbook_balance": 5000, "has_accrued_interest": True,
+                    "passbook_years": {"2024": True}, "print_order": 2,
+                },
+                {
+                    "account_number": "999", "bank_name": "証明書のみ銀行",
+                    "certificate_balance": 12000, "print_order": 1,
+                },
+            ],
+            "transactions": [
+                {
+                    "date": "2024-01-%02d" % (i % 28 + 1),
+                    "account_number": ["111", "222", "333"][i % 3],
+                    "bank_name": None if i == 0 else "A銀行",
+                    "holder": "山田" if i % 3 == 1 else None,
+                    "description": f"取引{i}",
+                    "amount_out": 100,
+                }
+                for i in range(tx_count)
+            ],
+        }
+
+    def test_restore_resolves_accounts_in_constant_queries(self):
+        """口座数・取引数に比例したクエリを発行しない（AI分類候補の計算を含む）"""
+        # 設定のスナップショットと派生値（AI分類候補のパターン版）を読み込んでおく
+        TransactionService.import_from_json(self._backup("準備案件", 3))
+        with self.assertNumQueries(27):
+            case, count = TransactionService.import_from_json(self._backup("復元案件", 30))
+        self.assertEqual(count, 30)
+
+        with self.assertNumQueries(27):
+            TransactionService.import_from_json(self._backup("大規模案件", 90))
+
+        accounts = {acc.account_number: acc for acc in case.accounts.all()}
+        self.assertEqual(set(accounts), {"111", "222", "333", "999"})
+        self.assertEqual(accounts["111"].bank_name, "A銀行")
+        self.assertEqual(accounts["222"].holder, "山田")
+        self.assertEqual(accounts["111"].passbook_balance, 5000)
+        self.assertTrue(accounts["111"].has_accrued_interest)
+        self.assertEqual(accounts["111"].passbook_years, {"2024": True})
+        self.assertEqual(accounts["999"].certificate_balance, 12000)
+        self.assertEqual(accounts["999"].print_order, 1)
+        self.assertEqual(case.transactions.filter(account=accounts["111"]).count(), 10)
+
+    def test_resolver_backfills_existing_account_metadata(self):
+        """既存口座は空欄のみ補完し、入力済みの値は上書きしない"""
+        from .services.transaction import AccountResolver
+
+        case = Case.objects.create(name="既存口座案件")
+        Account.objects.create(case=case, account_number="111", bank_name="既存銀行")
+        resolver = AccountResolver(case)
+        resolver.prepare([
+            {"account_number": "111", "bank_name": "別銀行", "branch_name": "本店"},
+            {"account_number": "222", "bank_name": "新銀行"},
+        ])
+        self.assertEqual(resolver.flush(), 1)
+
+        existing = case.accounts.get(account_number="111")
+        self.assertEqual(existing.bank_name, "既存銀行")
+        self.assertEqual(existing.branch_name, "本店")
+        self.assertEqual(resolver.resolve({"account_number": "222"}).bank_name, "新銀行")
+
+    def test_stream_parser_handles_chunk_boundaries(self):
+        """チャンク境界で数値・文字列が途切れても正しく読み込める"""
+        from .lib.json_stream import iter_object_items
+
+        data = {"version": "1.1", "transactions": [{"amount_out": 1234567, "description": "振込　ﾃｽﾄ"}] * 3,
+                "settings": {"threshold": 500000}}
+        raw = ('\ufeff' + json.dumps(data, ensure_ascii=False, indent=2)).encode('utf-8')
+        items = iter_object_items(BytesIO(raw), stream_keys=('transactions',), chunk_size=3)
+
+        key, value = next(items)
+        self.assertEqual((key, value), ("version", "1.1"))
+        key, transactions = next(items)
+        self.assertEqual(next(transactions), data["transactions"][0])
+        # 途中までしか消費しなくても次のキーへ進める
+        self.assertEqual(list(items), [("settings", {"threshold": 500000})])
+
+    def test_restore_from_file_inserts_in_batches(self):
+        """ファイルからの復元は取引をバッチ単位で登録し、失敗時は案件ごとロールバックする"""
+        raw = json.dumps(self._backup("ストリーム復元", 25), indent=2).encode('utf-8')
+        with CaptureQueriesContext(connection) as ctx:
+            case, count = TransactionService.import_from_json_file(BytesIO(raw), batch_size=10)
+        self.assertEqual(count, 25)
+        inserts = [q for q in ctx.captured_queries
+                   if q['sql'].startswith(f'INSERT INTO "{Transaction._meta.db_table}"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(case.transactions.count(), 25)
+        self.assertEqual(case.accounts.get(account_number="999").certificate_balance, 12000)
+
+        broken = raw[:len(raw) // 2]
+        with self.assertRaises(ValueError):
+            TransactionService.import_from_json_file(BytesIO(broken))
+        self.assertFalse(Case.objects.filter(name__startswith="ストリーム復元_復元").exists())
+
+
+class JsonBackupExportTest(TestCase):
+    """JSONバックアップ出力のテスト"""
+
+    def setUp(self):
+        use_temp_export_cache(self)
+        self.case = Case.objects.create(name="出力案件", reference_date=date(2024, 3, 1))
+        account = Account.objects.create(
+            case=self.case, account_number="111", bank_name="A銀行", passbook_years={"2024": True},
+        )
+        Transaction.objects.bulk_create([
+            Transaction(case=self.case, account=account, date=date(2024, 1, i + 1),
+                        description=f"振込\n{i}", amount_out=100 * i, memo="メモ" if i == 0 else None)
+            for i in range(5)
+        ])
+
+    def test_streamed_json_matches_json_dumps(self):
+        """断片を連結すると json.dumps と同じ内容になり、そのまま復元できる"""
+        from .services import BackupService
+
+        for indent, kwargs in ((2, {"indent": 2}), (None, {"separators": (',', ':')})):
+            chunks = list(BackupService.iter_json(self.case, indent=indent, user_settings={}, chunk_size=2))
+            self.assertGreater(len(chunks), 3)
+            text = ''.join(chunks)
+            data = json.loads(text)
+            self.assertEqual(text, json.dumps(data, ensure_ascii=False, **kwargs))
+            self.assertEqual(len(data["transactions"]), 5)
+            self.assertEqual(data["statistics"]["total_out"], 1000)
+
+        new_case, count = TransactionService.import_from_json_file(BytesIO(text.encode('utf-8')))
+        self.assertEqual(count, 5)
+        self.assertEqual(new_case.accounts.get().passbook_years, {"2024": True})
+
+    def test_gzip_export_view_and_command(self):
+        """gzip指定時はストリーミングで .json.gz を返し、コマンドも同じ形式で書き出す"""
+        import gzip
+        from django.core.management import call_command
+
+        response = Client().get(reverse('export-json', args=[self.case.pk]), {'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertIn(".json.gz", response['Content-Disposition'])
+        data = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(data["case"]["name"], "出力案件")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command("export_case_json_backups", output_dir=tmp, gzip=True, stdout=StringIO())
+            files = sorted(Path(tmp).iterdir())
+            self.assertEqual([f.name for f in files], [f"{self.case.pk:04d}_出力案件_backup.json.gz", "manifest.json"])
+            with gzip.open(files[0], 'rt', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)["version"], "1.1")
+
+    def test_columnar_archive_round_trip(self):
+        """列指向バックアップ（zip）は画面・コマンドから出力でき、JSONと同じ内容に復元できる"""
+        import zipfile
+        from django.core.management import call_command
+        from .services import BackupService
+
+        other = Account.objects.create(case=self.case, account_number="999", certificate_balance=12000, print_order=1)
+        self.case.transactions.create(account=other, date=None, description=None, category="生活費", is_flagged=True)
+
+        response = Client().get(reverse('export-json', args=[self.case.pk]), {'format': 'parquet'})
+        self.assertIn("_backup.zip", response['Content-Disposition'])
+        raw = response.getvalue()
+        with zipfile.ZipFile(BytesIO(raw)) as zf:
+            self.assertEqual(zf.namelist(), ["case.json", "accounts.parquet", "transactions.parquet"])
+
+        upload = SimpleUploadedFile("出力案件_backup.zip", raw, content_type="application/zip")
+        response = Client().post(reverse('import-json'), {'json_file': upload})
+        restored = Case.objects.get(name="出力案件_復元1")
+        self.assertRedirects(response, reverse('analysis-dashboard', args=[restored.pk]))
+
+        def dump(case):
+            text = ''.join(BackupService.iter_json(case, user_settings={}, exported_at="-"))
+            data = json.loads(text)
+            del data["case"]["name"], data["case"]["created_at"]
+            return data
+
+        self.assertEqual(dump(restored), dump(self.case))
+        self.assertEqual(restored.transactions.get(description__isnull=True).description_search, "")
+        self.assertEqual(restored.transactions.filter(description_search="振込\n1").count(), 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = StringIO()
+            call_command("export_case_json_backups", output_dir=tmp, format="parquet", stdout=out)
+            self.assertIn("Exported 2 case archive file(s)", out.getvalue())
+            path = Path(tmp) / f"{self.case.pk:04d}_出力案件_backup.zip"
+            with open(path, 'rb') as f:
+                case, count = TransactionService.import_from_archive(f)
+            self.assertEqual(count, 6)
+
+    def test_match_provenance_survives_json_and_archive_round_trip(self):
+        """規則による分類の根拠（match_scope / match_keyword）は両形式で復元され、古いアーカイブも読める"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import zipfile
+        from .services import BackupService
+
+        self.case.transactions.filter(description="振込\n1").update(
+            category="生活費", match_scope="global", match_keyword="振込",
+        )
+
+        def provenance(case):
+            return sorted(case.transactions.values_list('description', 'match_scope', 'match_keyword'))
+
+        text = ''.join(BackupService.iter_json(self.case, user_settings={}))
+        json_case, _ = TransactionService.import_from_json_file(BytesIO(text.encode('utf-8')))
+        self.assertEqual(provenance(json_case), provenance(self.case))
+
+        raw = BytesIO()
+        BackupService.write_archive(self.case, raw, user_settings={})
+        archive_case, _ = TransactionService.import_from_archive(BytesIO(raw.getvalue()))
+        self.assertEqual(provenance(archive_case), provenance(self.case))
+
+        # 列を追加する前の v2.0 アーカイブ（match_scope / match_keyword の列なし）
+        old = BytesIO()
+        with zipfile.ZipFile(BytesIO(raw.getvalue())) as src, zipfile.ZipFile(old, 'w') as dst:
+            for name in src.namelist():
+                data = src.read(name)
+                if name == "transactions.parquet":
+                    table = pq.read_table(BytesIO(data)).drop_columns(["match_scope", "match_keyword"])
+                    buffer = pa.BufferOutputStream()
+                    pq.write_table(table, buffer)
+                    data = buffer.getvalue().to_pybytes()
+                dst.writestr(name, data)
+        old.seek(0)
+        old_case, count = TransactionService.import_from_archive(old)
+        self.assertEqual(count, 5)
+        self.assertEqual(set(old_case.transactions.values_list('match_scope', 'match_keyword')), {("", "")})
+
+    def test_incremental_backup_command_skips_unchanged_cases(self):
+        """--incremental は版数か内容ハッシュが前回のマニフェストと同じ案件を書き直さない"""
+        from django.core.management import call_command
+
+        other = Case.objects.create(name="別案件")
+        with tempfile.TemporaryDirectory() as tmp:
+            def run():
+                out = StringIO()
+                call_command("export_case_json_backups", output_dir=tmp, incremental=True, stdout=out)
+                with open(Path(tmp) / "manifest.json", encoding="utf-8") as f:
+                    return out.getvalue(), json.load(f)["cases"]
+
+            output, cases = run()
+            self.assertIn("Exported 2 case JSON file(s); 0 unchanged, 0 skipped.", output)
+            entry = cases[str(self.case.pk)]
+            self.assertEqual(entry["transactions"], 5)
+            self.assertEqual(entry["revision"], Case.objects.get(pk=self.case.pk).revision)
+            self.assertEqual(len(entry["content_hash"]), 64)
+            backup_file = Path(tmp) / entry["file"]
+            mtime = backup_file.stat().st_mtime_ns
+
+            # 内容の変わらない保存は版数だけ進む → 内容ハッシュが一致してファイルは残る
+            other.save()
+            self.case.transactions.filter(pk=self.case.transactions.first().pk).update(memo="追記")
+            output, cases = run()
+            self.assertIn("Exported 1 case JSON file(s); 1 unchanged, 0 skipped.", output)
+            self.assertNotEqual(cases[str(self.case.pk)]["content_hash"], entry["content_hash"])
+            self.assertEqual(cases[str(other.pk)]["status"], "unchanged")
+
+            output, cases = run()
+            self.assertIn("Exported 0 case JSON file(s); 0 unchanged, 2 skipped.", output)
+            mtime = backup_file.stat().st_mtime_ns
+            run()
+            self.assertEqual(backup_file.stat().st_mtime_ns, mtime)
+
+            other.delete()
+            run()
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), [entry["file"], "manifest.json"])
+
+
 class AnalysisServiceTest(TestCase):
     """AnalysisServiceのテスト"""
 
@@ -455,6 +751,666 @@ class AnalysisServiceTest(TestCase):
         self.assertEqual(patterns["証券・株式・配当"], ["配当"])
 
 
+class AISuggestionServiceTest(TestCase):
+    """AI分類候補の事前計算テスト"""
+
+    def setUp(self):
+        self.case = Case.objects.create(name="AI候補テスト", custom_patterns={"生活費": ["東京電力"]})
+        self.client = Client()
+
+    def _add(self, description, count=1, **kwargs):
+        return [
+            Transaction.objects.create(
+                case=self.case, date=date(2024, 1, i + 1), description=description,
+                amount_out=1000, category="未分類", **kwargs,
+            ).pk
+            for i in range(count)
+        ]
+
+    def test_refresh_computes_each_description_once_and_follows_patterns(self):
+        """候補は摘要ごとに1回だけ計算し、パターン変更・分類で更新される"""
+        self._add("東京電力 電気料金", count=3)
+        self._add("東京電カ")
+        self._add("謎の取引")
+        self._add("東京電力 要確認", is_flagged=True)
+
+        self.assertEqual(AISuggestionService.refresh(self.case), 3)
+        self.assertEqual(AISuggestionService.refresh(self.case), 0)
+        stored = {s.description: (s.category, s.score) for s in self.case.ai_suggestions.all()}
+        self.assertEqual(stored["東京電力 電気料金"], ("生活費", 100))
+        self.assertEqual(stored["謎の取引"], ("", 0))
+
+        # 分類されて未分類取引がなくなった摘要の候補は削除される
+        self.case.transactions.filter(description="謎の取引").update(category="生活費")
+        self.assertEqual(AISuggestionService.refresh(self.case), 0)
+        self.assertFalse(self.case.ai_suggestions.filter(description="謎の取引").exists())
+
+        # パターンが変わると全摘要を再計算する
+        self.case.custom_patterns = {"生活費": ["東京電力", "電気"]}
+        self.case.save()
+        self.assertEqual(AISuggestionService.refresh(self.case), 2)
+        version = AISuggestionService.pattern_version(self.case)
+        self.assertFalse(self.case.ai_suggestions.exclude(pattern_version=version).exists())
+
+    def test_ai_tab_reads_paginated_suggestions_filtered_by_threshold(self):
+        """AI分類タブは保存済み候補を閾値で絞り込み、ページ単位で表示する"""
+        exact_ids = self._add("東京電力 電気料金", count=3)
+        self._add("東京電カ")
+        self._add("謎の取引")
+        AISuggestionService.refresh(self.case)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('analysis-dashboard', args=[self.case.pk]),
+                {'tab': 'ai', 'fuzzy_threshold': 70},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('"analyzer_aisuggestion"' in q['sql'] and not q['sql'].startswith('SELECT')
+                             for q in queries.captured_queries))
+        self.assertEqual(response.context['suggestions_count'], 4)
+        groups = response.context['ai_groups']
+        self.assertEqual(
+            [(g['description'], g['count'], g['suggested_category']) for g in groups],
+            [("東京電力 電気料金", 3, "生活費"), ("東京電カ", 1, "生活費")],
+        )
+        self.assertEqual(sorted(groups[0]['tx_ids']), exact_ids)
+        self.assertEqual(len(response.context['ai_suggestions'].object_list), 4)
+
+        # 閾値を上げると低スコアの候補はSQLで除外される（再計算はしない）
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('analysis-dashboard', args=[self.case.pk]),
+                {'tab': 'ai', 'fuzzy_threshold': 100},
+            )
+        self.assertEqual(response.context['suggestions_count'], 3)
+        self.assertEqual([g['description'] for g in response.context['ai_groups']], ["東京電力 電気料金"])
+        self.assertFalse(any('INSERT INTO "analyzer_aisuggestion"' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(AISuggestion.objects.filter(case=self.case).count(), 3)
+
+    def test_regenerate_is_a_post_action_that_invalidates_etag(self):
+        """再生成はPOSTで行い、版数を進めて同じ画面の304・キャッシュを返さないこと"""
+        self._add("東京電力 電気料金")
+        AISuggestionService.refresh(self.case)
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+        self.client.get(url, {'tab': 'overview'})
+        first = self.client.get(url, {'tab': 'ai'})
+        suggestion_id = self.case.ai_suggestions.get().pk
+
+        # GET のパラメータでは再計算しない
+        self.client.get(url, {'tab': 'ai', 'regenerate_ai': 'true'})
+        self.assertEqual(self.case.ai_suggestions.get().pk, suggestion_id)
+
+        response = self.client.post(
+            url, {'action': 'regenerate_ai_suggestions', 'fuzzy_threshold': 80},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(), {'success': True, 'count': 1})
+        self.assertNotEqual(self.case.ai_suggestions.get().pk, suggestion_id)
+        regenerated = self.client.get(url, {'tab': 'ai'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(regenerated.status_code, 200)
+        self.assertIn('ai_groups', regenerated.context)
+
+    def test_pattern_and_settings_saves_refresh_suggestions(self):
+        """パターン・設定を保存した側で候補を更新する（分類が変わらない変更でも、AIタブでは計算しない）"""
+        self._add("ほげ商店 代金")
+        other = Case.objects.create(name="別案件")
+        Transaction.objects.create(case=other, description="ほげ商店 代金", category="未分類")
+        AISuggestionService.refresh_cases()
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+
+        def is_current(case):
+            case.refresh_from_db()
+            return case.ai_suggestions.filter(pattern_version=AISuggestionService.pattern_version(case)).exists()
+
+        # 案件固有のキーワード削除は、再分類する取引がなくてもその案件の候補を更新する
+        response = self.client.post(url, {
+            'action': 'delete_pattern', 'scope': 'case', 'category': '生活費', 'keyword': '東京電力',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['reclassified'], 0)
+        self.assertTrue(is_current(self.case))
+
+        # グローバルのキーワード追加は全案件を更新する
+        self.client.post(url, {
+            'action': 'add_pattern', 'scope': 'global', 'category': '生活費', 'keyword': 'ほげ商店',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(set(AISuggestion.objects.values_list('case_id', 'category')),
+                         {(self.case.pk, '生活費'), (other.pk, '生活費')})
+
+        # ファジー設定の保存は全案件の候補の版を新しくする
+        self.client.post(reverse('settings'), {
+            'large_amount_threshold': 500000, 'transfer_days_window': 3, 'transfer_amount_tolerance': 1000,
+            'transfer_date_mode': 'after_only', 'gift_threshold': 1000000, 'fuzzy_threshold': 90,
+        })
+        self.assertTrue(is_current(self.case))
+        self.assertTrue(is_current(other))
+
+        # 未分類に戻した摘要は、その場で候補が計算される
+        tx = Transaction.objects.create(case=self.case, description="ふが商店", category="生活費")
+        TransactionService.update_transaction_category(self.case, tx.pk, "未分類")
+        self.assertTrue(self.case.ai_suggestions.filter(description="ふが商店").exists())
+
+
+class LearnedClassifierTest(TestCase):
+    """分類変更履歴から学習するモデルのテスト"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(LEARNED_MODEL_DIR=tmp.name))
+        self.model_dir = Path(tmp.name)
+        self.case = Case.objects.create(name="学習案件")
+
+    def _classify(self, description, category, source):
+        tx = Transaction.objects.create(case=self.case, description=description)
+        ClassificationHistoryService.apply_changes(self.case, {tx.pk: category}, source=source)
+
+    def test_trains_from_manual_history_and_feeds_ai_suggestions(self):
+        """手動の分類だけで学習し、AI分類候補に学習済みモデルの候補が加わること"""
+        self._classify('とうきょう電力 4月', '公共料金', 'manual')
+        self._classify('とうきょう電力 5月', '公共料金', 'manual_same_description')
+        self._classify('にっぽん生命 保険料', '保険', 'bulk_unclassified')
+        self._classify('にっぽん生命 年払', '保険', 'bulk_unclassified')
+        self._classify('にっぽん生命 自動', '生活費', 'ai_suggestion')
+
+        descriptions, labels = LearnedClassifierService.training_data()
+        self.assertEqual(sorted(zip(descriptions, labels)), [
+            ('とうきょう電力 4月', '公共料金'), ('とうきょう電力 5月', '公共料金'),
+            ('にっぽん生命 保険料', '保険'), ('にっぽん生命 年払', '保険'),
+        ])
+        other = Case.objects.create(name="推論案件")
+        Transaction.objects.create(case=other, description='とうきょう電力 6月')
+        AISuggestionService.refresh(other)
+        self.assertEqual(other.ai_suggestions.get().category, '')
+
+        self.assertIsNone(LearnedClassifierService.train(min_samples=10))
+        result = LearnedClassifierService.train(min_samples=2)
+        self.assertEqual((result['version'], result['samples']), (1, 4))
+        self.assertEqual(learned_classifier.current_version(), 1)
+        # 保存した後に全案件の候補を新しいモデルで計算し直す
+        self.assertEqual(other.ai_suggestions.get().category, '公共料金')
+
+    def test_model_is_versioned_on_disk_and_loaded_lazily(self):
+        """学習ごとに版数を進めて古い版を整理し、最新の版だけを読み込むこと"""
+        model = learned_classifier.NaiveBayesClassifier.fit(
+            ['いおん 食品', 'いおん 衣料', 'かぶしきがいしゃ やまだ 給与'], ['生活費', '生活費', '給与'],
+        )
+        predicted = model.predict(['いおん 雑貨', 'いおん 雑貨', 'やまだ 給与', 'xyz'], top_n=2)
+        self.assertEqual(list(predicted), ['いおん 雑貨', 'やまだ 給与'])
+        self.assertEqual(predicted['いおん 雑貨'][0][0], '生活費')
+        self.assertEqual(predicted['やまだ 給与'][0][0], '給与')
+
+        learned_classifier.save_model(model, keep=1)
+        learned_classifier.save_model(model, keep=1)
+        self.assertEqual([p.name for p in self.model_dir.iterdir()], ['classifier-0002.npz'])
+        loaded = learned_classifier.get_model()
+        self.assertIs(learned_classifier.get_model(), loaded)
+        self.assertEqual(loaded.meta['version'], 2)
+        self.assertEqual(loaded.predict(['いおん 雑貨']), model.predict(['いおん 雑貨']))
+
+    def test_new_model_version_invalidates_dashboard_etag(self):
+        """新しい版を保存するとダッシュボードのETagが変わり、AIタブが再構築されること"""
+        Transaction.objects.create(case=self.case, description='いおん 雑貨')
+        AISuggestionService.refresh(self.case)
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+        # ページに埋め込むCSRFトークンが変わらないよう、先にCSRFクッキーを受け取っておく
+        self.client.get(url, {'tab': 'overview'})
+        first = self.client.get(url, {'tab': 'ai'})
+        self.assertEqual(self.client.get(url, {'tab': 'ai'}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        model = learned_classifier.NaiveBayesClassifier.fit(
+            ['いおん 食品', 'かぶしきがいしゃ やまだ 給与'], ['生活費', '給与'],
+        )
+        learned_classifier.save_model(model)
+        response = self.client.get(url, {'tab': 'ai'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        # 古い版の候補は表示せず、タブでは計算し直さない（学習コマンド・更新コマンドの側で計算する）
+        self.assertEqual(response.context['suggestions_count'], 0)
+
+        AISuggestionService.refresh_cases()
+        self.assertEqual(self.case.ai_suggestions.get().category, '生活費')
+
+
+class ChangeFeedServiceTest(TestCase):
+    """取引変更フィードのテスト"""
+
+    def setUp(self):
+        self.case = Case.objects.create(name="変更フィードテスト")
+        self.client = Client()
+        self.txs = [
+            Transaction.objects.create(case=self.case, date=date(2024, 1, i + 1), description=f"取引{i}", amount_out=100)
+            for i in range(3)
+        ]
+
+    def _revision(self):
+        self.case.refresh_from_db(fields=['revision'])
+        return self.case.revision
+
+    def test_service_methods_record_merged_row_deltas(self):
+        """サービスでの変更は取引ごとにまとめた差分として返る"""
+        since = self._revision()
+        first, second, third = self.txs
+        TransactionService.bulk_update_categories(self.case, {str(first.pk): "生活費", str(second.pk): "給与"})
+        TransactionService.toggle_flag(self.case, first.pk)
+        TransactionService.delete_duplicates(self.case, [str(third.pk)])
+
+        feed = ChangeFeedService.changes_since(self.case, since)
+        self.assertFalse(feed['reload'])
+        self.assertEqual(feed['revision'], self._revision())
+        self.assertEqual(feed['changes'], [
+            {'id': first.pk, 'op': 'update', 'fields': ['category', 'is_flagged']},
+            {'id': second.pk, 'op': 'update', 'fields': ['category']},
+            {'id': third.pk, 'op': 'delete', 'fields': []},
+        ])
+        self.assertEqual(ChangeFeedService.changes_since(self.case, feed['revision'])['changes'], [])
+
+        # 行単位で表せない変更・保持範囲外の版数は再読込を求める
+        TransactionService.bulk_replace_field_value(self.case, 'bank_name', 'x', 'y')
+        Account.objects.create(case=self.case, account_number="111", bank_name="旧銀行")
+        TransactionService.bulk_replace_field_value(self.case, 'bank_name', '旧銀行', '新銀行')
+        self.assertTrue(ChangeFeedService.changes_since(self.case, feed['revision'])['reload'])
+        self.assertTrue(ChangeFeedService.changes_since(self.case, self._revision() + 1)['reload'])
+
+    def test_changes_api_returns_current_rows(self):
+        """差分APIは変更された取引の現在の行データを返す"""
+        since = self._revision()
+        first = self.txs[0]
+        TransactionService.update_memo(self.case, first.pk, "確認済み")
+        self.client.post(
+            reverse('api-delete-transaction', args=[self.case.pk]), {'tx_id': self.txs[1].pk},
+        )
+
+        response = self.client.get(reverse('api-changes', args=[self.case.pk]), {'since': since})
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertFalse(data['reload'])
+        self.assertEqual(data['revision'], self._revision())
+        memo_change, delete_change = data['changes']
+        self.assertEqual((memo_change['op'], memo_change['fields']), ('update', ['memo']))
+        self.assertEqual(memo_change['row']['memo'], "確認済み")
+        self.assertEqual(memo_change['row']['description'], "取引0")
+        self.assertEqual(delete_change, {'id': self.txs[1].pk, 'op': 'delete', 'fields': []})
+
+        bad = self.client.get(reverse('api-changes', args=[self.case.pk]), {'since': 'abc'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_change_is_recorded_in_the_same_transaction_as_the_mutation(self):
+        """変更と記録は同じトランザクションで行い、途中で失敗すればどちらも残らない"""
+        from unittest import mock
+
+        since = self._revision()
+        with mock.patch.object(AccountStatsService, 'refresh', side_effect=RuntimeError("集計失敗")):
+            with self.assertRaises(RuntimeError):
+                TransactionService.delete_duplicates(self.case, [str(self.txs[0].pk)])
+        self.assertTrue(Transaction.objects.filter(pk=self.txs[0].pk).exists())
+        self.assertEqual(self._revision(), since)
+        self.assertFalse(self.case.transaction_changes.exists())
+
+    def test_mass_change_records_a_single_reset_row(self):
+        """差分で返せない件数の変更は取引ごとに記録せず、再読込の1行にする"""
+        from .services.change_feed import CHANGE_FEED_MAX_ROWS
+
+        since = self._revision()
+        ChangeFeedService.record(self.case, range(1, CHANGE_FEED_MAX_ROWS + 2), [], op=TransactionChange.OP_DELETE)
+        self.assertEqual(
+            list(self.case.transaction_changes.values_list('op', flat=True)), [TransactionChange.OP_RESET],
+        )
+        self.assertTrue(ChangeFeedService.changes_since(self.case, since - 1)['reload'])
+
+
+class AccountStatsServiceTest(TestCase):
+    """口座の集計値のテスト"""
+
+    def setUp(self):
+        self.case = Case.objects.create(name="口座集計テスト", reference_date=date(2023, 6, 30))
+        self.account = Account.objects.create(case=self.case, account_number="111", bank_name="A銀行")
+        self.txs = [
+            Transaction.objects.create(
+                case=self.case, account=self.account, date=tx_date, description=f"取引{i}",
+                amount_out=100, balance=balance,
+            )
+            for i, (tx_date, balance) in enumerate([
+                (date(2019, 5, 1), 1000),
+                (date(2021, 1, 10), 2000),
+                (date(2023, 6, 30), 3000),
+                (date(2024, 2, 1), 4000),
+            ])
+        ]
+        AccountStatsService.refresh(self.case)
+
+    def test_refresh_and_services_maintain_account_stats(self):
+        """集計値は再計算され、編集・削除・基準日変更のサービスで更新される"""
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.tx_count, 4)
+        self.assertEqual((self.account.first_tx_date, self.account.last_tx_date), (date(2019, 5, 1), date(2024, 2, 1)))
+        self.assertEqual(AccountStatsService.refresh(self.case), 0)
+
+        TransactionService.update_transaction(self.case, self.txs[1].pk, {'date': '2018-12-31'})
+        TransactionService.delete_duplicates(self.case, [str(self.txs[3].pk)])
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.tx_count, self.account.first_tx_date), (3, date(2018, 12, 31)))
+        self.assertEqual(self.account.last_tx_date, date(2023, 6, 30))
+
+    def test_summaries_read_stats_and_command_repairs_drift(self):
+        """概要・案件一覧は集計値を読み、ずれはコマンドで修復できる"""
+        from django.core.management import call_command
+
+        Account.objects.filter(pk=self.account.pk).update(tx_count=99)
+        summary = AnalysisService._build_account_summary(self.case)
+        self.assertEqual((summary[0]['count'], summary[0]['last_date']), (99, date(2024, 2, 1)))
+        listed = self.client.get(reverse('case-list')).context['cases'].get(pk=self.case.pk)
+        self.assertEqual((listed.tx_count, listed.unclassified_count, listed.account_count), (99, 4, 1))
+
+        out = StringIO()
+        call_command('rebuild_account_stats', '--case', str(self.case.pk), stdout=out)
+        self.assertIn("1口座", out.getvalue())
+        self.assertEqual(AnalysisService._build_account_summary(self.case)[0]['count'], 4)
+
+    def test_dummy_data_command_fills_account_stats(self):
+        """ダミーデータの一括登録後も口座の集計値が取引と一致すること"""
+        from django.core.management import call_command
+
+        call_command('create_dummy_data', '--name', 'ダミー集計', '--months', '2', stdout=StringIO())
+        case = Case.objects.get(name='ダミー集計')
+        for account in case.accounts.all():
+            dates = account.transactions.exclude(date__isnull=True).values_list('date', flat=True)
+            self.assertEqual(account.tx_count, account.transactions.count())
+            self.assertEqual((account.first_tx_date, account.last_tx_date), (min(dates), max(dates)))
+
+
+class SettingsStoreTest(TestCase):
+    """DBに保存するユーザー設定・分類パターンのテスト"""
+
+    def test_save_round_trip_keeps_keyword_ids(self):
+        """保存した設定・パターンを読め、変更していないキーワードのIDは保存をまたいで変わらないこと"""
+        config.save_user_settings({
+            'GIFT_THRESHOLD': 300000,
+            'CLASSIFICATION_PATTERNS': {'給与': ['給与', '賞与'], 'その他': []},
+        })
+        keyword_id = PatternKeyword.objects.get(keyword='給与').pk
+
+        config.add_pattern_keyword('給与', '報酬')
+
+        self.assertEqual(config.get_gift_threshold(), 300000)
+        self.assertEqual(config.get_classification_patterns(), {'給与': ['給与', '賞与', '報酬'], 'その他': []})
+        self.assertEqual(PatternKeyword.objects.get(keyword='給与').pk, keyword_id)
+        self.assertEqual(config.settings_version(), 2)
+
+    def test_other_worker_save_is_picked_up_with_one_check_per_request(self):
+        """別プロセスの保存は版数で検出し、リクエスト中の版数確認は1回だけであること"""
+        from django.core.signals import request_finished, request_started
+
+        config.get_gift_threshold()
+        # 別ワーカーの保存（このプロセスのスナップショットを経由しない）
+        UserSetting.objects.create(key='GIFT_THRESHOLD', value=123)
+        SettingsVersion.objects.update_or_create(pk=1, defaults={'version': 99})
+
+        request_started.send(sender=self.__class__)
+        try:
+            # 版数の確認 + 読み直し（設定・カテゴリー）
+            with self.assertNumQueries(3):
+                self.assertEqual(config.get_gift_threshold(), 123)
+                self.assertEqual(config.settings_version(), 99)
+            with self.assertNumQueries(0):
+                config.get_fuzzy_config()
+                config.get_classification_patterns()
+        finally:
+            request_finished.send(sender=self.__class__)
+
+    def test_saved_snapshot_is_installed_only_after_commit(self):
+        """保存した内容はコミット後にプロセスへ反映し、ロールバックした保存は使わないこと"""
+        from django.db import transaction as db_transaction
+        from .lib.config import settings as settings_store
+
+        config.save_classification_patterns({'給与': ['給与']})
+        with self.assertRaises(RuntimeError):
+            with db_transaction.atomic():
+                config.save_classification_patterns({'給与': ['給与', '賞与']})
+                # 保存したトランザクションの中では新しい版を使う
+                self.assertEqual(config.get_classification_patterns(), {'給与': ['給与', '賞与']})
+                self.assertEqual(config.settings_version(), 2)
+                raise RuntimeError("ロールバック")
+        self.assertEqual(config.get_classification_patterns(), {'給与': ['給与']})
+        self.assertEqual(config.settings_version(), 1)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            config.save_classification_patterns({'給与': ['報酬']})
+        self.assertNotEqual(settings_store._snapshot.patterns, {'給与': ['報酬']})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(settings_store._snapshot.patterns, {'給与': ['報酬']})
+
+    def test_pattern_batch_commits_each_scope_once(self):
+        """一括変更は全変更を適用してから保存し、設定版数は1回だけ進むこと"""
+        config.save_user_settings({'CLASSIFICATION_PATTERNS': {'生活費': ['イオン'], '給与': []}})
+        case = Case.objects.create(name="パターン案件")
+        version = config.settings_version()
+
+        batch = config.PatternBatch(case)
+        for i in range(200):
+            self.assertTrue(batch.add('global', '給与', f'給与{i}'))
+        self.assertTrue(batch.move('生活費', 'イオン', 'global', 'case'))
+        self.assertFalse(batch.delete('global', '生活費', '存在しない'))
+        self.assertFalse(batch.move('生活費', 'イオン', 'global', 'global'))
+        with self.assertNumQueries(0):
+            self.assertTrue(batch.add('case', '生活費', 'ローソン'))
+
+        self.assertTrue(batch.commit())
+        self.assertFalse(batch.commit())
+
+        patterns = config.get_classification_patterns()
+        self.assertEqual(patterns['生活費'], [])
+        self.assertEqual(len(patterns['給与']), 200)
+        self.assertEqual(config.settings_version(), version + 1)
+        case.refresh_from_db()
+        self.assertEqual(case.custom_patterns, {'生活費': ['イオン', 'ローソン']})
+
+    @override_settings(FORCE_SCRIPT_NAME=None, ALLOWED_HOSTS=['*'])
+    def test_bulk_pattern_changes_handler_saves_once(self):
+        """分析画面のパターン一括変更は1回の保存で反映され、不正な変更はエラーとして返ること"""
+        set_script_prefix('/')
+        case = Case.objects.create(name="一括変更案件")
+        version = config.settings_version()
+        changes = [{'action': 'add', 'category': '給与', 'keyword': f'手当{i}', 'scope': 'global'} for i in range(30)]
+        changes.append({'action': 'add', 'category': '給与', 'keyword': '個別', 'scope': 'case'})
+        changes.append({'action': 'move', 'category': '給与', 'keyword': '手当0', 'fromScope': 'global', 'toScope': 'case'})
+
+        response = Client().post(
+            reverse('analysis-dashboard', args=[case.pk]),
+            {'action': 'bulk_pattern_changes', 'changes': json.dumps(changes)},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+        self.assertEqual(response.json()['saved_count'], 32)
+        self.assertEqual(config.settings_version(), version + 1)
+        global_keywords = config.get_classification_patterns()['給与']
+        self.assertIn('手当29', global_keywords)
+        self.assertNotIn('手当0', global_keywords)
+        case.refresh_from_db()
+        self.assertEqual(case.custom_patterns, {'給与': ['個別', '手当0']})
+
+
+class KeywordImpactServiceTest(TestCase):
+    """キーワード影響プレビューのテスト"""
+
+    def setUp(self):
+        self.case = Case.objects.create(name="影響案件")
+        self.other = Case.objects.create(name="他の案件")
+        rows = [
+            (self.case, 'みなと商会 家賃', '未分類', False),
+            (self.case, 'みなと商会 支払', '未分類', False),
+            (self.case, 'みなと商会', '生活費', False),
+            (self.case, 'ミナト商会', '未分類', False),
+            (self.case, 'みなと商会 確認中', '未分類', True),
+            (self.other, 'みなと商会 振込', '未分類', False),
+            (self.other, 'みなと商会 分類済', '給与', False),
+        ]
+        self.txs = [
+            Transaction.objects.create(case=case, description=description, category=category, is_flagged=flagged)
+            for case, description, category, flagged in rows
+        ]
+
+    def test_preview_counts_ids_and_category_changes(self):
+        """分類器と同じ判定で一致件数・対象ID・分類の変化を返すこと"""
+        impact = KeywordImpactService.preview(self.case, 'みなと商会', category='事業・不動産')
+
+        self.assertEqual(
+            (impact['current_case_count'], impact['other_cases_count'], impact['total_count']), (2, 1, 3),
+        )
+        self.assertEqual(impact['case_counts'], {self.case.pk: 2, self.other.pk: 1})
+        self.assertEqual(sorted(impact['transaction_ids']), [self.txs[0].pk, self.txs[1].pk])
+        self.assertEqual(impact['changes'], [
+            {'from': '未分類', 'to': '事業・不動産', 'count': 2},
+            {'from': '生活費', 'to': '事業・不動産', 'count': 1},
+        ])
+
+    def test_preview_uses_one_query_on_the_search_column(self):
+        """件数・IDは検索用摘要への1クエリで求めること"""
+        with CaptureQueriesContext(connection) as ctx:
+            impact = KeywordImpactService.preview(self.case, 'みなと商会')
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('description_search', ctx.captured_queries[0]['sql'])
+        self.assertEqual(impact['total_count'], 3)
+        self.assertEqual(impact['changes'], [])
+
+
+class ReclassificationServiceTest(TestCase):
+    """一致したキーワードの記録とキーワード変更時の再分類のテスト"""
+
+    def setUp(self):
+        self.case = Case.objects.create(name="再分類案件")
+        config.save_classification_patterns({
+            '生活費': ['あおば商店', 'みどり市場'],
+            '給与': ['ひかり工業'],
+        })
+
+    def test_deleted_keyword_reclassifies_only_rows_it_matched(self):
+        """削除したキーワードで自動分類された取引だけを分類し直すこと"""
+        matched = Transaction.objects.create(case=self.case, description='あおば商店 食品')
+        other = Transaction.objects.create(case=self.case, description='みどり市場')
+        manual = Transaction.objects.create(case=self.case, description='あおば商店 雑貨', category='交際費')
+        TransactionService.run_classifier(self.case)
+
+        matched.refresh_from_db()
+        self.assertEqual((matched.category, matched.match_scope, matched.match_keyword), ('生活費', 'global', 'あおば商店'))
+
+        batch = config.PatternBatch(self.case)
+        batch.delete('global', '生活費', 'あおば商店')
+        batch.commit()
+        self.assertEqual(
+            ReclassificationService.affected_ids(self.case, batch.stale_keywords, batch.new_keywords),
+            {self.case.pk: {matched.pk}},
+        )
+        count = ReclassificationService.reclassify(self.case, batch.stale_keywords, batch.new_keywords)
+
+        self.assertEqual(count, 1)
+        matched.refresh_from_db()
+        self.assertEqual((matched.category, matched.match_scope, matched.match_keyword), ('未分類', '', ''))
+        self.assertEqual(Transaction.objects.get(pk=other.pk).category, '生活費')
+        self.assertEqual(Transaction.objects.get(pk=manual.pk).category, '交際費')
+        self.assertEqual(ClassificationHistoryService.latest_summary(self.case)['source'], 'pattern_update')
+
+    def test_updated_case_keyword_reclassifies_old_matches_and_new_candidates(self):
+        """変更前のキーワードの一致と、変更後のキーワードを含む未分類取引を分類し直すこと"""
+        self.case.custom_patterns = {'事業・不動産': ['さくら不動産']}
+        self.case.save()
+        renamed = Transaction.objects.create(case=self.case, description='さくら不動産 家賃')
+        candidate = Transaction.objects.create(case=self.case, description='さくら地所 家賃')
+        TransactionService.apply_classification_rules(self.case)
+
+        batch = config.PatternBatch(self.case)
+        batch.update('case', '事業・不動産', 'さくら不動産', 'さくら')
+        batch.commit()
+        count = ReclassificationService.reclassify(self.case, batch.stale_keywords, batch.new_keywords)
+
+        self.assertEqual(count, 1)
+        renamed.refresh_from_db()
+        candidate.refresh_from_db()
+        self.assertEqual((renamed.category, renamed.match_scope, renamed.match_keyword), ('事業・不動産', 'case', 'さくら'))
+        self.assertEqual((candidate.category, candidate.match_keyword), ('事業・不動産', 'さくら'))
+
+
+class SqliteKeywordSearchTest(TestCase):
+    """SQLite の FTS5 trigram 索引による摘要検索のテスト"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite のみ")
+        self.case = Case.objects.create(name="全文検索案件")
+        self.existing = Transaction.objects.create(case=self.case, description='カブシキガイシャ ヤマダ 給与')
+        if not sqlite_fts.install(connection):
+            self.skipTest("FTS5 trigram 非対応の SQLite")
+        self.addCleanup(sqlite_fts.uninstall, connection)
+
+    def _search(self, keyword):
+        return set(filter_by_keyword(self.case.transactions.all(), keyword).values_list('description', flat=True))
+
+    def test_index_backs_normalized_and_search_and_follows_writes(self):
+        """正規化した複数語AND検索を索引で行い、追加・更新・削除に追従すること"""
+        other = Transaction.objects.create(case=self.case, description='かぶしきがいしゃ すずき')
+        half_width = Transaction.objects.create(case=self.case, description='ﾔﾏﾀﾞ ｼｮｳｼﾞ')
+
+        qs = filter_by_keyword(self.case.transactions.all(), 'ガイシャ やまだ')
+        self.assertIn('MATCH', str(qs.query))
+        self.assertEqual(list(qs), [self.existing])
+        self.assertEqual(self._search('やまだ'), {self.existing.description, half_width.description})
+
+        other.description = 'すずき やまだ'
+        other.save()
+        half_width.delete()
+        self.assertEqual(self._search('やまだ'), {self.existing.description, 'すずき やまだ'})
+        self.assertEqual(self._search('かぶしき'), {self.existing.description})
+
+    def test_short_keywords_fall_back_to_substring_search(self):
+        """trigram で検索できない3文字未満の語は部分一致だけで判定すること"""
+        Transaction.objects.create(case=self.case, description='給与 振込')
+
+        qs = filter_by_keyword(self.case.transactions.all(), '給与')
+        self.assertNotIn('MATCH', str(qs.query))
+        self.assertEqual(qs.count(), 2)
+        self.assertEqual(self._search('給与 やまだ'), {self.existing.description})
+
+
+class SqliteKeywordSearchRemakeTest(TransactionTestCase):
+    """SQLite のテーブル作り直し（スキーマ変更）後の FTS 索引のテスト"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite のみ")
+        self.case = Case.objects.create(name="作り直し案件")
+        Transaction.objects.create(case=self.case, description='カブシキガイシャ ヤマダ 給与')
+        if not sqlite_fts.install(connection):
+            self.skipTest("FTS5 trigram 非対応の SQLite")
+        self.addCleanup(sqlite_fts.uninstall, connection)
+
+    def _search(self, keyword):
+        qs = filter_by_keyword(self.case.transactions.all(), keyword)
+        return set(qs.values_list('description', flat=True))
+
+    def test_remade_table_is_searched_without_stale_index_and_repaired_after_migrate(self):
+        """トリガーが消えた索引は使わず、post_migrate で作り直して新しい行も検索できること"""
+        from django.apps import apps
+        from django.db.models.signals import post_migrate
+
+        with connection.schema_editor() as editor:
+            editor._remake_table(Transaction)
+        sqlite_fts.refresh(connection)  # 新しい接続を開いたときと同じ
+        self.assertFalse(sqlite_fts.is_available(connection, Transaction._meta.db_table))
+
+        Transaction.objects.create(case=self.case, description='やまだ商店 仕入')
+        self.assertEqual(self._search('やまだ'), {'カブシキガイシャ ヤマダ 給与', 'やまだ商店 仕入'})
+
+        post_migrate.send(sender=apps.get_app_config('analyzer'), app_config=apps.get_app_config('analyzer'),
+                          verbosity=0, interactive=False, using=connection.alias, apps=apps, plan=[])
+        self.assertTrue(sqlite_fts.is_available(connection, Transaction._meta.db_table))
+        Transaction.objects.create(case=self.case, description='やまだ 電気料金')
+        self.assertIn('MATCH', str(filter_by_keyword(self.case.transactions.all(), 'やまだ').query))
+        self.assertEqual(
+            self._search('やまだ'), {'カブシキガイシャ ヤマダ 給与', 'やまだ商店 仕入', 'やまだ 電気料金'},
+        )
+
+
 class JapaneseDateTest(TestCase):
     """和暦変換のテスト"""
 
@@ -519,6 +1475,7 @@ class ViewsTest(TestCase):
 
     def setUp(self):
         set_script_prefix('/')
+        self.export_cache_dir = use_temp_export_cache(self)
         self.client = Client()
         self.case = Case.objects.create(name="テスト案件")
 
@@ -824,6 +1781,64 @@ class ViewsTest(TestCase):
         self.assertContains(response, "個別取引を確認・分類")
         self.assertContains(response, "取引を選び、ボタンまたは数字キーで分類")
 
+    def test_unclassified_groups_are_aggregated_per_page(self):
+        """未分類グループはDBで集計し、表示ページ分だけ取引IDとサンプルを付ける"""
+        account = Account.objects.create(case=self.case, account_number="111", bank_name="テスト銀行")
+        created = {}
+        for i in range(4):
+            tx = Transaction.objects.create(
+                case=self.case, account=account, date=date(2024, 1, 10 - i),
+                description="電気料金", amount_out=1000 * (i + 1), category="未分類",
+            )
+            created.setdefault("電気料金", []).append(tx.pk)
+        for i in range(51):
+            Transaction.objects.create(
+                case=self.case, date=date(2024, 2, 1), description=f"単発{i:02d}",
+                amount_in=500, category="未分類",
+            )
+        Transaction.objects.create(case=self.case, date=date(2024, 3, 1), description=None, category="未分類")
+        Transaction.objects.create(case=self.case, date=date(2024, 3, 2), description="電気料金", category="生活費")
+
+        response = self.client.get(
+            reverse('analysis-dashboard', args=[self.case.pk]),
+            {'tab': 'unclassified'},
+        )
+        page = response.context['unclassified_groups']
+        self.assertEqual(response.context['unclassified_group_count'], 53)
+        self.assertEqual(response.context['unclassified_tx_total'], 56)
+        self.assertEqual(response.context['max_group_count'], 4)
+        self.assertEqual(len(page.object_list), 50)
+        self.assertEqual(page.paginator.num_pages, 2)
+
+        top = page.object_list[0]
+        self.assertEqual(top['description'], "電気料金")
+        self.assertEqual((top['count'], top['total_out'], top['total_in']), (4, 10000, 0))
+        # 取引IDとサンプルは未分類タブの並び順（日付昇順）
+        expected_ids = list(reversed(created["電気料金"]))
+        self.assertEqual(json.loads(top['tx_ids_json']), expected_ids)
+        self.assertEqual(top['first_tx_id'], expected_ids[0])
+        self.assertEqual([s['date'] for s in top['samples']], [date(2024, 1, d) for d in (7, 8, 9)])
+        self.assertEqual(top['samples'][0]['bank_name'], "テスト銀行")
+        self.assertEqual(page.object_list[1]['description'], "（摘要なし）")
+
+        last = self.client.get(
+            reverse('analysis-dashboard', args=[self.case.pk]),
+            {'tab': 'unclassified', 'group_page': 2},
+        ).context['unclassified_groups']
+        self.assertEqual([g['description'] for g in last.object_list], ["単発48", "単発49", "単発50"])
+
+        filtered = self.client.get(
+            reverse('analysis-dashboard', args=[self.case.pk]),
+            {'tab': 'unclassified', 'keyword': 'でんき'},
+        )
+        self.assertEqual(filtered.context['unclassified_group_count'], 0)
+        filtered = self.client.get(
+            reverse('analysis-dashboard', args=[self.case.pk]),
+            {'tab': 'unclassified', 'keyword': '単発0'},
+        )
+        self.assertEqual(filtered.context['unclassified_group_count'], 10)
+        self.assertEqual(filtered.context['unclassified_tx_total'], 10)
+
     def test_unclassified_workbench_defaults_to_date_ascending(self):
         """未分類整理は日付の古い取引から表示する"""
         older = Transaction.objects.create(
@@ -851,6 +1866,152 @@ class ViewsTest(TestCase):
             [older.pk, newer.pk],
         )
 
+    def test_keyset_pagination_walks_every_sort_order(self):
+        """キーセット方式のページ送り・戻り・最終ページが OFFSET 方式と同じ並びになる"""
+        from .views._helpers import keyset_paginate
+
+        Transaction.objects.bulk_create([
+            Transaction(case=self.case, date=None if i % 4 == 0 else date(2024, 1, i % 3 + 1),
+                        description=f"取引{i}", amount_out=(i % 3) * 100, amount_in=(i * 7) % 5)
+            for i in range(11)
+        ])
+        qs = self.case.transactions.all()
+        for sort in ('date_asc', 'date_desc', 'amount_out_asc', 'amount_out_desc', 'amount_in_desc'):
+            field, _, direction = sort.rpartition('_')
+            ordered = [tx.pk for tx in sorted(
+                qs, key=lambda tx: (getattr(tx, field) is not None, getattr(tx, field) or 0, tx.pk),
+                reverse=direction == 'desc',
+            )]
+            pages, page = [], keyset_paginate(qs, None, sort, per_page=3)
+            while True:
+                pages.append([tx.pk for tx in page])
+                self.assertEqual(page.number, len(pages))
+                if not page.has_next():
+                    break
+                page = keyset_paginate(qs, page.next_token, sort, per_page=3)
+            self.assertEqual(pages, [ordered[i:i + 3] for i in range(0, 11, 3)], sort)
+
+            back = keyset_paginate(qs, page.previous_token, sort, per_page=3)
+            self.assertEqual(([tx.pk for tx in back], back.number), (pages[-2], 3))
+            last = keyset_paginate(qs, page.last_token, sort, per_page=3)
+            self.assertEqual(([tx.pk for tx in last], last.number, last.count), (pages[-1], 4, 11))
+
+        first = keyset_paginate(qs, "2", 'date_asc', per_page=3)
+        self.assertEqual((first.number, first.has_previous()), (1, False))
+
+        # 並び替えの型に合わないキー（別の並び替えのトークン・改変）は先頭ページになる
+        from .views._helpers import _encode_page_token
+        for sort, key in (('date_asc', 100), ('date_asc', 'abc'), ('amount_out_asc', '2024-01-01'),
+                          ('amount_in_desc', True)):
+            page = keyset_paginate(qs, _encode_page_token({'d': 'after', 'k': [key, 1], 'n': 3}), sort, per_page=3)
+            self.assertEqual((page.number, page.token, page.has_previous()), (1, '', False), (sort, key))
+
+    def test_all_tab_pages_without_offset_and_caches_count(self):
+        """全取引タブはページトークンで移動し、件数は版数が変わるまで再計算しない"""
+        Transaction.objects.bulk_create([
+            Transaction(case=self.case, date=date(2024, 1, 1), description=f"取引{i}", amount_out=i)
+            for i in range(30)
+        ])
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+        first = self.client.get(url, {'tab': 'all', 'per_page': 25})
+        page = first.context['all_txs']
+        self.assertEqual((page.count, page.num_pages, len(page)), (30, 2, 25))
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url, {'tab': 'all', 'per_page': 25, 'page': page.next_token})
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertFalse([q for q in sql if 'OFFSET' in q and 'analyzer_transaction' in q])
+        self.assertFalse([q for q in sql if q.startswith('SELECT COUNT(*)') and 'analyzer_transaction' in q])
+        self.assertEqual(second.context['all_txs'].start_index(), 26)
+        self.assertContains(second, f'name="filter_page" value="{page.next_token}"')
+
+        self.case.transactions.filter(amount_out__lt=10).delete()
+        third = self.client.get(url, {'tab': 'all', 'per_page': 25, 'page': page.next_token})
+        self.assertEqual(third.context['all_txs'].count, 20)
+
+    def test_dashboard_conditional_get_and_tab_fragment_cache(self):
+        """ダッシュボードは版数由来のETagで304を返し、同じ版数ではタブを再構築しない"""
+        tx = Transaction.objects.create(case=self.case, date=date(2024, 1, 1), description="電気代", amount_out=100)
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+        # ページに埋め込むCSRFトークンが変わらないよう、先にCSRFクッキーを受け取っておく
+        self.client.get(url, {'tab': 'overview'})
+
+        first = self.client.get(url, {'tab': 'all'})
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self.client.get(url, {'tab': 'all'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # 同じ版数・条件の再表示はキャッシュ済みのタブHTMLを使う
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, {'tab': 'all'})
+        self.assertNotIn('all_txs', cached.context)
+        self.assertContains(cached, "電気代")
+        self.assertFalse([q for q in ctx.captured_queries if 'LIMIT' in q['sql'] and 'analyzer_transaction' in q['sql']])
+
+        tx.description = "ガス代"
+        tx.save()
+        changed = self.client.get(url, {'tab': 'all'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertContains(changed, "ガス代")
+
+        # エクスポート・JSON APIも同じ版数で304を返す
+        export_url = reverse('export-csv', args=[self.case.pk, 'all'])
+        export_etag = self.client.get(export_url)['ETag']
+        self.assertEqual(self.client.get(export_url, HTTP_IF_NONE_MATCH=export_etag).status_code, 304)
+        api_url = reverse('api-get-transaction', args=[self.case.pk])
+        api_etag = self.client.get(api_url, {'tx_id': tx.pk})['ETag']
+        self.assertEqual(
+            self.client.get(api_url, {'tx_id': tx.pk}, HTTP_IF_NONE_MATCH=api_etag).status_code, 304,
+        )
+
+        # 未表示のメッセージがある場合は304にしない
+        self.client.get(reverse('export-csv', args=[self.case.pk, 'flagged']))
+        pending = self.client.get(url, {'tab': 'all'}, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(pending.status_code, 200)
+        self.assertContains(pending, "該当するデータがありません")
+
+    def test_filter_cache_canonicalizes_state_and_follows_revision(self):
+        """並び順だけ違う絞り込み条件は同じキャッシュを使い、案件の変更で再集計される"""
+        from .services import FilterCacheService
+
+        account = Account.objects.create(case=self.case, account_number="111", bank_name="A銀行")
+        Transaction.objects.bulk_create([
+            Transaction(case=self.case, account=account, date=date(2024, 1, 1),
+                        description=f"イオン 買物{i}", amount_out=1000, amount_in=10 * i)
+            for i in range(5)
+        ])
+        state = {'bank': ['A銀行', 'B銀行'], 'keyword': 'ｲｵﾝ 買物', 'amount_min': '1,000', 'sort': 'date_desc'}
+        same = {'bank': ['B銀行', 'A銀行', 'A銀行'], 'keyword': '買物　イオン', 'amount_min': '1000'}
+        self.assertEqual(
+            FilterCacheService.cache_key(self.case, state, 'all', 'summary'),
+            FilterCacheService.cache_key(self.case, same, 'all', 'summary'),
+        )
+        self.assertNotEqual(
+            FilterCacheService.cache_key(self.case, state, 'all', 'summary'),
+            FilterCacheService.cache_key(self.case, {**same, 'category': ['生活費']}, 'all', 'summary'),
+        )
+
+        url = reverse('analysis-dashboard', args=[self.case.pk])
+        params = {'tab': 'all', 'bank': ['B銀行', 'A銀行'], 'keyword': '買物 いおん', 'per_page': 25}
+        response = self.client.get(url, params)
+        self.assertEqual(response.context['all_txs_summary'](), {'count': 5, 'total_in': 100, 'total_out': 5000})
+        self.assertContains(response, "出金 5,000円 / 入金 100円")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {**params, 'bank': ['A銀行', 'B銀行']})
+        tx_queries = [q['sql'] for q in ctx.captured_queries if 'description_search' in q['sql']]
+        self.assertEqual(len(tx_queries), 1)
+        self.assertIn('"id" IN (', tx_queries[0])
+        self.assertEqual(len(response.context['all_txs']), 5)
+
+        self.case.transactions.filter(amount_in=0).delete()
+        response = self.client.get(url, params)
+        self.assertEqual(response.context['all_txs'].count, 4)
+        self.assertEqual(len(response.context['all_txs']), 4)
+
     def test_export_csv_all(self):
         """全取引CSVエクスポート"""
         Transaction.objects.create(
@@ -861,6 +2022,30 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8-sig')
 
+    def test_export_csv_streams_export_columns_only(self):
+        """CSVは出力カラムのみを逐次出力し、BOMは先頭に1回だけ付く"""
+        account = Account.objects.create(case=self.case, account_number="123", bank_name="テスト銀行")
+        Transaction.objects.bulk_create([
+            Transaction(case=self.case, account=account, date=date(2019, 5, 1), description="振込 カード",
+                        amount_out=1000, balance=None, is_flagged=True, memo="確認"),
+            Transaction(case=self.case, account=account, date=date(2019, 4, 30), description="現金",
+                        amount_in=500, balance=9000),
+        ])
+
+        response = self.client.get(reverse('export-csv', args=[self.case.pk, 'flagged']))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.count('\ufeff'), 1)
+        self.assertEqual(content.splitlines(), [
+            '\ufeff日付,銀行名,支店名,種別,口座番号,摘要,払戻,お預り,残高,分類,メモ',
+            'R1.5.1,テスト銀行,,,123,振込 カード,1000,0,,未分類,確認',
+        ])
+
+        response = self.client.get(reverse('export-csv-filtered', args=[self.case.pk]), {'keyword': 'ｶｰﾄﾞ'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('R1.5.1,テスト銀行'))
+
     def test_export_csv_no_data(self):
         """データなしCSVエクスポート（リダイレクト）"""
         response = self.client.get(reverse('export-csv', args=[self.case.pk, 'all']))
@@ -896,13 +2081,75 @@ class ViewsTest(TestCase):
         )
         self.assertIn('.xlsx', response['Content-Disposition'])
 
-        workbook = load_workbook(BytesIO(response.content))
+        workbook = load_workbook(BytesIO(response.getvalue()))
         self.assertIn("生活費", workbook.sheetnames)
         self.assertIn("給与", workbook.sheetnames)
         self.assertIn("50万円以上", workbook.sheetnames)
         self.assertIn("付箋付き", workbook.sheetnames)
         self.assertEqual(workbook["生活費"].max_row, 2)
         self.assertEqual(workbook["付箋付き"].max_row, 2)
+        self.assertEqual(workbook["50万円以上"].max_row, 2)
+        self.assertEqual(workbook["給与"]["H2"].value, 600000)
+        self.assertEqual(workbook["給与"]["H2"].number_format, '#,##0')
+        self.assertEqual(workbook["付箋付き"]["J2"].value, "入金元を確認")
+        # 共通スタイルを名前で適用する
+        self.assertEqual(workbook["生活費"]["A1"].style, 'ba_header')
+        self.assertEqual(workbook["生活費"]["G2"].style, 'ba_amount')
+        self.assertEqual(workbook["給与"]["H2"].style, 'ba_large')
+        self.assertEqual(workbook["付箋付き"]["F2"].style, 'ba_flagged')
+
+    def test_case_revision_advances_on_every_change(self):
+        """案件・口座・取引の保存、一括作成、QuerySet の更新・削除で版数が進む"""
+        def revision():
+            return Case.objects.get(pk=self.case.pk).revision
+
+        start = revision()
+        self.case.reference_date = date(2024, 3, 1)
+        self.case.save(update_fields=['reference_date'])
+        self.assertEqual(self.case.revision, start + 1)
+
+        account = Account.objects.create(case=self.case, account_number="1")
+        Transaction.objects.bulk_create([Transaction(case=self.case, account=account, description="a")])
+        self.assertEqual(revision(), start + 3)
+
+        self.case.transactions.update(category="生活費")
+        self.assertEqual(revision(), start + 4)
+        self.case.transactions.filter(category="該当なし").update(category="給与")
+        self.assertEqual(revision(), start + 4)
+
+        account.delete()
+        self.assertEqual(revision(), start + 5)
+
+    def test_export_reuses_artifact_until_case_changes(self):
+        """同じ版数の再ダウンロードは保存済みファイルを返し、変更後は作り直して古い版を消す"""
+        from django.core.management import call_command
+
+        tx = Transaction.objects.create(case=self.case, date=date(2024, 1, 15), description="初回", amount_out=1000)
+        url = reverse('export-csv', args=[self.case.pk, 'all'])
+
+        first = b''.join(self.client.get(url).streaming_content)
+        case_dir, = self.export_cache_dir.iterdir()
+        artifact, = case_dir.glob('*/all.csv')
+        artifact.write_bytes(first + b'cached')
+        self.assertEqual(b''.join(self.client.get(url).streaming_content), first + b'cached')
+
+        tx.description = "変更後"
+        tx.save()
+        content = b''.join(self.client.get(url).streaming_content).decode('utf-8')
+        self.assertIn("変更後", content)
+        self.assertFalse(artifact.exists())
+        self.assertEqual([d.name for d in case_dir.iterdir()], [str(Case.objects.get(pk=self.case.pk).revision)])
+
+        with override_settings(EXPORT_ACCEL_REDIRECT_URL='/bank-analyzer-exports/'):
+            response = self.client.get(reverse('export-xlsx-by-category', args=[self.case.pk]))
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['X-Accel-Redirect'].startswith(f'/bank-analyzer-exports/{case_dir.name}/'))
+        self.assertTrue(response['X-Accel-Redirect'].endswith('/category_500000.xlsx'))
+        self.assertIn('.xlsx', response['Content-Disposition'])
+
+        Case.objects.filter(pk=self.case.pk).delete()
+        call_command('purge_export_cache', stdout=StringIO())
+        self.assertEqual(list(self.export_cache_dir.iterdir()), [])
 
     def test_export_monthly_cashflow_xlsx_matches_displayed_table(self):
         """月次Excelは画面と同じく相続開始月以降を除外する"""
@@ -932,7 +2179,7 @@ class ViewsTest(TestCase):
         )
         self.assertIn('.xlsx', response['Content-Disposition'])
 
-        workbook = load_workbook(BytesIO(response.content), data_only=False)
+        workbook = load_workbook(BytesIO(response.getvalue()), data_only=False)
         sheet = workbook['月次入出金']
         self.assertEqual(sheet['B2'].value, 'テスト案件')
         self.assertEqual(sheet['A5'].value, '月')
@@ -1167,6 +2414,36 @@ class PassbookInventoryAccountTest(TestCase):
         self.client = Client()
         self.case = Case.objects.create(name="通帳テスト")
 
+    def _add_accounts(self, start, count):
+        for i in range(start, start + count):
+            account = Account.objects.create(case=self.case, account_number=f"{i:07d}", bank_name="A銀行")
+            for year, balance in ((2020, 100), (2022, 200), (2024, 300)):
+                Transaction.objects.create(
+                    case=self.case, account=account, date=date(year, 3, 1), balance=balance * (i + 1),
+                )
+
+    def test_inventory_page_and_export_use_constant_queries(self):
+        """年の有無・基準日残高は口座数によらず一定のクエリ数で求める"""
+        self.case.reference_date = date(2023, 1, 1)
+        self.case.save()
+        self._add_accounts(0, 2)
+        page_url = reverse('passbook-inventory', args=[self.case.pk])
+        export_url = reverse('export-passbook-inventory', args=[self.case.pk])
+
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(page_url)
+        with CaptureQueriesContext(connection) as small_export:
+            self.client.get(export_url)
+        rows = response.context['rows']
+        self.assertEqual([y['has'] for y in rows[0]['year_list']], [True, False, True, False, True])
+        self.assertEqual([r['auto_balance'] for r in rows], [200, 400])
+
+        self._add_accounts(2, 4)
+        with self.assertNumQueries(len(small_page)):
+            self.client.get(page_url)
+        with self.assertNumQueries(len(small_export)):
+            self.client.get(export_url)
+
     def test_add_certificate_account_without_transactions(self):
         response = self.client.post(reverse('add-certificate-account', args=[self.case.pk]), {
             'bank_name': 'みずほ銀行',
@@ -1229,6 +2506,82 @@ class PassbookInventoryAccountTest(TestCase):
         self.assertEqual(first.inventory_remarks, '証明書のみ')
         self.assertEqual(second.passbook_balance, 3000)
 
+    def test_import_certificate_accounts_accepts_full_width_amounts(self):
+        """全角数字・全角カンマの金額も取り込めること"""
+        import pandas as pd
+        from .views.passbook_inventory import _parse_certificate_rows
+
+        df = pd.DataFrame({
+            '銀行名': ['みずほ銀行', 'りそな銀行'],
+            '口座番号': ['1234567', '7654321'],
+            '残証残高': ['１０００００００', '２，５００'],
+            '通帳残高': ['', '３０００'],
+        })
+        rows = _parse_certificate_rows(df)
+        self.assertEqual(
+            [(row['certificate_balance'], row['passbook_balance']) for row in rows],
+            [(10000000, None), (2500, 3000)],
+        )
+
+    def test_import_certificate_accounts_upserts_in_bulk(self):
+        """取込は既存口座を更新・重複行をまとめ、行数によらず一定のクエリ数で保存する"""
+        from .views.passbook_inventory import _import_certificate_accounts
+
+        Account.objects.create(
+            case=self.case, account_number='1111111', bank_name='旧銀行', branch_name='本店',
+            certificate_balance=100, print_order=5,
+        )
+        rows = ''.join(f'新銀行{i},,{5000000 + i},"1,000"\n' for i in range(20))
+        csv = (
+            '銀行名,支店名,口座番号,残証残高\n'
+            '新銀行,,1111111,200\n'
+            ',,,999\n'
+            'A銀行,駅前,2222222,\n'
+            ',,2222222,300\n'
+            + rows
+        ).encode('utf-8')
+
+        with self.assertNumQueries(4):
+            counts = _import_certificate_accounts(self.case, SimpleUploadedFile('accounts.csv', csv))
+        self.assertEqual(counts, (21, 2, 1))
+
+        updated = Account.objects.get(case=self.case, account_number='1111111')
+        self.assertEqual((updated.bank_name, updated.branch_name), ('新銀行', '本店'))
+        self.assertEqual((updated.certificate_balance, updated.print_order), (200, 5))
+        merged = Account.objects.get(case=self.case, account_number='2222222')
+        self.assertEqual((merged.bank_name, merged.branch_name, merged.certificate_balance), ('A銀行', '駅前', 300))
+        self.assertEqual(merged.inventory_remarks, '取引履歴なし・残高証明書あり')
+        orders = list(
+            Account.objects.filter(case=self.case).exclude(account_number='1111111')
+            .order_by('print_order').values_list('print_order', flat=True)
+        )
+        self.assertEqual(orders, list(range(6, 27)))
+
+    def test_export_passbook_inventory_layout(self):
+        """Excel出力は見出しの結合・書式・合計行を保ったまま逐次書き出す"""
+        Account.objects.create(
+            case=self.case, account_number='1234567', bank_name='ゆうちょ銀行',
+            passbook_balance=1500000, certificate_balance=1500000,
+        )
+
+        response = self.client.get(reverse('export-passbook-inventory', args=[self.case.pk]))
+        self.assertTrue(response.streaming)
+        sheet = load_workbook(BytesIO(response.getvalue()))['通帳有無一覧表']
+
+        merged = {str(r) for r in sheet.merged_cells.ranges}
+        self.assertTrue({'A1:E1', 'A2:A3', 'E2:E3'} <= merged)
+        self.assertEqual(sheet['A1'].value, '通帳テスト  通帳有無一覧表')
+        self.assertEqual([sheet.cell(row=2, column=c).value for c in range(1, 6)],
+                         ['No', '銀行名', '支店名', '種類', '口座番号'])
+        self.assertEqual(sheet['B4'].value, 'ゆうちょ銀行')
+        self.assertEqual(sheet['B4'].fill.fgColor.rgb, '00FFDAB9')
+
+        passbook_col = [c.column for c in sheet[2] if c.value == '通帳\n残高'][0]
+        self.assertEqual(sheet.cell(row=4, column=passbook_col).number_format, '#,##0')
+        self.assertEqual(sheet.cell(row=16, column=1).value, '計')
+        self.assertEqual(sheet.cell(row=16, column=passbook_col).value, 1500000)
+        self.assertEqual(sheet.page_setup.orientation, 'landscape')
+
 
 class ParseAmountTest(TestCase):
     """parse_amount関数のテスト"""
@@ -62,4 +62,5 @@ from ..handlers import (
     api_get_field_values,
     api_update_reference_date,
     api_range_delete_preview,
+    api_get_changes,
 )
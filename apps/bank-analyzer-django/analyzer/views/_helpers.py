@@ -1,16 +1,29 @@
 """共通ユーティリティ関数"""
+import base64
+import binascii
+import csv
+import io
+import json
+import math
 import re
-from typing import Optional
+from datetime import date
+from functools import cached_property
+from itertools import batched
+from pathlib import Path
+from typing import Iterator, Optional
 from urllib.parse import quote
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.http import HttpRequest, HttpResponse
+from django.db.models import F, Q
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
-import pandas as pd
 
 from ..handlers import FIELD_LABELS, parse_amount
-from ..templatetags.japanese_date import wareki
+from ..lib.xlsx_writer import XLSX_CONTENT_TYPE, XlsxWriter
+from ..services import ExportCacheService
+from ..templatetags.japanese_date import wareki_short
 
 ITEMS_PER_PAGE = 100
 PER_PAGE_OPTIONS = [25, 50, 100, 200]
@@ -36,6 +49,204 @@ def paginate(queryset, page, per_page=ITEMS_PER_PAGE):
         return paginator.page(paginator.num_pages)
 
 
+class KeysetPage:
+    """キーセット（シーク）方式で取得した1ページ分の取引
+
+    OFFSET を使わず「前ページ末尾の (ソート値, ID) より後ろ」を LIMIT 付きで取得するため、
+    深いページでも先頭ページと同じコストで表示できる。総件数は count 参照時にだけ計算する。
+    ページ移動用のトークン（next_token など）はURLにそのまま埋め込める不透明な文字列。
+    """
+
+    def __init__(self, object_list, number, per_page, token, next_token, previous_token, count_func):
+        self.object_list = object_list
+        self.number = number
+        self.per_page = per_page
+        self.token = token
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.last_token = _encode_page_token({'d': 'last'})
+        self._count_func = count_func
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_token is not None
+
+    def start_index(self) -> int:
+        return (self.number - 1) * self.per_page + 1 if self.object_list else 0
+
+    def end_index(self) -> int:
+        return (self.number - 1) * self.per_page + len(self.object_list)
+
+    @cached_property
+    def count(self) -> int:
+        return self._count_func()
+
+    @property
+    def num_pages(self) -> int:
+        return max(math.ceil(self.count / self.per_page), 1)
+
+
+def _encode_page_token(data: dict) -> str:
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_page_token(token) -> dict | None:
+    """ページトークンを復元する（不正・旧形式のページ番号は None = 先頭ページ）"""
+    if not token or not isinstance(token, str):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('d') not in ('after', 'before', 'last'):
+        return None
+    if data['d'] != 'last':
+        key = data.get('k')
+        if not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], int)):
+            return None
+    if not isinstance(data.get('n'), int) or data['n'] < 1:
+        data['n'] = 1
+    return data
+
+
+def _parse_key_value(field: str, value):
+    """トークンの並び替えキーを列の型に戻す（型が合わない場合は ValueError）
+
+    トークンは並び替えを変えたURLにも残りうるため、日付列は ISO 形式の文字列、
+    金額列は整数だけを受け付ける。
+    """
+    if value is None:
+        return None
+    if field == 'date':
+        if not isinstance(value, str):
+            raise ValueError(f"日付ではないキーです: {value!r}")
+        return date.fromisoformat(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"整数ではないキーです: {value!r}")
+    return value
+
+
+def _keyset_order(field: str, descending: bool) -> list:
+    """(field, id) の並び順。NULL は最小値として扱う（昇順で先頭・降順で末尾）"""
+    if descending:
+        return [F(field).desc(nulls_last=True), '-id']
+    return [F(field).asc(nulls_first=True), 'id']
+
+
+def _keyset_after(field: str, value, pk: int, descending: bool) -> Q:
+    """_keyset_order の並びで (value, pk) より後ろにある行の条件"""
+    if descending:
+        if value is None:
+            return Q(**{f'{field}__isnull': True, 'id__lt': pk})
+        return (
+            Q(**{f'{field}__lt': value})
+            | Q(**{field: value, 'id__lt': pk})
+            | Q(**{f'{field}__isnull': True})
+        )
+    if value is None:
+        return Q(**{f'{field}__isnull': True, 'id__gt': pk}) | Q(**{f'{field}__isnull': False})
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+
+
+def keyset_order_by(sort_param: str) -> list:
+    """キーセット方式のページネーションと同じ並び順（先頭ページのID取得などに使う）"""
+    field, direction = parse_sort(sort_param)
+    return _keyset_order(field, direction == 'desc')
+
+
+def keyset_paginate(
+    queryset, token, sort_param, per_page=ITEMS_PER_PAGE, count_func=None, first_page_ids=None,
+) -> KeysetPage:
+    """
+    取引QuerySetをキーセット方式でページ分割する
+
+    Args:
+        queryset: 並び順未指定でよい取引QuerySet（並び順は sort_param から決める）
+        token: ページトークン（空・不正なら先頭ページ）
+        sort_param: ソートパラメータ（VALID_SORT_FIELDS の並び）
+        per_page: 1ページの件数
+        count_func: 総件数を返す関数（省略時は queryset.count）
+        first_page_ids: 先頭ページの取引ID（per_page + 1 件まで）を返す関数。
+            指定すると先頭ページはこのIDで取得する（キャッシュ済みIDの利用）
+
+    Returns:
+        KeysetPage
+    """
+    field, direction = parse_sort(sort_param)
+    descending = direction == 'desc'
+    count_func = count_func or queryset.count
+    state = _decode_page_token(token)
+    if state and state['d'] != 'last':
+        try:
+            state['k'] = [_parse_key_value(field, state['k'][0]), state['k'][1]]
+        except ValueError:
+            # 並び替えの異なるトークン・改変されたトークンは先頭ページとして扱う
+            state = None
+    if state is None:
+        token = ''
+        state = {'d': 'after', 'k': None, 'n': 1}
+
+    def key_of(obj) -> list:
+        value = getattr(obj, field)
+        return [value.isoformat() if isinstance(value, date) else value, obj.pk]
+
+    def seek(key, reverse: bool):
+        qs = queryset
+        if key is not None:
+            qs = qs.filter(_keyset_after(field, key[0], key[1], descending != reverse))
+        return qs.order_by(*_keyset_order(field, descending != reverse))
+
+    count = None
+    if state['d'] == 'last':
+        # 最終ページは逆順に端数分だけ取得する
+        count = count_func()
+        num_pages = max(math.ceil(count / per_page), 1)
+        rows = list(seek(None, reverse=True)[:count - (num_pages - 1) * per_page])[::-1]
+        number, has_next, has_previous = num_pages, False, num_pages > 1
+    elif state['d'] == 'before':
+        rows = list(seek(state['k'], reverse=True)[:per_page + 1])[::-1]
+        has_previous = len(rows) > per_page
+        rows = rows[-per_page:]
+        number = max(state['n'], 2) if has_previous else 1
+        has_next = True
+    else:
+        if state['k'] is None and first_page_ids is not None:
+            ids = first_page_ids()
+            by_pk = {obj.pk: obj for obj in queryset.filter(pk__in=ids)}
+            rows = [by_pk[pk] for pk in ids if pk in by_pk]
+        else:
+            rows = list(seek(state['k'], reverse=False)[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = state['k'] is not None
+        number = max(state['n'], 2) if has_previous else 1
+
+    if not rows and (state['d'] != 'after' or state['k'] is not None):
+        # データ変更で位置がなくなった場合は先頭ページを表示する
+        return keyset_paginate(queryset, None, sort_param, per_page, count_func)
+
+    page = KeysetPage(
+        rows, number, per_page,
+        token=token,
+        next_token=_encode_page_token({'d': 'after', 'k': key_of(rows[-1]), 'n': number + 1}) if has_next else None,
+        previous_token=_encode_page_token({'d': 'before', 'k': key_of(rows[0]), 'n': number - 1}) if has_previous else None,
+        count_func=count_func,
+    )
+    if count is not None:
+        page.count = count
+    return page
+
+
 def sanitize_filename(name: str) -> str:
     """ファイル名に使用できない文字を除去する"""
     sanitized = re.sub(r'[\\/:*?"<>|]', '_', name)
@@ -164,7 +375,7 @@ def get_export_columns(df_columns, *, include_memo: bool = False, exclude_balanc
     """エクスポート用カラムとヘッダーを構築する共通処理
 
     Args:
-        df_columns: DataFrameのカラム一覧（df.columns）
+        df_columns: DataFrameのカラム一覧（df.columns）または出力可能なカラム名のリスト
         include_memo: メモ列を含めるか
         exclude_balance: 残高列を除外するか
 
@@ -181,26 +392,78 @@ def get_export_columns(df_columns, *, include_memo: bool = False, exclude_balanc
     return cols, headers
 
 
-def prepare_export_df(df: pd.DataFrame, include_memo: bool = False) -> tuple[pd.DataFrame, list[str]]:
-    """エクスポート用DataFrame準備: カラム選択 + 和暦変換 + ヘッダー日本語化"""
-    cols_to_export, headers = get_export_columns(df.columns, include_memo=include_memo)
-    export_df = df[cols_to_export].copy()
+# CSV/Excel出力時にサーバーサイドカーソルから1回に取得する行数
+EXPORT_CHUNK_SIZE = 2000
+
+# エクスポートの出力対象になり得るカラム（FIELD_LABELS + メモ）
+EXPORT_FIELDS = [*FIELD_LABELS, 'memo']
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8-sig'
+
+
+def iter_csv_chunks(transactions, include_memo: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """取引QuerySetをBOM付きUTF-8のCSV断片として逐次返す
 
-    if 'date' in export_df.columns:
-        export_df['date'] = export_df['date'].apply(lambda d: wareki(d, 'short'))
+    出力カラムのみを values_list で取得し、日付は和暦へ変換する（変換結果は日付ごとにキャッシュされる）。
 
-    export_df.columns = headers
-    return export_df, headers
+    Args:
+        transactions: with_account_info() 済みの取引QuerySet
+        include_memo: メモ列を含めるか
+        chunk_size: サーバーサイドカーソルの取得件数（出力もこの単位でまとめる）
+    """
+    cols, headers = get_export_columns(EXPORT_FIELDS, include_memo=include_memo)
+    date_idx = cols.index('date')
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    buf.write('\ufeff')
+    writer.writerow(headers)
+
+    rows = transactions.values_list(*cols).iterator(chunk_size=chunk_size)
+    for chunk in batched(rows, chunk_size):
+        for row in chunk:
+            row = list(row)
+            row[date_idx] = wareki_short(row[date_idx])
+            writer.writerow(row)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def build_xlsx_response(writer: XlsxWriter, filename: str) -> FileResponse:
+    """write_only ワークブックを一時ファイルに保存し、ファイルから逐次送信する"""
+    response = FileResponse(writer.save(), content_type=XLSX_CONTENT_TYPE)
+    set_download_filename(response, filename)
+    return response
 
 
-def build_csv_response(df: pd.DataFrame, filename: str, include_memo: bool = False) -> HttpResponse:
-    """DataFrameからCSVレスポンスを生成する共通処理"""
-    export_df, _ = prepare_export_df(df, include_memo)
+def build_artifact_response(path: Path, filename: str, content_type: str) -> HttpResponse:
+    """キャッシュ済みのエクスポート成果物を送信する
 
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
+    EXPORT_ACCEL_REDIRECT_URL が設定されていれば本文は Nginx に送らせ（X-Accel-Redirect）、
+    未設定なら Django からファイルを逐次送信する。
+    """
+    accel_url = settings.EXPORT_ACCEL_REDIRECT_URL
+    if accel_url:
+        relative = path.relative_to(ExportCacheService.cache_dir()).as_posix()
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_url.rstrip('/') + '/' + quote(relative)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
     set_download_filename(response, filename)
-    export_df.to_csv(response, index=False, encoding='utf-8-sig')
+    return response
+
 
+def build_csv_response(transactions, filename: str, include_memo: bool = False) -> StreamingHttpResponse:
+    """取引QuerySetからCSVレスポンスを逐次生成する共通処理"""
+    response = StreamingHttpResponse(
+        iter_csv_chunks(transactions, include_memo),
+        content_type=CSV_CONTENT_TYPE,
+    )
+    set_download_filename(response, filename)
     return response
 
 
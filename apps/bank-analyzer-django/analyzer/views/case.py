@@ -3,9 +3,10 @@ from django.contrib import messages
 from django.shortcuts import render
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from django.db.models import Count, Q
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
-from ..models import Case
+from ..models import Account, Case, Transaction
 from ..forms import CaseForm
 from ..lib.constants import UNCATEGORIZED
 
@@ -22,19 +23,20 @@ class CaseListView(ListView):
     ordering = ['-created_at']
 
     def get_queryset(self):
+        # 取引数は口座の集計値を合計し、取引と口座の結合（件数の積）を避ける
+        accounts = Account.objects.filter(case=OuterRef('pk')).order_by().values('case')
+        unclassified = (
+            Transaction.objects.filter(case=OuterRef('pk'), category=UNCATEGORIZED)
+            .order_by().values('case')
+        )
         return (
             Case.objects.order_by('-created_at')
             .annotate(
-                tx_count=Count('transactions', distinct=True),
-                unclassified_count=Count(
-                    'transactions',
-                    filter=Q(transactions__category=UNCATEGORIZED),
-                    distinct=True,
-                ),
-                account_count=Count(
-                    'accounts',
-                    distinct=True,
+                tx_count=Coalesce(Subquery(accounts.annotate(total=Sum('tx_count')).values('total')), 0),
+                unclassified_count=Coalesce(
+                    Subquery(unclassified.annotate(count=Count('id')).values('count')), 0,
                 ),
+                account_count=Coalesce(Subquery(accounts.annotate(count=Count('id')).values('count')), 0),
             )
         )
 
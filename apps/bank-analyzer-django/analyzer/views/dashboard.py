@@ -1,12 +1,17 @@
 """分析ダッシュボードビュー"""
+import functools
+import hashlib
 import json
 import logging
 
 import pandas as pd
 from django.contrib import messages
+from django.core.cache import cache
 from django.db.models import Sum, Count, Min, Max, Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
 from ..models import Case
 from ..lib import config
@@ -17,9 +22,17 @@ from ..lib.constants import (
     sort_patterns_dict,
 )
 from ..lib.text_utils import filter_by_keyword
-from ..services import ClassificationHistoryService, TransactionService, AnalysisService
+from ..services import (
+    AISuggestionService,
+    AnalysisService,
+    ClassificationHistoryService,
+    FilterCacheService,
+    TransactionService,
+)
 from ..templatetags.japanese_date import wareki_month_short
 from ..handlers import (
+    case_conditional,
+    case_version_token,
     handle_run_classifier,
     handle_apply_rules,
     handle_delete_account,
@@ -44,9 +57,12 @@ from ..handlers import (
     handle_get_category_keywords,
     handle_preview_pattern_impact,
     handle_bulk_pattern_changes,
+    handle_regenerate_ai_suggestions,
     handle_run_auto_classify,
 )
-from ._helpers import paginate, build_filter_state, get_sort_order_by, get_per_page
+from ._helpers import (
+    paginate, keyset_paginate, keyset_order_by, build_filter_state, get_sort_order_by, get_per_page,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +76,20 @@ ANALYSIS_TABS = {
     'flagged',
 }
 
+# 描画結果をキャッシュするタブのテンプレート（概要タブは本体テンプレートに含まれるため対象外）
+_TAB_TEMPLATES = {
+    'all': 'analyzer/partials/_tab_all.html',
+    'unclassified': 'analyzer/partials/_tab_unclassified.html',
+    'ai': 'analyzer/partials/_tab_ai.html',
+    'transfers': 'analyzer/partials/_tab_transfers.html',
+    'cleanup': 'analyzer/partials/_tab_cleanup.html',
+    'flagged': 'analyzer/partials/_tab_flagged.html',
+}
+# タブの外（ナビゲーション等）でも使うタブ固有のコンテキスト
+_TAB_OUTER_KEYS = ('suggestions_count',)
+# タブ断片キャッシュの有効期間（秒）
+TAB_FRAGMENT_TIMEOUT = 60 * 5
+
 # 分析ダッシュボードのアクション → ハンドラー関数マッピング
 _ANALYSIS_ACTION_HANDLERS = {
     'run_classifier': handle_run_classifier,
@@ -87,6 +117,7 @@ _ANALYSIS_ACTION_HANDLERS = {
     'preview_pattern_impact': handle_preview_pattern_impact,
     'bulk_pattern_changes': handle_bulk_pattern_changes,
     'run_auto_classify': handle_run_auto_classify,
+    'regenerate_ai_suggestions': handle_regenerate_ai_suggestions,
 }
 
 
@@ -99,12 +130,30 @@ def _handle_analysis_post(request: HttpRequest, case: Case, pk: int) -> HttpResp
     return redirect('analysis-dashboard', pk=pk)
 
 
-def _filter_and_paginate(queryset, keyword, page, per_page):
-    """キーワードフィルタ適用 + ページネーション"""
-    if keyword:
-        filtered = filter_by_keyword(queryset, keyword)
-        return filtered.count(), paginate(filtered, page, per_page)
-    return queryset.count(), paginate(queryset, page, per_page)
+def _filter_and_paginate(case, queryset, filter_state, scope, token, per_page):
+    """絞り込み済みQuerySetをキーセット方式でページ分割する
+
+    件数・入出金合計と先頭ページの取引IDは絞り込み条件と案件の版数をキーにキャッシュし、
+    件数はテンプレートで参照されたときだけ求める。
+
+    Returns:
+        (ページ, 件数・入出金合計を返す関数) のタプル
+    """
+    sort_param = filter_state.get('sort', '')
+
+    @functools.cache
+    def summary():
+        return FilterCacheService.get_summary(case, queryset, filter_state, scope)
+
+    page = keyset_paginate(
+        queryset, token, sort_param, per_page,
+        count_func=lambda: summary()['count'],
+        first_page_ids=lambda: FilterCacheService.get_first_page_ids(
+            case, queryset.order_by(*keyset_order_by(sort_param)), filter_state, scope,
+            sort_key=sort_param or 'date_asc', limit=per_page + 1,
+        ),
+    )
+    return page, summary
 
 
 def _build_selection_options(case):
@@ -247,16 +296,41 @@ def _build_unclassified_context(request, case, sort_order, keyword):
     ).order_by(*sort_order)
     group_data = AnalysisService.build_unclassified_groups(unclassified_qs, keyword)
     group_page = paginate(group_data['groups'], request.GET.get('group_page', 1), 50)
+    group_page.object_list = AnalysisService.fill_group_details(group_page.object_list, unclassified_qs)
 
     return {
         'unclassified_groups': group_page,
-        'unclassified_group_count': len(group_data['groups']),
+        'unclassified_group_count': group_page.paginator.count,
         'unclassified_tx_total': group_data['tx_total'],
         'max_group_count': group_data['max_group_count'],
         'group_suggestions_json': AnalysisService.build_group_suggestions(group_page, case),
     }
 
 
+def _build_ai_context(request, case):
+    """AI分類タブの表示データを構築（事前計算済みの候補をページ単位で読む）"""
+    fuzzy_threshold = config.get_fuzzy_config().get('threshold', 90)
+    try:
+        fuzzy_threshold = min(max(int(request.GET.get('fuzzy_threshold', fuzzy_threshold)), 70), 100)
+    except (TypeError, ValueError):
+        pass
+
+    ai_data = AISuggestionService.build_tab_data(case, fuzzy_threshold)
+    group_page = paginate(ai_data['groups'], request.GET.get('ai_group_page', 1), 50)
+    group_page.object_list = AISuggestionService.fill_group_tx_ids(group_page.object_list, case)
+    tx_page = paginate(ai_data['transactions'], request.GET.get('ai_page', 1), 100)
+    tx_page.object_list = AISuggestionService.format_transactions(tx_page.object_list, ai_data['score_floor'])
+
+    return {
+        'ai_groups': group_page,
+        'ai_suggestions': tx_page,
+        'suggestions_count': ai_data['suggestions_count'],
+        'fuzzy_threshold': fuzzy_threshold,
+        'global_patterns': sort_patterns_dict(config.get_classification_patterns()),
+        'case_patterns': sort_patterns_dict(case.custom_patterns or {}),
+    }
+
+
 def _build_active_tab_context(request, case, active_tab, filter_state):
     """表示対象タブに必要なデータだけを構築する。"""
     keyword = filter_state.get('keyword', '')
@@ -273,22 +347,24 @@ def _build_active_tab_context(request, case, active_tab, filter_state):
 
     if active_tab == 'all':
         filtered = AnalysisService.apply_filters(transactions, filter_state)
-        all_txs_count, all_txs_page = _filter_and_paginate(
-            filtered, '', request.GET.get('page', 1), per_page,
+        all_txs_page, all_txs_summary = _filter_and_paginate(
+            case, filtered, filter_state, 'all', request.GET.get('page'), per_page,
         )
         return {
             'all_txs': all_txs_page,
-            'all_txs_count': all_txs_count,
+            'all_txs_summary': all_txs_summary,
         }
 
     if active_tab == 'unclassified':
         unclassified_qs = transactions.filter(
             category=UNCATEGORIZED,
         )
-        _, unclassified_page = _filter_and_paginate(
-            unclassified_qs,
-            keyword,
-            request.GET.get('unclassified_page', 1),
+        unclassified_page, _ = _filter_and_paginate(
+            case,
+            filter_by_keyword(unclassified_qs, keyword),
+            filter_state,
+            'unclassified',
+            request.GET.get('unclassified_page'),
             per_page,
         )
         return {
@@ -302,26 +378,7 @@ def _build_active_tab_context(request, case, active_tab, filter_state):
         }
 
     if active_tab == 'ai':
-        ai_data = AnalysisService._build_ai_suggestions(case, filter_state)
-        ai_groups = ai_data.get('ai_groups', [])
-        return {
-            **ai_data,
-            'high_confidence_groups': [
-                group for group in ai_groups if group.get('score', 0) >= 95
-            ],
-            'high_confidence_tx_count': sum(
-                group.get('count', 0)
-                for group in ai_groups
-                if group.get('score', 0) >= 95
-            ),
-            'ai_groups_json': json.dumps(
-                [{key: value for key, value in group.items() if key != 'sample_date'}
-                 for group in ai_groups],
-                ensure_ascii=False,
-            ),
-            'global_patterns': sort_patterns_dict(config.get_classification_patterns()),
-            'case_patterns': sort_patterns_dict(case.custom_patterns or {}),
-        }
+        return _build_ai_context(request, case)
 
     if active_tab in {'transfers', 'cleanup'}:
         df = pd.DataFrame(list(transactions.values()))
@@ -348,6 +405,39 @@ def _build_active_tab_context(request, case, active_tab, filter_state):
     }
 
 
+def _tab_fragment_key(request, case, active_tab) -> str:
+    """タブ断片のキャッシュキー（案件の版数・設定・CSRFクッキー・クエリ文字列で決まる）"""
+    query = json.dumps(sorted(request.GET.lists()), ensure_ascii=False)
+    digest = hashlib.sha256(query.encode('utf-8')).hexdigest()[:32]
+    token = case_version_token(request, case.pk, case.created_at, case.revision)
+    return f"analyzer:tab:{token}:{active_tab}:{digest}"
+
+
+def _render_active_tab(request, case, active_tab, filter_state, context) -> dict:
+    """
+    表示対象タブのコンテキストを構築し、描画済みHTMLを active_tab_html に入れて返す
+
+    同じ版数・条件での再表示はキャッシュ済みのHTMLを使い、タブのデータ構築を省く。
+    """
+    template = _TAB_TEMPLATES.get(active_tab)
+    if template is None:
+        return _build_active_tab_context(request, case, active_tab, filter_state)
+
+    key = _tab_fragment_key(request, case, active_tab)
+    cached = cache.get(key)
+    if cached is not None:
+        return {**cached['context'], 'active_tab_html': mark_safe(cached['html'])}
+
+    tab_context = _build_active_tab_context(request, case, active_tab, filter_state)
+    html = render_to_string(template, {**context, **tab_context}, request)
+    cache.set(key, {
+        'html': str(html),
+        'context': {k: tab_context[k] for k in _TAB_OUTER_KEYS if k in tab_context},
+    }, TAB_FRAGMENT_TIMEOUT)
+    return {**tab_context, 'active_tab_html': html}
+
+
+@case_conditional
 def analysis_dashboard(request: HttpRequest, pk: int) -> HttpResponse:
     """分析・表示ダッシュボード"""
     case = get_object_or_404(Case, pk=pk)
@@ -395,8 +485,8 @@ def analysis_dashboard(request: HttpRequest, pk: int) -> HttpResponse:
         'latest_deletion_backup': case.deletion_backups.filter(restored_at__isnull=True).first(),
         'latest_classification_change': ClassificationHistoryService.latest_summary(case),
         **_build_selection_options(case),
-        **_build_active_tab_context(request, case, active_tab, filter_state),
     }
+    context.update(_render_active_tab(request, case, active_tab, filter_state, context))
 
     return render(request, 'analyzer/analysis.html', context)
 
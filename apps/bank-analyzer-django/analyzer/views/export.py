@@ -1,30 +1,30 @@
 """エクスポートビュー"""
+import hashlib
 import json
 import logging
-from datetime import datetime
-from io import BytesIO
 
 from django.contrib import messages
-from django.db.models import Sum
+from django.db.models import Count, Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
-import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.properties import PageSetupProperties
 
 from ..models import Case
-from ..handlers import FIELD_LABELS, parse_amount
+from ..handlers import case_conditional, parse_amount
 from ..lib import config
 from ..lib.constants import sort_categories
-from ..lib.text_utils import df_filter_by_keyword
-from ..services import AnalysisService
-from ..templatetags.japanese_date import wareki, wareki_month_short
+from ..lib.xlsx_styles import (
+    STYLE_AMOUNT, STYLE_BANNER, STYLE_DATE, STYLE_FLAGGED, STYLE_HEADER, STYLE_LABEL,
+    STYLE_LARGE, STYLE_VALUE, register_styles,
+)
+from ..lib.xlsx_writer import XLSX_CONTENT_TYPE, XlsxWriter
+from ..services import AnalysisService, BackupService, ExportCacheService
+from ..templatetags.japanese_date import wareki_month_short, wareki_short
 from ._helpers import (
-    sanitize_filename, set_download_filename, build_filter_state,
-    build_filtered_filename, require_transactions, prepare_export_df,
-    build_csv_response, get_export_columns,
+    sanitize_filename, build_filter_state,
+    build_filtered_filename, require_transactions, build_csv_response, build_artifact_response,
+    iter_csv_chunks, get_export_columns, CSV_CONTENT_TYPE, EXPORT_FIELDS, EXPORT_CHUNK_SIZE,
 )
 
 logger = logging.getLogger(__name__)
@@ -37,77 +37,52 @@ _EXPORT_TYPE_CONFIG = {
 }
 
 
+@case_conditional
 def export_json(request: HttpRequest, pk: int) -> HttpResponse:
-    """案件データをJSONでバックアップエクスポート"""
+    """
+    案件データをJSONでバックアップエクスポート
+
+    取引はサーバーサイドカーソルで読み出しながらファイルへ書き出し、
+    案件の版数・設定が変わるまでは同じファイルを再利用する。
+    ?compact=1 でインデントなし、?gzip=1 でgzip圧縮（.json.gz）、
+    ?format=parquet で列指向バックアップ（.zip）。
+    """
     logger.info(f"JSONエクスポート開始: case_id={pk}")
     case = get_object_or_404(Case, pk=pk)
-    transactions = case.transactions.all().order_by('date', 'id')
+    transactions = case.transactions.all()
 
     empty_redirect = require_transactions(request, transactions, pk, 'analysis-dashboard')
     if empty_redirect:
         return empty_redirect
 
-    totals = transactions.aggregate(total_in=Sum('amount_in'), total_out=Sum('amount_out'))
-
-    # 口座情報をアノテーションして取得
-    transactions_with_account = transactions.with_account_info()
-    export_fields = [
-        'date', 'bank_name', 'branch_name', 'account_type', 'account_number',
-        'description', 'amount_out', 'amount_in', 'balance',
-        'category', 'holder', 'is_large', 'is_transfer', 'transfer_to',
-        'is_flagged', 'memo',
-    ]
-    transactions_data = []
-    for tx_dict in transactions_with_account.values(*export_fields):
-        if tx_dict['date']:
-            tx_dict['date'] = tx_dict['date'].isoformat()
-        transactions_data.append(tx_dict)
-
-    accounts_data = []
-    for acc in case.accounts.all().order_by('print_order', 'bank_name', 'branch_name'):
-        accounts_data.append({
-            'account_number': acc.account_number,
-            'bank_name': acc.bank_name,
-            'branch_name': acc.branch_name,
-            'account_type': acc.account_type,
-            'holder': acc.holder,
-            'passbook_balance': acc.passbook_balance,
-            'certificate_balance': acc.certificate_balance,
-            'has_accrued_interest': acc.has_accrued_interest,
-            'passbook_years': acc.passbook_years,
-            'inventory_remarks': acc.inventory_remarks,
-            'print_order': acc.print_order,
-        })
-
-    export_data = {
-        'version': '1.1',
-        'exported_at': datetime.now().isoformat(),
-        'case': {
-            'name': case.name,
-            'created_at': case.created_at.isoformat() if case.created_at else None,
-            'reference_date': case.reference_date.isoformat() if case.reference_date else None,
-        },
-        'accounts': accounts_data,
-        'transactions': transactions_data,
-        'statistics': {
-            'total_transactions': len(transactions_data),
-            'total_in': totals['total_in'] or 0,
-            'total_out': totals['total_out'] or 0,
-        },
-        'settings': config.load_user_settings(),
-    }
-
-    response = HttpResponse(
-        json.dumps(export_data, ensure_ascii=False, indent=2),
-        content_type='application/json; charset=utf-8'
-    )
-    filename = f"{sanitize_filename(case.name)}_backup.json"
-    set_download_filename(response, filename)
+    compact = request.GET.get('compact') == '1'
+    compress = request.GET.get('gzip') == '1'
+    user_settings = config.load_user_settings()
+    settings_key = hashlib.sha256(
+        json.dumps(user_settings, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()[:12]
+
+    if request.GET.get('format') == 'parquet':
+        path = ExportCacheService.get_or_build(
+            case, f"backup_{settings_key}.zip",
+            lambda f: BackupService.write_archive(case, f, user_settings=user_settings),
+        )
+        return build_artifact_response(path, f"{sanitize_filename(case.name)}_backup.zip", 'application/zip')
 
-    logger.info(f"JSONエクスポート完了: case_id={pk}, transactions={len(transactions_data)}")
-    return response
+    extension = '.json.gz' if compress else '.json'
 
+    def build(f):
+        chunks = BackupService.iter_json(case, indent=None if compact else 2, user_settings=user_settings)
+        f.writelines(BackupService.iter_gzip(chunks) if compress else (c.encode('utf-8') for c in chunks))
 
+    path = ExportCacheService.get_or_build(
+        case, f"backup{'_compact' if compact else ''}_{settings_key}{extension}", build,
+    )
+    content_type = 'application/gzip' if compress else 'application/json; charset=utf-8'
+    return build_artifact_response(path, f"{sanitize_filename(case.name)}_backup{extension}", content_type)
+
+
+@case_conditional
 def export_csv(request: HttpRequest, pk: int, export_type: str) -> HttpResponse:
     """取引データをCSVでエクスポート"""
     logger.info(f"CSVエクスポート開始: case_id={pk}, type={export_type}")
@@ -118,24 +93,29 @@ def export_csv(request: HttpRequest, pk: int, export_type: str) -> HttpResponse:
     if empty_redirect:
         return empty_redirect
 
-    df = pd.DataFrame(list(transactions.with_account_info().values()))
-
     config_entry = _EXPORT_TYPE_CONFIG.get(export_type)
     if config_entry:
         filter_field, suffix = config_entry
         if filter_field:
-            df = df[df[filter_field]].copy()
+            transactions = transactions.filter(**{filter_field: True})
         filename = f"{sanitize_filename(case.name)}_{suffix}.csv"
     else:
         filename = f"{sanitize_filename(case.name)}_取引データ.csv"
 
-    if df.empty:
+    if not transactions.exists():
         messages.warning(request, "該当するデータがありません。")
         return redirect('analysis-dashboard', pk=pk)
 
-    return build_csv_response(df, filename, include_memo=(export_type == 'flagged'))
+    include_memo = export_type == 'flagged'
+    path = ExportCacheService.get_or_build(
+        case,
+        f"{export_type if config_entry else 'all'}.csv",
+        lambda f: f.writelines(iter_csv_chunks(transactions.with_account_info(), include_memo)),
+    )
+    return build_artifact_response(path, filename, CSV_CONTENT_TYPE)
 
 
+@case_conditional
 def export_csv_filtered(request: HttpRequest, pk: int) -> HttpResponse:
     """絞り込み条件付きでCSVエクスポート"""
     logger.info(f"絞り込みCSVエクスポート開始: case_id={pk}")
@@ -143,6 +123,7 @@ def export_csv_filtered(request: HttpRequest, pk: int) -> HttpResponse:
 
     filter_state = build_filter_state(request)
     transactions = case.transactions.with_account_info().order_by('date', 'id')
+    # キーワードを含む絞り込みはすべてDB側で適用する
     transactions = AnalysisService.apply_filters(transactions, filter_state)
 
     amount_min_val, amount_min_ok = parse_amount(filter_state['amount_min']) if filter_state['amount_min'] else (None, True)
@@ -154,23 +135,16 @@ def export_csv_filtered(request: HttpRequest, pk: int) -> HttpResponse:
     if empty_redirect:
         return empty_redirect
 
-    df = pd.DataFrame(list(transactions.values()))
-
-    keyword = filter_state.get('keyword', '')
-    if keyword:
-        df = df_filter_by_keyword(df, keyword)
-        if df.empty:
-            messages.warning(request, "エクスポートするデータがありません。")
-            return redirect('analysis-dashboard', pk=pk)
-
     filename = build_filtered_filename(case.name, filter_state, amount_min, amount_max)
-
-    logger.info(f"絞り込みCSVエクスポート完了: case_id={pk}, count={len(df)}")
-    return build_csv_response(df, filename, include_memo=True)
+    return build_csv_response(transactions, filename, include_memo=True)
 
 
+@case_conditional
 def export_xlsx_by_category(request: HttpRequest, pk: int) -> HttpResponse:
-    """分類別にシート分けしたExcelファイルをエクスポート"""
+    """分類別にシート分けしたExcelファイルをエクスポート
+
+    案件の版数・多額取引の基準額が変わるまでは生成済みのファイルを再利用する。
+    """
     case = get_object_or_404(Case, pk=pk)
     transactions = case.transactions.all().order_by('date', 'id')
 
@@ -178,88 +152,89 @@ def export_xlsx_by_category(request: HttpRequest, pk: int) -> HttpResponse:
     if empty_redirect:
         return empty_redirect
 
-    df = pd.DataFrame(list(transactions.with_account_info().values()))
-
-    if 'date' in df.columns:
-        df['date'] = df['date'].apply(lambda d: wareki(d, 'short'))
-
-    cols_to_export, headers = get_export_columns(df.columns, exclude_balance=True)
-    flagged_cols, flagged_headers = get_export_columns(df.columns, include_memo=True, exclude_balance=True)
-
-    grouped = df.groupby('category')
-    sorted_cats = sort_categories(grouped.groups.keys())
+    threshold = config.load_user_settings().get('LARGE_AMOUNT_THRESHOLD', 500000)
+    path = ExportCacheService.get_or_build(
+        case,
+        f"category_{threshold}.xlsx",
+        lambda f: _build_category_workbook(transactions, threshold).write(f),
+    )
+    filename = f"{sanitize_filename(case.name)}_分類別取引.xlsx"
+    return build_artifact_response(path, filename, XLSX_CONTENT_TYPE)
 
-    # 金額カラムのインデックスを特定（1-based, ヘッダー行の次から）
-    amount_fields = {'amount_out', 'amount_in'}
 
-    def _format_sheet(ws, columns):
-        """金額カラムにカンマ区切り書式を適用 + A4縦・列幅1ページの印刷設定"""
-        # カンマ区切り書式
-        amount_col_indices = [i + 1 for i, c in enumerate(columns) if c in amount_fields]
-        for col_idx in amount_col_indices:
-            col_letter = get_column_letter(col_idx)
-            for cell in ws[col_letter]:
-                if cell.row > 1:
-                    cell.number_format = '#,##0'
-        # 印刷設定: A4縦、列幅を1ページに収める
-        ws.page_setup.paperSize = 9  # A4
-        ws.page_setup.orientation = 'portrait'
-        ws.page_setup.fitToWidth = 1
-        ws.page_setup.fitToHeight = 0
-        ws.sheet_properties.pageSetUpPr = PageSetupProperties(fitToPage=True)
+def _build_category_workbook(transactions, threshold: int) -> XlsxWriter:
+    """分類・多額取引・付箋付きの各シートを持つワークブックを組み立てる
 
-    wb = Workbook()
-    wb.remove(wb.active)
+    取引はサーバーサイドカーソルで1回だけ走査し、各シートへ write_only モードで振り分ける。
+    """
+    counts = transactions.aggregate(
+        large=Count('id', filter=Q(amount_out__gte=threshold) | Q(amount_in__gte=threshold)),
+        flagged=Count('id', filter=Q(is_flagged=True)),
+    )
+    categories = sort_categories(set(transactions.order_by().values_list('category', flat=True).distinct()))
+
+    cols_to_export, headers = get_export_columns(EXPORT_FIELDS, exclude_balance=True)
+    flagged_cols, flagged_headers = get_export_columns(EXPORT_FIELDS, include_memo=True, exclude_balance=True)
+    date_idx = flagged_cols.index('date')
+    out_idx = flagged_cols.index('amount_out')
+    in_idx = flagged_cols.index('amount_in')
+    desc_idx = flagged_cols.index('description')
+    category_idx = flagged_cols.index('category')
+    column_styles = {date_idx: STYLE_DATE, out_idx: STYLE_AMOUNT, in_idx: STYLE_AMOUNT}
+
+    writer = XlsxWriter()
+
+    def add_sheet(title, sheet_headers, tab_color=None):
+        sheet = writer.add_sheet(title, column_styles=column_styles, tab_color=tab_color)
+        sheet.append_header(sheet_headers)
+        return sheet
+
+    # シートは作成順に並ぶ: 分類 → 多額取引 → 付箋付き
+    category_sheets = {cat: add_sheet(cat, headers) for cat in categories}
+    large_sheet = add_sheet(f"{threshold // 10000}万円以上", headers, 'DC3545') if counts['large'] else None
+    flagged_sheet = add_sheet('付箋付き', flagged_headers, 'FF8C00') if counts['flagged'] else None
+
+    width = len(cols_to_export)
+
+    rows = (
+        transactions.with_account_info()
+        .values_list(*flagged_cols, 'is_flagged')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for *values, is_flagged in rows:
+        values[date_idx] = wareki_short(values[date_idx])
+        row = values[:width]
+        # 多額の金額・付箋付きの摘要はどのシートでも強調する
+        highlights = {idx: STYLE_LARGE for idx in (out_idx, in_idx) if values[idx] >= threshold}
+        if is_flagged:
+            highlights[desc_idx] = STYLE_FLAGGED
 
-    for cat in sorted_cats:
-        cat_df = grouped.get_group(cat)
-        ws = wb.create_sheet(title=str(cat)[:31])
-        ws.append(headers)
-        for _, row in cat_df[cols_to_export].iterrows():
-            ws.append([row[c] for c in cols_to_export])
-        _format_sheet(ws, cols_to_export)
+        category_sheets[values[category_idx]].append(row, highlights)
+        if large_sheet and (out_idx in highlights or in_idx in highlights):
+            large_sheet.append(row, highlights)
+        if flagged_sheet and is_flagged:
+            flagged_sheet.append(values, highlights)
 
-    # 多額取引シートを追加
-    threshold = config.load_user_settings().get('LARGE_AMOUNT_THRESHOLD', 500000)
-    large_df = df[(df['amount_out'] >= threshold) | (df['amount_in'] >= threshold)]
-    if not large_df.empty:
-        threshold_label = f"{threshold // 10000}万円以上"
-        ws = wb.create_sheet(title=threshold_label[:31])
-        ws.sheet_properties.tabColor = 'DC3545'
-        ws.append(headers)
-        for _, row in large_df[cols_to_export].iterrows():
-            ws.append([row[c] for c in cols_to_export])
-        _format_sheet(ws, cols_to_export)
-
-    # 付箋付き取引シートを末尾に追加
-    flagged_df = df[df['is_flagged'] == True]  # noqa: E712
-    if not flagged_df.empty:
-        ws = wb.create_sheet(title='付箋付き')
-        ws.sheet_properties.tabColor = 'FF8C00'
-        ws.append(flagged_headers)
-        for _, row in flagged_df[flagged_cols].iterrows():
-            ws.append([row[c] for c in flagged_cols])
-        _format_sheet(ws, flagged_cols)
-
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-
-    response = HttpResponse(
-        buf.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    filename = f"{sanitize_filename(case.name)}_分類別取引.xlsx"
-    set_download_filename(response, filename)
-    return response
+    return writer
 
 
+@case_conditional
 def export_monthly_cashflow_xlsx(request: HttpRequest, pk: int) -> HttpResponse:
     """月次入出金の表形式データをExcelでエクスポートする。"""
     case = get_object_or_404(Case, pk=pk)
+    path = ExportCacheService.get_or_build(
+        case, 'monthly_cashflow.xlsx', lambda f: _build_monthly_cashflow_workbook(case).save(f),
+    )
+    filename = f"{sanitize_filename(case.name)}_月次入出金.xlsx"
+    return build_artifact_response(path, filename, XLSX_CONTENT_TYPE)
+
+
+def _build_monthly_cashflow_workbook(case: Case) -> Workbook:
+    """月次入出金の表を1シートに組み立てる"""
     monthly_stats = AnalysisService.get_monthly_cashflow(case)
 
     wb = Workbook()
+    register_styles(wb)
     ws = wb.active
     ws.title = '月次入出金'
     ws.sheet_view.showGridLines = False
@@ -267,9 +242,7 @@ def export_monthly_cashflow_xlsx(request: HttpRequest, pk: int) -> HttpResponse:
     ws.merge_cells('A1:C1')
     title = ws['A1']
     title.value = '月次入出金'
-    title.font = Font(name='游ゴシック', size=16, bold=True, color='FFFFFF')
-    title.fill = PatternFill('solid', fgColor='2563EB')
-    title.alignment = Alignment(horizontal='left', vertical='center')
+    title.style = STYLE_BANNER
     ws.row_dimensions[1].height = 28
 
     ws['A2'] = 'お客様名'
@@ -280,20 +253,15 @@ def export_monthly_cashflow_xlsx(request: HttpRequest, pk: int) -> HttpResponse:
         if case.reference_date else '全期間'
     )
     for cell in ('A2', 'A3'):
-        ws[cell].font = Font(name='游ゴシック', bold=True, color='475569')
+        ws[cell].style = STYLE_LABEL
     for cell in ('B2', 'B3'):
-        ws[cell].font = Font(name='游ゴシック', color='0F172A')
+        ws[cell].style = STYLE_VALUE
 
     header_row = 5
     ws.append([])
     ws.append(['月', '出金', '入金'])
-    header_fill = PatternFill('solid', fgColor='E2E8F0')
-    header_border = Border(bottom=Side(style='thin', color='94A3B8'))
     for cell in ws[header_row]:
-        cell.font = Font(name='游ゴシック', bold=True, color='0F172A')
-        cell.fill = header_fill
-        cell.border = header_border
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+        cell.style = STYLE_HEADER
 
     for stat in monthly_stats:
         ws.append([
@@ -302,10 +270,10 @@ def export_monthly_cashflow_xlsx(request: HttpRequest, pk: int) -> HttpResponse:
             stat['total_in'] or 0,
         ])
 
-    for row in ws.iter_rows(min_row=header_row + 1, min_col=2, max_col=3):
-        for cell in row:
-            cell.number_format = '#,##0'
-            cell.alignment = Alignment(horizontal='right')
+    for month_cell, *amount_cells in ws.iter_rows(min_row=header_row + 1, max_col=3):
+        month_cell.style = STYLE_DATE
+        for cell in amount_cells:
+            cell.style = STYLE_AMOUNT
 
     ws.column_dimensions['A'].width = 14
     ws.column_dimensions['B'].width = 18
@@ -319,14 +287,5 @@ def export_monthly_cashflow_xlsx(request: HttpRequest, pk: int) -> HttpResponse:
     ws.page_setup.fitToHeight = 0
     ws.sheet_properties.pageSetUpPr = PageSetupProperties(fitToPage=True)
 
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    response = HttpResponse(
-        buf.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    filename = f"{sanitize_filename(case.name)}_月次入出金.xlsx"
-    set_download_filename(response, filename)
-    logger.info(f"月次入出金Excel出力: case_id={pk}, months={len(monthly_stats)}")
-    return response
+    logger.info(f"月次入出金Excel出力: case_id={case.pk}, months={len(monthly_stats)}")
+    return wb
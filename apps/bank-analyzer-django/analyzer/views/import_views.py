@@ -1,5 +1,5 @@
 """インポートビュー"""
-import json
+import gzip
 import logging
 
 from django.contrib import messages
@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 
 
 def import_json(request: HttpRequest) -> HttpResponse:
-    """JSONバックアップから新規案件を復元"""
+    """JSONバックアップ（または列指向バックアップの zip）から新規案件を復元"""
     if request.method == 'POST':
         form = JsonImportForm(request.POST, request.FILES)
         if form.is_valid():
@@ -24,10 +24,15 @@ def import_json(request: HttpRequest) -> HttpResponse:
             logger.info(f"JSONインポート開始: filename={json_file.name}, size={json_file.size}")
 
             try:
-                content = json_file.read().decode('utf-8')
-                data = json.loads(content)
                 restore_settings = form.cleaned_data.get('restore_settings', False)
-                new_case, tx_count = TransactionService.import_from_json(data, restore_settings)
+                # ファイル全体を読み込まず、取引をバッチ単位で逐次登録する
+                json_file.seek(0)
+                filename = json_file.name.lower()
+                if filename.endswith('.zip'):
+                    new_case, tx_count = TransactionService.import_from_archive(json_file, restore_settings)
+                else:
+                    fp = gzip.GzipFile(fileobj=json_file) if filename.endswith('.gz') else json_file
+                    new_case, tx_count = TransactionService.import_from_json_file(fp, restore_settings)
                 messages.success(
                     request,
                     f"「{new_case.name}」として{tx_count}件の取引を復元しました。"
@@ -9,15 +9,19 @@ from django.contrib import messages
 from django.db.models import Min, Max
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.properties import PageSetupProperties
 
 from ..models import Account, Case, Transaction
 from ..lib.constants import ERAS
+from ..services import AccountStatsService
+from ..lib.xlsx_styles import (
+    STYLE_INV_AMOUNT, STYLE_INV_BORDER, STYLE_INV_CENTER, STYLE_INV_HEADER, STYLE_INV_INFO,
+    STYLE_INV_NOTE, STYLE_INV_SUBTITLE, STYLE_INV_TEXT, STYLE_INV_TOTAL, STYLE_INV_TOTAL_LABEL,
+    STYLE_INV_YEAR, STYLE_TITLE,
+)
+from ..lib.xlsx_writer import XlsxWriter
+from ..handlers import case_conditional
 from ..templatetags.japanese_date import get_japanese_era, wareki as wareki_func
-from ._helpers import sanitize_filename, set_download_filename
+from ._helpers import build_xlsx_response, sanitize_filename
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +35,12 @@ CERTIFICATE_IMPORT_COLUMNS = {
     'has_accrued_interest': ('既経過利息', '既経過利息計算'),
     'inventory_remarks': ('備考', 'メモ', '摘要'),
 }
+# 既存口座への取込で上書きする項目（空欄の値は上書きしない。既経過利息は常に上書き）
+CERTIFICATE_UPDATE_FIELDS = (
+    'bank_name', 'branch_name', 'account_type', 'certificate_balance',
+    'passbook_balance', 'has_accrued_interest', 'inventory_remarks',
+)
+DEFAULT_CERTIFICATE_REMARKS = '取引履歴なし・残高証明書あり'
 
 
 # ---------------------------------------------------------------------------
@@ -56,10 +66,12 @@ def _get_passbook_balance(account: Account, reference_date: date | None) -> int
     return tx.balance if tx else None
 
 
-def _get_transaction_years(account: Account) -> set[int]:
-    """口座に取引がある年のセットを取得"""
-    dates = account.transactions.filter(date__isnull=False).values_list('date', flat=True)
-    return {d.year for d in dates}
+def _get_passbook_balances(case: Case) -> dict[int, int]:
+    """口座ごとに基準日以前で最も近い取引の残高を1クエリで取得"""
+    qs = case.transactions.all()
+    if case.reference_date:
+        qs = qs.filter(date__lte=case.reference_date)
+    return AccountStatsService.latest_balances(qs)
 
 
 def _wareki_abbr(year: int) -> str:
@@ -115,12 +127,12 @@ def _parse_bool(value) -> bool:
     return text in ('1', 'true', 'yes', 'y', '有', 'あり', '○', '〇', '済')
 
 
-def _get_import_value(row: dict, field: str, default=''):
-    """別名を許容して取込行から値を取得"""
+def _import_column(df: pd.DataFrame, field: str, default='') -> pd.Series:
+    """別名を許容して取込シートの列を取得（最初に見つかった列、なければ既定値の列）"""
     for col in CERTIFICATE_IMPORT_COLUMNS[field]:
-        if col in row and not pd.isna(row[col]):
-            return row[col]
-    return default
+        if col in df.columns:
+            return df[col]
+    return pd.Series(default, index=df.index, dtype=object)
 
 
 def _next_print_order(case: Case) -> int:
@@ -142,7 +154,7 @@ def _upsert_certificate_account(case: Case, data: dict) -> tuple[Account, bool]:
         'certificate_balance': data.get('certificate_balance'),
         'passbook_balance': data.get('passbook_balance'),
         'has_accrued_interest': bool(data.get('has_accrued_interest')),
-        'inventory_remarks': data.get('inventory_remarks') or '取引履歴なし・残高証明書あり',
+        'inventory_remarks': data.get('inventory_remarks') or DEFAULT_CERTIFICATE_REMARKS,
         'print_order': _next_print_order(case),
     }
     account, created = Account.objects.get_or_create(
@@ -153,18 +165,21 @@ def _upsert_certificate_account(case: Case, data: dict) -> tuple[Account, bool]:
     if created:
         return account, True
 
+    update_fields = _merge_certificate_values(account, defaults)
+    if update_fields:
+        account.save(update_fields=update_fields)
+    return account, False
+
+
+def _merge_certificate_values(account: Account, data: dict) -> list[str]:
+    """取込値を既存口座に反映し、反映した項目を返す（空欄の値は既存値を残す）"""
     update_fields = []
-    for field in (
-        'bank_name', 'branch_name', 'account_type', 'certificate_balance',
-        'passbook_balance', 'has_accrued_interest', 'inventory_remarks',
-    ):
-        value = defaults[field]
+    for field in CERTIFICATE_UPDATE_FIELDS:
+        value = data[field]
         if value not in (None, '') or field == 'has_accrued_interest':
             setattr(account, field, value)
             update_fields.append(field)
-    if update_fields:
-        account.save(update_fields=update_fields)
-    return account, False
+    return update_fields
 
 
 def _read_certificate_import(file_obj) -> pd.DataFrame:
@@ -182,44 +197,94 @@ def _read_certificate_import(file_obj) -> pd.DataFrame:
     return pd.read_csv(BytesIO(content), encoding='cp932', encoding_errors='replace', dtype=str)
 
 
+def _parse_certificate_rows(df: pd.DataFrame) -> list[dict]:
+    """取込シートを列単位で口座データに変換する（fillna('') 済みの DataFrame）"""
+    def text(field, default=''):
+        return _import_column(df, field, default).astype(str).str.strip()
+
+    def amounts(field):
+        # 全角数字・全角カンマ（日本語のCSV/Excelでよく使われる）は半角にそろえる
+        values = text(field).str.normalize('NFKC').str.replace(',', '', regex=False)
+        # 数値でない値は ValueError（取込エラー）にする
+        numbers = pd.to_numeric(values.mask(values == ''))
+        return [None if pd.isna(value) else int(value) for value in numbers]
+
+    columns = {
+        'account_number': _import_column(df, 'account_number').map(_normalize_account_number).tolist(),
+        'bank_name': text('bank_name').tolist(),
+        'branch_name': text('branch_name').tolist(),
+        'account_type': text('account_type').tolist(),
+        'certificate_balance': amounts('certificate_balance'),
+        'passbook_balance': amounts('passbook_balance'),
+        'has_accrued_interest': _import_column(df, 'has_accrued_interest', False).map(_parse_bool).tolist(),
+        'inventory_remarks': text('inventory_remarks', DEFAULT_CERTIFICATE_REMARKS).tolist(),
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
 def _import_certificate_accounts(case: Case, file_obj) -> tuple[int, int, int]:
-    """残高証明書口座リストを取込"""
-    df = _read_certificate_import(file_obj).fillna('')
-    created_count = updated_count = skipped_count = 0
-
-    for _, row_obj in df.iterrows():
-        row = row_obj.to_dict()
-        account_number = _normalize_account_number(_get_import_value(row, 'account_number'))
-        if not account_number:
-            skipped_count += 1
+    """
+    残高証明書口座リストを取込
+
+    既存口座を1回で読み込み、取込値を反映した口座を1回の bulk_create
+    （口座番号が重複する場合は更新）で保存する。新規口座の表示順は末尾から順に振る。
+
+    Returns:
+        (追加数, 更新数, スキップ数)
+    """
+    rows = _parse_certificate_rows(_read_certificate_import(file_obj).fillna(''))
+    valid_rows = [row for row in rows if row['account_number']]
+    skipped_count = len(rows) - len(valid_rows)
+    if not valid_rows:
+        return 0, 0, skipped_count
+
+    numbers = {row['account_number'] for row in valid_rows}
+    existing = {acc.account_number: acc for acc in case.accounts.filter(account_number__in=numbers)}
+    next_order = _next_print_order(case)
+
+    accounts = {}
+    for row in valid_rows:
+        number = row['account_number']
+        account = accounts.get(number)
+        if account is not None:
+            # 同じ口座番号の2行目以降は既存口座の更新と同じ扱い
+            _merge_certificate_values(account, row)
             continue
-
-        data = {
-            'bank_name': str(_get_import_value(row, 'bank_name')).strip(),
-            'branch_name': str(_get_import_value(row, 'branch_name')).strip(),
-            'account_type': str(_get_import_value(row, 'account_type')).strip(),
-            'account_number': account_number,
-            'certificate_balance': _parse_amount(_get_import_value(row, 'certificate_balance', None)),
-            'passbook_balance': _parse_amount(_get_import_value(row, 'passbook_balance', None)),
-            'has_accrued_interest': _parse_bool(_get_import_value(row, 'has_accrued_interest', False)),
-            'inventory_remarks': str(_get_import_value(row, 'inventory_remarks', '取引履歴なし・残高証明書あり')).strip(),
-        }
-        _, created = _upsert_certificate_account(case, data)
-        if created:
-            created_count += 1
+        current = existing.get(number)
+        if current is not None:
+            account = Account(
+                case=case, account_number=number, print_order=current.print_order,
+                **{field: getattr(current, field) for field in CERTIFICATE_UPDATE_FIELDS},
+            )
+            _merge_certificate_values(account, row)
         else:
-            updated_count += 1
-
-    return created_count, updated_count, skipped_count
+            account = Account(
+                case=case, account_number=number, print_order=next_order,
+                **{field: row[field] for field in CERTIFICATE_UPDATE_FIELDS},
+            )
+            account.inventory_remarks = account.inventory_remarks or DEFAULT_CERTIFICATE_REMARKS
+            next_order += 1
+        accounts[number] = account
+
+    Account.objects.bulk_create(
+        accounts.values(),
+        update_conflicts=True,
+        unique_fields=['case', 'account_number'],
+        update_fields=CERTIFICATE_UPDATE_FIELDS,
+    )
+    created_count = len(numbers - existing.keys())
+    return created_count, len(valid_rows) - created_count, skipped_count
 
 
 def _build_account_rows(case: Case, years: list[int]) -> list[dict]:
-    """口座ごとの一覧データを構築"""
+    """口座ごとの一覧データを構築（口座数によらず一定のクエリ数）"""
     accounts = case.accounts.all().order_by('print_order', 'bank_name', 'branch_name', 'account_number')
+    years_by_account = AccountStatsService.transaction_years(case.transactions.all())
+    balances = _get_passbook_balances(case)
     rows = []
     for acc in accounts:
-        tx_years = _get_transaction_years(acc)
-        auto_balance = _get_passbook_balance(acc, case.reference_date)
+        tx_years = years_by_account.get(acc.id, set())
+        auto_balance = balances.get(acc.id)
 
         passbook_bal = acc.passbook_balance if acc.passbook_balance is not None else auto_balance
         year_list = []
@@ -369,216 +434,96 @@ def api_save_passbook_inventory(request: HttpRequest, pk: int) -> JsonResponse:
 # Excel出力
 # ---------------------------------------------------------------------------
 
+@case_conditional
 def export_passbook_inventory(request: HttpRequest, pk: int) -> HttpResponse:
     """通帳有無一覧表をExcel出力"""
     case = get_object_or_404(Case, pk=pk)
     years = _get_year_range(case)
     rows = _build_account_rows(case, years)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = '通帳有無一覧表'
-
-    # スタイル定義
-    thin = Side(style='thin')
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    peach_fill = PatternFill(start_color='FFDAB9', end_color='FFDAB9', fill_type='solid')
-    hdr_font = Font(name='游ゴシック', size=9, bold=True)
-    body_font = Font(name='游ゴシック', size=9)
-    center = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    left_wrap = Alignment(horizontal='left', vertical='center', wrap_text=True)
-    right_a = Alignment(horizontal='right', vertical='center')
-
     year_count = len(years)
     # Col A=No, B=銀行名, C=支店名, D=種類, E=口座番号, F..=年, 残高系5列
-    COL_BANK = 2
     COL_YEAR_START = 6
     COL_AFTER = COL_YEAR_START + year_count  # 通帳残高の列
     total_cols = COL_AFTER + 4  # +残高一致+残証残高+既経過利息+備考
 
+    # --- 列幅・印刷設定（write_only のため行より先に設定） ---
+    widths = [4, 14, 12, 8, 12] + [7] * year_count + [10, 7, 10, 8, 16]
+    writer = XlsxWriter()
+    sheet = writer.add_sheet('通帳有無一覧表', widths, landscape=True, fit_to_height=1)
+
     # --- 行1: タイトル ---
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=5)
-    c = ws.cell(row=1, column=1, value=f'{case.name}  通帳有無一覧表')
-    c.font = Font(name='游ゴシック', size=14, bold=True)
+    title_row = [None] * total_cols
+    title_row[0] = sheet.cell(f'{case.name}  通帳有無一覧表', STYLE_TITLE)
+    sheet.merge(1, 1, 1, 5)
 
     ref_str = wareki_func(case.reference_date, 'full') if case.reference_date else '○年○月○日'
     mid_col = COL_YEAR_START + year_count // 2
-    ws.merge_cells(start_row=1, start_column=mid_col, end_row=1, end_column=COL_AFTER + 2)
-    c = ws.cell(row=1, column=mid_col, value=f'相続開始日：{ref_str}')
-    c.font = Font(name='游ゴシック', size=12)
-    c.alignment = Alignment(horizontal='center', vertical='center')
-
-    c = ws.cell(row=1, column=total_cols, value=f'{date.today().strftime("%Y/%m/%d")}\n(作成日)')
-    c.font = Font(name='游ゴシック', size=8)
-    c.alignment = Alignment(horizontal='right', vertical='center', wrap_text=True)
-
-    # --- 行2-3: ヘッダー ---
-    fixed_headers = [('', 'No'), ('銀行名', None), ('支店名', None), ('種類', None), ('口座番号', None)]
-    # 固定列（2行結合）
-    for i, (label, _) in enumerate(fixed_headers):
-        col = i + 1
-        val = label or _
-        ws.merge_cells(start_row=2, start_column=col, end_row=3, end_column=col)
-        c = ws.cell(row=2, column=col, value=val)
-        c.font = hdr_font
-        c.alignment = center
-        c.border = border
-        ws.cell(row=3, column=col).border = border
-
-    # 年列（行2=西暦, 行3=和暦）
-    for i, y in enumerate(years):
-        col = COL_YEAR_START + i
-        c = ws.cell(row=2, column=col, value=str(y))
-        c.font = hdr_font
-        c.alignment = center
-        c.border = border
-        c = ws.cell(row=3, column=col, value=f'({_wareki_abbr(y)})')
-        c.font = hdr_font
-        c.alignment = center
-        c.border = border
-
-    # 後半固定列（2行結合）
+    title_row[mid_col - 1] = sheet.cell(f'相続開始日：{ref_str}', STYLE_INV_SUBTITLE)
+    sheet.merge(1, mid_col, 1, COL_AFTER + 2)
+
+    title_row[total_cols - 1] = sheet.cell(f'{date.today().strftime("%Y/%m/%d")}\n(作成日)', STYLE_INV_NOTE)
+    sheet.append(title_row)
+
+    # --- 行2-3: ヘッダー（固定列は2行結合、年列は行2=西暦, 行3=和暦） ---
+    fixed_headers = ['No', '銀行名', '支店名', '種類', '口座番号']
     after_headers = ['通帳\n残高', '残高\n一致', '残証\n残高', '既経過\n利息', '備考']
-    for i, label in enumerate(after_headers):
-        col = COL_AFTER + i
-        ws.merge_cells(start_row=2, start_column=col, end_row=3, end_column=col)
-        c = ws.cell(row=2, column=col, value=label)
-        c.font = hdr_font
-        c.alignment = center
-        c.border = border
-        ws.cell(row=3, column=col).border = border
+    sheet.append(
+        [sheet.cell(label, STYLE_INV_HEADER) for label in fixed_headers]
+        + [sheet.cell(str(y), STYLE_INV_HEADER) for y in years]
+        + [sheet.cell(label, STYLE_INV_HEADER) for label in after_headers]
+    )
+    sheet.append(
+        [sheet.cell(None, STYLE_INV_BORDER) for _ in fixed_headers]
+        + [sheet.cell(f'({_wareki_abbr(y)})', STYLE_INV_HEADER) for y in years]
+        + [sheet.cell(None, STYLE_INV_BORDER) for _ in after_headers]
+    )
+    for col in [*range(1, COL_YEAR_START), *range(COL_AFTER, total_cols + 1)]:
+        sheet.merge(2, col, 3, col)
 
     # --- データ行 ---
-    DATA_START = 4
     MAX_ROWS = max(12, len(rows))
 
     for row_i in range(MAX_ROWS):
-        r = DATA_START + row_i
-        has_data = row_i < len(rows)
-        d = rows[row_i] if has_data else None
-
-        # No
-        c = ws.cell(row=r, column=1, value=row_i + 1)
-        c.font = body_font
-        c.alignment = center
-        c.border = border
+        d = rows[row_i] if row_i < len(rows) else None
 
-        # 銀行名〜口座番号
         info = [d['bank_name'], d['branch_name'], d['account_type'], d['account_number']] if d else ['', '', '', '']
-        for i, val in enumerate(info):
-            c = ws.cell(row=r, column=COL_BANK + i, value=val)
-            c.font = body_font
-            c.alignment = left_wrap
-            c.border = border
-            c.fill = peach_fill
-
-        # 年列
-        for i, y in enumerate(years):
-            col = COL_YEAR_START + i
-            val = ''
-            if d and d['year_list'][i]['has']:
-                val = '○'
-            c = ws.cell(row=r, column=col, value=val)
-            c.font = body_font
-            c.alignment = center
-            c.border = border
-            c.fill = peach_fill
-
-        # 通帳残高
-        c = ws.cell(row=r, column=COL_AFTER, value=d['passbook_balance'] if d else None)
-        c.font = body_font
-        c.alignment = right_a
-        c.border = border
-        c.number_format = '#,##0'
-
-        # 残高一致
-        match_val = d['balance_match'] if d else '残高証明なし'
-        c = ws.cell(row=r, column=COL_AFTER + 1, value=match_val)
-        c.font = body_font
-        c.alignment = center
-        c.border = border
-
-        # 残証残高
-        c = ws.cell(row=r, column=COL_AFTER + 2, value=d['certificate_balance'] if d else None)
-        c.font = body_font
-        c.alignment = right_a
-        c.border = border
-        c.number_format = '#,##0'
-
-        # 既経過利息計算
         if d:
             interest = '☑ 有' if d['has_accrued_interest'] else '□ 有'
         else:
             interest = '□ 有'
-        c = ws.cell(row=r, column=COL_AFTER + 3, value=interest)
-        c.font = body_font
-        c.alignment = center
-        c.border = border
 
-        # 備考
-        c = ws.cell(row=r, column=COL_AFTER + 4, value=d['inventory_remarks'] if d else '')
-        c.font = body_font
-        c.alignment = left_wrap
-        c.border = border
+        sheet.append(
+            [sheet.cell(row_i + 1, STYLE_INV_CENTER)]
+            + [sheet.cell(val, STYLE_INV_INFO) for val in info]
+            + [sheet.cell('○' if d and d['year_list'][i]['has'] else '', STYLE_INV_YEAR) for i in range(year_count)]
+            + [
+                sheet.cell(d['passbook_balance'] if d else None, STYLE_INV_AMOUNT),
+                sheet.cell(d['balance_match'] if d else '残高証明なし', STYLE_INV_CENTER),
+                sheet.cell(d['certificate_balance'] if d else None, STYLE_INV_AMOUNT),
+                sheet.cell(interest, STYLE_INV_CENTER),
+                sheet.cell(d['inventory_remarks'] if d else '', STYLE_INV_TEXT),
+            ]
+        )
 
     # --- 合計行 ---
-    total_r = DATA_START + MAX_ROWS
-    # 「計」ラベル
-    ws.merge_cells(start_row=total_r, start_column=1, end_row=total_r, end_column=COL_AFTER - 1)
-    c = ws.cell(row=total_r, column=1, value='計')
-    c.font = hdr_font
-    c.alignment = Alignment(horizontal='right', vertical='center')
-    c.border = border
-    for col in range(2, COL_AFTER):
-        ws.cell(row=total_r, column=col).border = border
-
+    total_r = 4 + MAX_ROWS
     total_pb = sum(r['passbook_balance'] or 0 for r in rows)
-    c = ws.cell(row=total_r, column=COL_AFTER, value=total_pb)
-    c.font = hdr_font
-    c.alignment = right_a
-    c.border = border
-    c.number_format = '#,##0'
-
-    ws.cell(row=total_r, column=COL_AFTER + 1).border = border
-
     total_cert = sum(r['certificate_balance'] or 0 for r in rows)
-    c = ws.cell(row=total_r, column=COL_AFTER + 2, value=total_cert)
-    c.font = hdr_font
-    c.alignment = right_a
-    c.border = border
-    c.number_format = '#,##0'
-
-    for col in range(COL_AFTER + 3, total_cols + 1):
-        ws.cell(row=total_r, column=col).border = border
-
-    # --- 列幅 ---
-    widths = {'A': 4, 'B': 14, 'C': 12, 'D': 8, 'E': 12}
-    for letter, w in widths.items():
-        ws.column_dimensions[letter].width = w
-    for i in range(year_count):
-        ws.column_dimensions[get_column_letter(COL_YEAR_START + i)].width = 7
-    after_widths = [10, 7, 10, 8, 16]
-    for i, w in enumerate(after_widths):
-        ws.column_dimensions[get_column_letter(COL_AFTER + i)].width = w
-
-    # --- 印刷設定 ---
-    ws.page_setup.paperSize = 9
-    ws.page_setup.orientation = 'landscape'
-    ws.page_setup.fitToWidth = 1
-    ws.page_setup.fitToHeight = 1
-    ws.sheet_properties.pageSetUpPr = PageSetupProperties(fitToPage=True)
-
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-
-    response = HttpResponse(
-        buf.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    sheet.append(
+        [sheet.cell('計', STYLE_INV_TOTAL_LABEL)]
+        + [sheet.cell(None, STYLE_INV_BORDER) for _ in range(2, COL_AFTER)]
+        + [
+            sheet.cell(total_pb, STYLE_INV_TOTAL),
+            sheet.cell(None, STYLE_INV_BORDER),
+            sheet.cell(total_cert, STYLE_INV_TOTAL),
+        ]
+        + [sheet.cell(None, STYLE_INV_BORDER) for _ in range(COL_AFTER + 3, total_cols + 1)]
     )
+    sheet.merge(total_r, 1, total_r, COL_AFTER - 1)
+
     filename = f"{sanitize_filename(case.name)}_通帳有無一覧表.xlsx"
-    set_download_filename(response, filename)
-    return response
+    return build_xlsx_response(writer, filename)
 
 
 def api_reorder_passbook_inventory(request: HttpRequest, pk: int) -> JsonResponse:
@@ -10,6 +10,7 @@ from ..forms import SettingsForm
 from ..lib import config
 from ..lib.config.defaults import DEFAULT_FUZZY_CONFIG
 from ..lib.constants import sort_patterns_dict
+from ..services import AISuggestionService, ReclassificationService
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +24,7 @@ def settings_view(request: HttpRequest) -> HttpResponse:
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         action = request.POST.get('action')
         if action == 'bulk_pattern_changes':
-            return _handle_settings_bulk_pattern_changes(request, current_settings, current_patterns)
+            return _handle_settings_bulk_pattern_changes(request)
 
     # 通常のフォーム送信
     if request.method == 'POST':
@@ -45,6 +46,8 @@ def settings_view(request: HttpRequest) -> HttpResponse:
             }
 
             config.save_user_settings(new_settings)
+            # ファジー設定はすべての案件のAI分類候補に影響する
+            AISuggestionService.refresh_cases()
             messages.success(request, "分析パラメータを保存しました。")
             return redirect('settings')
     else:
@@ -68,48 +71,31 @@ def settings_view(request: HttpRequest) -> HttpResponse:
     })
 
 
-def _handle_settings_bulk_pattern_changes(
-    request: HttpRequest, current_settings: dict, current_patterns: dict
-) -> JsonResponse:
-    """設定ページでのパターン一括変更を処理"""
+def _handle_settings_bulk_pattern_changes(request: HttpRequest) -> JsonResponse:
+    """設定ページでのパターン一括変更を処理（全変更を適用してから1回だけ保存）"""
     try:
         changes = json.loads(request.POST.get('changes', '[]'))
         if not changes:
             return JsonResponse({'success': False, 'error': '変更がありません'})
 
-        new_patterns = {k: list(v) for k, v in current_patterns.items()}
-        saved_count = 0
-
+        batch = config.PatternBatch()
         for change in changes:
+            if change.get('scope', 'global') != 'global':
+                continue
             action = change.get('action')
             category = change.get('category')
             keyword = change.get('keyword')
-            scope = change.get('scope', 'global')
-
-            if scope != 'global':
-                continue
-
             if action == 'add':
-                if category not in new_patterns:
-                    new_patterns[category] = []
-                if keyword and keyword not in new_patterns[category]:
-                    new_patterns[category].append(keyword)
-                    saved_count += 1
-
+                batch.add('global', category, keyword)
             elif action == 'delete':
-                if category in new_patterns and keyword in new_patterns[category]:
-                    new_patterns[category].remove(keyword)
-                    saved_count += 1
-                    if not new_patterns[category]:
-                        del new_patterns[category]
-
-        new_settings = {
-            **current_settings,
-            "CLASSIFICATION_PATTERNS": new_patterns,
-        }
-        config.save_user_settings(new_settings)
+                batch.delete('global', category, keyword, remove_empty=True)
+
+        saved_count = batch.change_count
+        reclassified = 0
+        if batch.commit():
+            reclassified = ReclassificationService.reclassify(None, batch.stale_keywords, batch.new_keywords)
 
-        return JsonResponse({'success': True, 'saved_count': saved_count})
+        return JsonResponse({'success': True, 'saved_count': saved_count, 'reclassified': reclassified})
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'JSONパースエラー'})
@@ -205,6 +205,26 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 50000  # 大量の取引データインポート対応（デフォルト: 1000）
 
+# エクスポート成果物のキャッシュ
+# 案件の版数（Case.revision）が同じ間は <EXPORT_CACHE_DIR>/<案件ID>/<版数>/ に保存したファイルを再利用する。
+# EXPORT_ACCEL_REDIRECT_URL を設定すると、ファイル送信を Nginx の X-Accel-Redirect に任せる
+# （Nginx 側に EXPORT_CACHE_DIR を alias する internal location が必要）。
+EXPORT_CACHE_DIR = Path(os.environ.get('DJANGO_EXPORT_CACHE_DIR', BASE_DIR / 'data' / 'exports'))
+EXPORT_ACCEL_REDIRECT_URL = os.environ.get('DJANGO_EXPORT_ACCEL_REDIRECT_URL', '')
+
+# 学習済み分類モデル（train_learned_classifier で作成し、AI分類候補に使う）
+LEARNED_MODEL_DIR = Path(os.environ.get('DJANGO_LEARNED_MODEL_DIR', BASE_DIR / 'data' / 'models'))
+
+# キャッシュ（絞り込み結果の件数・合計など）
+# キーに案件の版数を含むため、データ変更後に古い値が使われることはない。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bank-analyzer',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 # セッション設定
 SESSION_COOKIE_AGE = 60 * 60 * 24  # 24時間
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
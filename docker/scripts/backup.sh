@@ -682,8 +682,8 @@ backup_bank_analyzer_json() {
   local step_label="$1"
   local container="bank-analyzer"
   local dest_dir="$backup_dir/bank-analyzer-json"
-  local temp_dir
-  temp_dir="/tmp/bank-analyzer-json-$(basename "$backup_dir")"
+  # Kept between runs so --incremental only re-exports cases changed since the last backup
+  local export_dir="/tmp/bank-analyzer-json-incremental"
 
   echo "$step_label Bank Analyzer JSON exports ..."
   if ! is_container_running "$container"; then
@@ -692,23 +692,21 @@ backup_bank_analyzer_json() {
     return
   fi
 
-  if ! docker exec "$container" sh -c "rm -rf '$temp_dir' && mkdir -p '$temp_dir' && python manage.py export_case_json_backups --output-dir '$temp_dir'" >/dev/null 2>&1; then
+  if ! docker exec "$container" python manage.py export_case_json_backups --output-dir "$export_dir" --incremental --jobs 2 >/dev/null 2>&1; then
     err "Bank Analyzer JSON export failed"
     (( backup_fail++ )) || true
     return
   fi
 
   mkdir -p "$dest_dir"
-  if ! docker cp "$container:$temp_dir/." "$dest_dir/" >/dev/null 2>&1; then
-    docker exec "$container" rm -rf "$temp_dir" >/dev/null 2>&1 || true
+  if ! docker cp "$container:$export_dir/." "$dest_dir/" >/dev/null 2>&1; then
     err "Bank Analyzer JSON copy failed"
     (( backup_fail++ )) || true
     return
   fi
-  docker exec "$container" rm -rf "$temp_dir" >/dev/null 2>&1 || true
 
   local json_count
-  json_count=$(find "$dest_dir" -maxdepth 1 -type f -name '*.json' | wc -l | tr -d ' ')
+  json_count=$(find "$dest_dir" -maxdepth 1 -type f -name '*_backup.json' | wc -l | tr -d ' ')
   if [[ "$json_count" -gt 0 ]]; then
     ok "bank-analyzer-json/ ($json_count files)"
     (( backup_ok++ )) || true